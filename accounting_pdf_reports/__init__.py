@@ -3,6 +3,7 @@
 from . import wizard
 from . import models
 from . import report
+from . import controllers
 
 
 def _pre_init_clean_m2m_models(env):
@@ -19,6 +19,7 @@
     'data': [
         'security/ir.model.access.csv',
         'data/account_account_type.xml',
+        'data/account_balance_snapshot_data.xml',
         'views/menu.xml',
         'views/ledger_menu.xml',
         'views/financial_report.xml',
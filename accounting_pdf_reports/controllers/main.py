@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+
+import tempfile
+
+from werkzeug.exceptions import NotFound
+from werkzeug.wsgi import wrap_file
+
+from odoo import http
+from odoo.http import content_disposition, request
+
+from ..report.report_xlsx import write_xlsx
+
+XLSX_WIZARDS = (
+    'account.report.general.ledger',
+    'account.report.partner.ledger',
+    'account.balance.report',
+    'account.aged.trial.balance',
+)
+
+
+class AccountingXlsxReport(http.Controller):
+
+    @http.route('/accounting_pdf_reports/xlsx/<string:model>/<int:wizard_id>', type='http', auth='user')
+    def export_xlsx(self, model, wizard_id, active_model='ir.ui.menu', active_ids='', **kwargs):
+        if model not in XLSX_WIZARDS:
+            raise NotFound()
+        wizard = request.env[model].browse(wizard_id).exists()
+        if not wizard:
+            raise NotFound()
+        active_ids = [int(active_id) for active_id in active_ids.split(',') if active_id]
+        wizard = wizard.with_context(active_model=active_model, active_ids=active_ids)
+        report_name, data = wizard._get_xlsx_report(wizard._build_report_data())
+        title, columns, rows = request.env[report_name]._get_xlsx_rows(data)
+
+        # The workbook is built on disk and sent in chunks, so neither the
+        # rows nor the file are ever held in memory.
+        fileobj = tempfile.TemporaryFile()
+        try:
+            write_xlsx(fileobj, title, columns, rows)
+            size = fileobj.seek(0, 2)
+            fileobj.seek(0)
+        except Exception:
+            fileobj.close()
+            raise
+        return http.Response(
+            wrap_file(request.httprequest.environ, fileobj),
+            headers=[
+                ('Content-Type', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+                ('Content-Length', size),
+                ('Content-Disposition', content_disposition('%s.xlsx' % title)),
+            ],
+            direct_passthrough=True,
+        )
@@ -1,3 +1,10 @@
+from . import account_account
 from . import account_account_type
+from . import account_balance_snapshot
 from . import account_financial_report
+from . import account_move
 from . import account_move_line
+from . import account_partial_reconcile
+from . import ir_actions_report
+from . import res_company
+from . import res_currency_rate
@@ -0,0 +1,13 @@
+from odoo import models
+
+# Account fields printed or used to select accounts by the cached reports.
+REPORT_ACCOUNT_FIELDS = ('code', 'name', 'account_type', 'deprecated')
+
+
+class AccountAccount(models.Model):
+    _inherit = "account.account"
+
+    def write(self, vals):
+        if not REPORT_ACCOUNT_FIELDS.isdisjoint(vals):
+            self.company_id._bump_report_ledger_version()
+        return super().write(vals)
@@ -0,0 +1,213 @@
+from datetime import date, timedelta
+
+from psycopg2.extras import execute_values
+
+from odoo import api, fields, models
+
+SNAPSHOT_HORIZON_PARAM = 'accounting_pdf_reports.balance_snapshot_horizon'
+
+# Context keys of _query_get that the snapshot dimensions cannot answer.
+UNSUPPORTED_FILTERS = (
+    'aged_balance', 'reconcile_date', 'account_tag_ids', 'analytic_tag_ids',
+    'analytic_account_ids', 'partner_categories',
+)
+
+SNAPSHOT_LINES_QUERY = """
+    SELECT l.company_id, l.account_id, l.partner_id, l.journal_id,
+           date_trunc('month', l.date)::date AS month,
+           SUM(l.debit) AS debit, SUM(l.credit) AS credit
+      FROM account_move_line l
+     WHERE (l.display_type IS NULL OR l.display_type NOT IN ('line_section', 'line_note'))
+       AND {where}
+  GROUP BY 1, 2, 3, 4, 5
+"""
+
+SNAPSHOT_UPSERT = """
+    INSERT INTO account_balance_snapshot
+           (company_id, account_id, partner_id, journal_id, month, debit, credit, balance)
+    {values}
+    ON CONFLICT (company_id, account_id, COALESCE(partner_id, 0), journal_id, month)
+    DO UPDATE SET debit = account_balance_snapshot.debit + EXCLUDED.debit,
+                  credit = account_balance_snapshot.credit + EXCLUDED.credit,
+                  balance = account_balance_snapshot.balance + EXCLUDED.balance
+"""
+
+
+class AccountBalanceSnapshot(models.Model):
+    _name = "account.balance.snapshot"
+    _description = "Account Balance Snapshot"
+    _order = "month desc, account_id"
+    _log_access = False
+
+    company_id = fields.Many2one('res.company', 'Company', required=True, readonly=True, ondelete='cascade')
+    account_id = fields.Many2one('account.account', 'Account', required=True, readonly=True, ondelete='cascade')
+    partner_id = fields.Many2one('res.partner', 'Partner', readonly=True, ondelete='cascade')
+    journal_id = fields.Many2one('account.journal', 'Journal', required=True, readonly=True, ondelete='cascade')
+    month = fields.Date('Month', required=True, readonly=True)
+    debit = fields.Float('Debit', digits='Account', readonly=True)
+    credit = fields.Float('Credit', digits='Account', readonly=True)
+    balance = fields.Float('Balance', digits='Account', readonly=True)
+
+    def init(self):
+        self.env.cr.execute("""
+            CREATE UNIQUE INDEX IF NOT EXISTS account_balance_snapshot_key_uniq
+                ON account_balance_snapshot (company_id, account_id, COALESCE(partner_id, 0), journal_id, month)
+        """)
+
+    @api.model
+    def _get_horizon(self, lock=None):
+        """ Returns the first day of the open month: posted lines dated before it
+            are held in the snapshot, later ones are read from account_move_line.
+            `lock` is the row lock taken on the parameter ('SHARE' or 'UPDATE').
+        """
+        query = "SELECT value FROM ir_config_parameter WHERE key = %s"
+        if lock:
+            query += " FOR " + lock
+        self.env.cr.execute(query, [SNAPSHOT_HORIZON_PARAM])
+        row = self.env.cr.fetchone()
+        try:
+            return fields.Date.to_date(row[0]) if row else None
+        except ValueError:
+            # not built yet
+            return None
+
+    @api.model
+    def _apply_moves(self, moves, sign):
+        """ Adds (sign=1) or removes (sign=-1) the lines of posted moves dated
+            in closed months. Called when moves are posted or reset to draft.
+        """
+        if not moves:
+            return
+        # FOR SHARE does not block other postings, but waits for a running
+        # _roll_snapshot so no move is missed while the horizon moves forward.
+        horizon = self._get_horizon(lock='SHARE')
+        if not horizon:
+            return
+        self.env['account.move.line'].flush_model()
+        lines = SNAPSHOT_LINES_QUERY.format(where="l.move_id IN %(move_ids)s AND l.date < %(horizon)s")
+        values = """
+            SELECT company_id, account_id, partner_id, journal_id, month,
+                   %(sign)s * debit, %(sign)s * credit, %(sign)s * (debit - credit)
+              FROM ({lines}) lines
+        """.format(lines=lines)
+        self.env.cr.execute(SNAPSHOT_UPSERT.format(values=values), {
+            'move_ids': tuple(moves.ids),
+            'horizon': horizon,
+            'sign': sign,
+        })
+        self.invalidate_model()
+
+    @api.model
+    def _roll_snapshot(self):
+        """ Called by the cron: moves the horizon to the current month, folding
+            the months that were closed since the last run into the snapshot.
+            The first run builds the whole snapshot.
+        """
+        horizon = fields.Date.context_today(self).replace(day=1)
+        with self.pool.cursor() as lock_cr:
+            # The lock is the first statement of this transaction; once it
+            # is granted every posting that read the old horizon has
+            # committed and new ones wait for us. A second cursor opened
+            # now sees all of them.
+            lock_cr.execute(
+                "SELECT value FROM ir_config_parameter WHERE key = %s FOR UPDATE",
+                [SNAPSHOT_HORIZON_PARAM],
+            )
+            previous = self.with_env(self.env(cr=lock_cr))._get_horizon()
+            if previous and previous >= horizon:
+                return
+            if not previous:
+                lock_cr.execute("DELETE FROM account_balance_snapshot")
+            where = "l.parent_state = 'posted' AND l.date >= %(start)s AND l.date < %(stop)s"
+            with self.pool.cursor() as read_cr:
+                month = previous
+                if not month:
+                    read_cr.execute("""
+                        SELECT date_trunc('month', MIN(date))::date
+                          FROM account_move_line
+                         WHERE parent_state = 'posted'
+                    """)
+                    month = read_cr.fetchone()[0] or horizon
+                # One month at a time: its rows are fetched before they are
+                # written, so the two cursors are never interleaved and the
+                # memory used is bounded by the lines of a month.
+                while month < horizon:
+                    stop = (month.replace(day=28) + timedelta(days=4)).replace(day=1)
+                    read_cr.execute(SNAPSHOT_LINES_QUERY.format(where=where), {'start': month, 'stop': stop})
+                    rows = read_cr.fetchall()
+                    if rows:
+                        execute_values(lock_cr._obj, SNAPSHOT_UPSERT.format(values="VALUES %s"), [
+                            row + (row[5] - row[6],) for row in rows
+                        ], page_size=1000)
+                    month = stop
+            lock_cr.execute(
+                "UPDATE ir_config_parameter SET value = %s WHERE key = %s",
+                [fields.Date.to_string(horizon), SNAPSHOT_HORIZON_PARAM],
+            )
+        self.invalidate_model()
+
+    @api.model
+    def _get_window(self):
+        """ Returns the (first month, end month excluded) range that the snapshot
+            can answer for the _query_get filters of the context, or None when
+            the report has to read account_move_line only.
+        """
+        context = self._context
+        if (context.get('state') or '').lower() != 'posted' or any(context.get(key) for key in UNSUPPORTED_FILTERS):
+            return None
+        date_from = fields.Date.to_date(context.get('date_from'))
+        date_to = fields.Date.to_date(context.get('date_to'))
+        start, stop = date.min, None
+        if date_from:
+            if not context.get('strict_range'):
+                # lower bound depends on account.include_initial_balance
+                return None
+            if context.get('initial_bal'):
+                stop = date_from
+            else:
+                start = date_from
+        if date_to and not (date_from and context.get('initial_bal')):
+            stop = date_to + timedelta(days=1)
+        # only whole months can be read from the snapshot
+        if start.day != 1:
+            start = (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+        horizon = self._get_horizon()
+        if not horizon:
+            return None
+        stop = min(stop.replace(day=1), horizon) if stop else horizon
+        if start >= stop:
+            return None
+        return start, stop
+
+    @api.model
+    def _get_account_balances(self, accounts, window):
+        """ Returns {account_id: (debit, credit)} summed from the snapshot over
+            `window` with the journal, partner and company filters of the context.
+        """
+        context = self._context
+        if context.get('account_ids'):
+            accounts &= context['account_ids']
+        if not accounts:
+            return {}
+        if context.get('company_id'):
+            company_ids = [context['company_id']]
+        elif context.get('allowed_company_ids'):
+            company_ids = self.env.companies.ids
+        else:
+            company_ids = self.env.company.ids
+        query = """
+            SELECT account_id, SUM(debit), SUM(credit)
+              FROM account_balance_snapshot
+             WHERE account_id IN %s AND company_id IN %s
+               AND month >= %s AND month < %s
+        """
+        params = [tuple(accounts.ids), tuple(company_ids), window[0], window[1]]
+        if context.get('journal_ids'):
+            query += " AND journal_id IN %s"
+            params.append(tuple(context['journal_ids']))
+        if context.get('partner_ids'):
+            query += " AND partner_id IN %s"
+            params.append(tuple(context['partner_ids'].ids))
+        query += " GROUP BY account_id"
+        self.env.cr.execute(query, params)
+        return {account_id: (debit, credit) for account_id, debit, credit in self.env.cr.fetchall()}
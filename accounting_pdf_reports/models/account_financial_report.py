@@ -15,6 +15,24 @@ class AccountFinancialReport(models.Model):
                 level = report.parent_id.level + 1
             report.level = level
 
+    @api.model_create_multi
+    def create(self, vals_list):
+        self._bump_report_ledger_version()
+        return super().create(vals_list)
+
+    def write(self, vals):
+        self._bump_report_ledger_version()
+        return super().write(vals)
+
+    def unlink(self):
+        self._bump_report_ledger_version()
+        return super().unlink()
+
+    def _bump_report_ledger_version(self):
+        """ Report trees are shared by all companies: a change invalidates
+            the cached reports of every company. """
+        self.env['res.company'].sudo().search([])._bump_report_ledger_version()
+
     def _get_children_by_order(self):
         res = self
         children = self.search([('parent_id', 'in', self.ids)], order='sequence ASC')
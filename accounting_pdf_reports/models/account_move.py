@@ -0,0 +1,21 @@
+from odoo import models
+
+
+class AccountMove(models.Model):
+    _inherit = "account.move"
+
+    def _post(self, soft=True):
+        posted = super()._post(soft=soft)
+        self.env['account.balance.snapshot']._apply_moves(posted, 1)
+        posted.company_id._bump_report_ledger_version()
+        return posted
+
+    def button_draft(self):
+        posted = self.filtered(lambda m: m.state == 'posted')
+        self.env['account.balance.snapshot']._apply_moves(posted, -1)
+        posted.company_id._bump_report_ledger_version()
+        return super().button_draft()
+
+    def button_cancel(self):
+        self.company_id._bump_report_ledger_version()
+        return super().button_cancel()
@@ -1,18 +1,44 @@
 import ast
-from odoo import api, models, fields
+from collections import namedtuple
+from datetime import date
+
+from odoo import api, models, fields, tools
+from odoo.models import BaseModel
+from odoo.osv import expression
+from odoo.tools import Query
+
+# SQL filter compiled from the report context: `tables` is the FROM clause,
+# `where` the condition (possibly empty) and `params` its parameters, all of
+# them referring to the move lines under the alias given at compile time.
+QueryFilter = namedtuple('QueryFilter', ['tables', 'where', 'params'])
+
+# Context keys read by _query_get_domain.
+QUERY_CONTEXT_KEYS = (
+    'aged_balance', 'date_to', 'date_from', 'strict_range', 'initial_bal',
+    'journal_ids', 'state', 'company_id', 'reconcile_date', 'account_tag_ids',
+    'account_ids', 'analytic_tag_ids', 'analytic_account_ids', 'partner_ids',
+    'partner_categories',
+)
+
+
+def _freeze(value):
+    """ Hashable, order-insensitive form of a context value. """
+    if isinstance(value, BaseModel):
+        return (value._name, tuple(sorted(value.ids)))
+    if isinstance(value, (list, tuple, set)):
+        return tuple(sorted(_freeze(item) for item in value))
+    if isinstance(value, date):
+        return fields.Date.to_string(value)
+    return value
 
 
 class AccountMoveLine(models.Model):
     _inherit = "account.move.line"
 
     @api.model
-    def _query_get(self, domain=None):
-        self.check_access_rights('read')
-
+    def _query_get_domain(self, domain=None):
         context = dict(self._context or {})
-        domain = domain or []
-        if not isinstance(domain, (list, tuple)):
-            domain = ast.literal_eval(domain)
+        domain = list(domain or [])
 
         date_field = 'date'
         if context.get('aged_balance'):
@@ -62,17 +88,39 @@ class AccountMoveLine(models.Model):
         if context.get('partner_categories'):
             domain += [('partner_id.category_id', 'in', context['partner_categories'].ids)]
 
-        where_clause = ""
-        where_clause_params = []
-        tables = ''
-        if domain:
-            domain.append(('display_type', 'not in', ('line_section', 'line_note')))
-            domain.append(('parent_state', '!=', 'cancel'))
-
-            query = self._where_calc(domain)
+        domain.append(('display_type', 'not in', ('line_section', 'line_note')))
+        domain.append(('parent_state', '!=', 'cancel'))
+        return domain
 
-            # Wrap the query with 'company_id IN (...)' to avoid bypassing company access rights.
-            self._apply_ir_rules(query)
+    @api.model
+    def _get_query_filter(self, alias='account_move_line', domain=None):
+        """ Returns the QueryFilter of the report context, with the move lines
+            aliased as `alias`. Filters are compiled once per context, domain,
+            user and allowed companies. """
+        self.check_access_rights('read')
+        if domain and not isinstance(domain, (list, tuple)):
+            domain = ast.literal_eval(domain)
+        context = self._context
+        signature = (
+            tuple((key, _freeze(context[key])) for key in QUERY_CONTEXT_KEYS if context.get(key)),
+            bool(context.get('allowed_company_ids')),
+            repr(domain or []),
+        )
+        return self._compile_query_filter(signature, alias, domain)
+
+    @tools.ormcache('self.env.uid', 'self.env.su', 'tuple(self.env.companies.ids)', 'self.env.company.id', 'signature', 'alias')
+    def _compile_query_filter(self, signature, alias, domain):
+        query = Query(self.env.cr, alias, self._table)
+        expression.expression(self._query_get_domain(domain), self, alias=alias, query=query)
+        # same as _apply_ir_rules, which only knows the table name as alias
+        if not self.env.su:
+            rule_domain = self.env['ir.rule']._compute_domain(self._name, 'read')
+            if rule_domain:
+                expression.expression(rule_domain, self.sudo(), alias=alias, query=query)
+        tables, where_clause, where_params = query.get_sql()
+        return QueryFilter(tables, where_clause, tuple(where_params))
 
-            tables, where_clause, where_clause_params = query.get_sql()
-        return tables, where_clause, where_clause_params
+    @api.model
+    def _query_get(self, domain=None):
+        query_filter = self._get_query_filter(domain=domain)
+        return query_filter.tables, query_filter.where, list(query_filter.params)
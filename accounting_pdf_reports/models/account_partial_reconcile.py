@@ -0,0 +1,15 @@
+from odoo import api, models
+
+
+class AccountPartialReconcile(models.Model):
+    _inherit = "account.partial.reconcile"
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        partials = super().create(vals_list)
+        partials.company_id._bump_report_ledger_version()
+        return partials
+
+    def unlink(self):
+        self.company_id._bump_report_ledger_version()
+        return super().unlink()
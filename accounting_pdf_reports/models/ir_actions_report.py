@@ -0,0 +1,102 @@
+import json
+import threading
+from collections import OrderedDict
+
+from odoo import fields, models
+
+# Reports whose output only depends on the wizard options and the posted
+# ledger, and can be served again until the ledger version changes.
+CACHED_REPORTS = (
+    'accounting_pdf_reports.report_trialbalance',
+    'accounting_pdf_reports.report_general_ledger',
+    'accounting_pdf_reports.report_partnerledger',
+    'accounting_pdf_reports.report_agedpartnerbalance',
+    'accounting_pdf_reports.report_financial',
+)
+
+
+class ReportCache:
+    """ In-process LRU of rendered reports, bounded in entries and bytes. """
+
+    def __init__(self, max_entries=64, max_bytes=64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, value, size):
+        with self._lock:
+            # a single report may not push out most of the cache
+            if size > self.max_bytes // 4:
+                return
+            if key in self._entries:
+                self.size -= self._entries.pop(key)[1]
+            self._entries[key] = (value, size)
+            self.size += size
+            while len(self._entries) > self.max_entries or self.size > self.max_bytes:
+                self.size -= self._entries.popitem(last=False)[1][1]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+
+report_cache = ReportCache()
+
+
+class IrActionsReport(models.Model):
+    _inherit = "ir.actions.report"
+
+    def _get_report_cache_key(self, report, res_ids, data):
+        """ Returns the key of a cacheable rendering, None otherwise. Draft
+            entries change without bumping the ledger version, so only
+            reports on posted entries are cached. The cache is shared by the
+            whole process: the key holds the database, the user (record rules,
+            main company currency) and the active company (report header).
+            The date and the ledger version, also bumped on currency rate
+            changes, cover the aged balance conversion at today's rate. """
+        form = (data or {}).get('form')
+        if report.report_name not in CACHED_REPORTS or not isinstance(form, dict) \
+                or form.get('target_move') != 'posted':
+            return None
+        # the wizard record differs on every print
+        form = {key: value for key, value in form.items() if key != 'id'}
+        context = self.env.context
+        return (
+            report.report_name,
+            json.dumps(form, sort_keys=True, default=str),
+            tuple(res_ids or ()),
+            context.get('active_model'),
+            json.dumps(context.get('active_ids'), default=str),
+            context.get('lang'),
+            fields.Date.context_today(self),
+            self.env.cr.dbname,
+            self.env.uid,
+            self.env.company.id,
+            self.env.user.company_id.id,
+            self.env.companies._get_report_ledger_versions(),
+        )
+
+    def _render_qweb_pdf(self, report_ref, res_ids=None, data=None):
+        report = self._get_report(report_ref)
+        key = self._get_report_cache_key(report, res_ids, data)
+        if key is None:
+            return super()._render_qweb_pdf(report_ref, res_ids=res_ids, data=data)
+        cached = report_cache.get(key)
+        if cached is not None:
+            return cached[0]
+        result = super()._render_qweb_pdf(report_ref, res_ids=res_ids, data=data)
+        ICP = self.env['ir.config_parameter'].sudo()
+        report_cache.max_entries = int(ICP.get_param('accounting_pdf_reports.report_cache_entries', 64))
+        report_cache.max_bytes = int(ICP.get_param('accounting_pdf_reports.report_cache_bytes', 64 * 1024 * 1024))
+        report_cache.put(key, result, len(result[0]))
+        return result
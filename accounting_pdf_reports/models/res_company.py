@@ -0,0 +1,40 @@
+from odoo import fields, models
+
+LEDGER_VERSION_POSTCOMMIT_KEY = 'accounting_pdf_reports.ledger_version_company_ids'
+
+
+class ResCompany(models.Model):
+    _inherit = "res.company"
+
+    report_ledger_version = fields.Integer(
+        'Report Ledger Version', default=0, readonly=True, copy=False,
+        help="Incremented whenever the posted ledger of the company changes; "
+             "cached report results of an older version are not reused.")
+
+    def _bump_report_ledger_version(self):
+        """ Increments the ledger version of the companies once the current
+            transaction has committed, so a report rendered from the new
+            version always sees the new entries. """
+        if not self:
+            return
+        postcommit = self.env.cr.postcommit
+        company_ids = postcommit.data.get(LEDGER_VERSION_POSTCOMMIT_KEY)
+        if company_ids is None:
+            company_ids = postcommit.data[LEDGER_VERSION_POSTCOMMIT_KEY] = set()
+            registry = self.env.registry
+
+            def bump():
+                with registry.cursor() as cr:
+                    cr.execute("""
+                        UPDATE res_company
+                           SET report_ledger_version = report_ledger_version + 1
+                         WHERE id IN %s
+                    """, [tuple(company_ids)])
+            postcommit.add(bump)
+        company_ids.update(self.ids)
+
+    def _get_report_ledger_versions(self):
+        self.env.cr.execute(
+            "SELECT id, report_ledger_version FROM res_company WHERE id IN %s ORDER BY id",
+            [tuple(self.ids)])
+        return tuple(self.env.cr.fetchall())
@@ -0,0 +1,34 @@
+from odoo import api, models
+
+
+class ResCurrencyRate(models.Model):
+    _inherit = "res.currency.rate"
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        rates = super().create(vals_list)
+        rates._bump_report_ledger_version()
+        return rates
+
+    def write(self, vals):
+        self._bump_report_ledger_version()
+        res = super().write(vals)
+        self._bump_report_ledger_version()
+        return res
+
+    def unlink(self):
+        self._bump_report_ledger_version()
+        return super().unlink()
+
+    def _bump_report_ledger_version(self):
+        """ The aged balance converts foreign amounts at the current rate: a
+            rate change invalidates the cached reports of its company, or of
+            every company for a rate shared by all of them. """
+        if not self:
+            return
+        companies = self.env['res.company'].sudo()
+        if any(not rate.company_id for rate in self):
+            companies = companies.search([])
+        else:
+            companies = self.company_id.sudo()
+        companies._bump_report_ledger_version()
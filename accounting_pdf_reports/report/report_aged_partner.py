@@ -2,8 +2,56 @@ import time
 from odoo import api, models, fields, _
 from odoo.exceptions import UserError
 from odoo.tools import float_is_zero
-from datetime import datetime
-from dateutil.relativedelta import relativedelta
+
+# Residual of every receivable/payable line as of date_from, converted to the
+# user's currency through the rate of its company, and aged in 7 buckets:
+# 0 (oldest) to 4 (1 to period_length days overdue), 6 for not due.
+AGED_LINES_QUERY = """
+    WITH rates AS (
+        SELECT * FROM unnest(%(company_ids)s::int[], %(rates)s::numeric[]) AS r(company_id, rate)
+    ), lines AS MATERIALIZED (
+        SELECT l.id, l.partner_id, l.company_id, l.balance,
+               %(date_from)s::date - COALESCE(l.date_maturity, l.date) AS overdue
+          FROM account_move_line l
+          JOIN account_move am ON am.id = l.move_id
+          JOIN account_account acc ON acc.id = l.account_id
+         WHERE am.state IN %(move_state)s
+           AND acc.account_type IN %(account_type)s
+           AND l.date <= %(date_from)s
+           AND l.company_id IN %(company_tuple)s
+           AND {partner_clause}
+           AND (l.reconciled IS FALSE OR l.id IN (
+                    SELECT debit_move_id FROM account_partial_reconcile WHERE max_date > %(date_from)s
+                     UNION ALL
+                    SELECT credit_move_id FROM account_partial_reconcile WHERE max_date > %(date_from)s))
+    ), aged AS (
+        SELECT lines.partner_id,
+               CASE WHEN lines.overdue <= 0 THEN 6
+                    ELSE GREATEST(4 - (lines.overdue - 1) / %(period_length)s, 0)
+               END AS period,
+               ROUND((lines.balance
+                      + COALESCE((SELECT SUM(p.amount) FROM account_partial_reconcile p
+                                   WHERE p.credit_move_id = lines.id AND p.max_date <= %(date_from)s), 0)
+                      - COALESCE((SELECT SUM(p.amount) FROM account_partial_reconcile p
+                                   WHERE p.debit_move_id = lines.id AND p.max_date <= %(date_from)s), 0)
+                     ) * rates.rate, %(digits)s) AS amount
+          FROM lines
+          JOIN rates ON rates.company_id = lines.company_id
+    )
+    SELECT aged.partner_id,
+           COALESCE(SUM(amount) FILTER (WHERE period = 6), 0) AS direction,
+           COALESCE(SUM(amount) FILTER (WHERE period = 0), 0) AS "0",
+           COALESCE(SUM(amount) FILTER (WHERE period = 1), 0) AS "1",
+           COALESCE(SUM(amount) FILTER (WHERE period = 2), 0) AS "2",
+           COALESCE(SUM(amount) FILTER (WHERE period = 3), 0) AS "3",
+           COALESCE(SUM(amount) FILTER (WHERE period = 4), 0) AS "4",
+           COUNT(*) AS line_count
+      FROM aged
+      LEFT JOIN res_partner ON res_partner.id = aged.partner_id
+     WHERE aged.amount != 0
+  GROUP BY aged.partner_id, UPPER(res_partner.name)
+  ORDER BY UPPER(res_partner.name)
+"""
 
 
 class ReportAgedPartnerBalance(models.AbstractModel):
@@ -23,201 +71,68 @@ class ReportAgedPartnerBalance(models.AbstractModel):
         # 61 - 90  : 2018-12-09 - 2018-11-10
         # 91 - 120 : 2018-11-09 - 2018-10-11
         # +120     : 2018-10-10
-        periods = {}
-        start = datetime.strptime(str(date_from), "%Y-%m-%d")
-        date_from = datetime.strptime(str(date_from), "%Y-%m-%d").date()
-        for i in range(5)[::-1]:
-            stop = start - relativedelta(days=period_length)
-            period_name = str((5-(i+1)) * period_length + 1) + '-' + str((5-i) * period_length)
-            period_stop = (start - relativedelta(days=1)).strftime('%Y-%m-%d')
-            if i == 0:
-                period_name = '+' + str(4 * period_length)
-            periods[str(i)] = {
-                'name': period_name,
-                'stop': period_stop,
-                'start': (i!=0 and stop.strftime('%Y-%m-%d') or False),
-            }
-            start = stop
-
+        # The aging is done by AGED_LINES_QUERY in one pass; the third value
+        # returned maps each partner to its number of open lines.
         res = []
-        total = []
-        cr = self.env.cr
+        total = [0] * 7
         user_company = self.env.user.company_id
         user_currency = user_company.currency_id
         company_ids = self._context.get('company_ids') or [user_company.id]
         move_state = ['draft', 'posted']
         date = self._context.get('date') or fields.Date.today()
         company = self.env['res.company'].browse(self._context.get('company_id')) or self.env.company
+        date_from = fields.Date.to_date(date_from)
 
         if target_move == 'posted':
             move_state = ['posted']
-        arg_list = (tuple(move_state), tuple(account_type))
-
-        reconciliation_clause = '(l.reconciled IS FALSE)'
-        cr.execute('SELECT debit_move_id, credit_move_id FROM account_partial_reconcile where max_date > %s', (date_from,))
-        reconciled_after_date = []
-        for row in cr.fetchall():
-            reconciled_after_date += [row[0], row[1]]
-        if reconciled_after_date:
-            reconciliation_clause = '(l.reconciled IS FALSE OR l.id IN %s)'
-            arg_list += (tuple(reconciled_after_date),)
-        arg_list += (date_from, tuple(company_ids))
-        query = '''
-            SELECT DISTINCT l.partner_id, UPPER(res_partner.name)
-            FROM account_move_line AS l left join res_partner on l.partner_id = res_partner.id, account_account, account_move am
-            WHERE (l.account_id = account_account.id)
-                AND (l.move_id = am.id)
-                AND (am.state IN %s)
-                AND (account_account.account_type IN %s)
-                AND ''' + reconciliation_clause + '''
-                AND (l.date <= %s)
-                AND l.company_id IN %s
-            ORDER BY UPPER(res_partner.name)'''
-        cr.execute(query, arg_list)
-        partners = cr.dictfetchall()
-        # put a total of 0
-        for i in range(7):
-            total.append(0)
-
-        # Build a string like (1,2,3) for easy use in SQL query
-        if not partner_ids:
-            partner_ids = [partner['partner_id'] for partner in partners if partner['partner_id']]
-        lines = dict((partner['partner_id'] or False, []) for partner in partners)
-        if not partner_ids:
-            return [], [], {}
-
-        # This dictionary will store the not due amount of all partners
-        undue_amounts = {}
-        query = '''SELECT l.id
-                FROM account_move_line AS l, account_account, account_move am
-                WHERE (l.account_id = account_account.id) AND (l.move_id = am.id)
-                    AND (am.state IN %s)
-                    AND (account_account.account_type IN %s)
-                    AND (COALESCE(l.date_maturity,l.date) >= %s)\
-                    AND ((l.partner_id IN %s) OR (l.partner_id IS NULL))
-                AND (l.date <= %s)
-                AND l.company_id IN %s'''
-        cr.execute(query, (tuple(move_state), tuple(account_type), date_from,
-                           tuple(partner_ids), date_from, tuple(company_ids)))
-        aml_ids = cr.fetchall()
-        aml_ids = aml_ids and [x[0] for x in aml_ids] or []
-        for line in self.env['account.move.line'].browse(aml_ids):
-            partner_id = line.partner_id.id or False
-            if partner_id not in undue_amounts:
-                undue_amounts[partner_id] = 0.0
-            line_amount = line.company_id.currency_id._convert(line.balance,
-                                                               user_currency,
-                                                               company, date)
-            if user_currency.is_zero(line_amount):
-                continue
-            for partial_line in line.matched_debit_ids:
-                if partial_line.max_date <= date_from:
-                    line_currency = partial_line.company_id.currency_id
-                    line_amount += line_currency._convert(partial_line.amount,
-                                                          user_currency,
-                                                          company, date)
-            for partial_line in line.matched_credit_ids:
-                if partial_line.max_date <= date_from:
-                    line_currency = partial_line.company_id.currency_id
-                    line_amount -= line_currency._convert(partial_line.amount,
-                                                          user_currency,
-                                                          company, date)
-            if not self.env.user.company_id.currency_id.is_zero(line_amount):
-                undue_amounts[partner_id] += line_amount
-                lines[partner_id].append({
-                    'line': line,
-                    'amount': line_amount,
-                    'period': 6,
-                })
-
-        # Use one query per period and store results in history (a list variable)
-        # Each history will contain: history[1] = {'<partner_id>': <partner_debit-credit>}
-        history = []
-        for i in range(5):
-            args_list = (tuple(move_state), tuple(account_type), tuple(partner_ids),)
-            dates_query = '(COALESCE(l.date_maturity,l.date)'
-
-            if periods[str(i)]['start'] and periods[str(i)]['stop']:
-                dates_query += ' BETWEEN %s AND %s)'
-                args_list += (periods[str(i)]['start'], periods[str(i)]['stop'])
-            elif periods[str(i)]['start']:
-                dates_query += ' >= %s)'
-                args_list += (periods[str(i)]['start'],)
-            else:
-                dates_query += ' <= %s)'
-                args_list += (periods[str(i)]['stop'],)
-            args_list += (date_from, tuple(company_ids))
-
-            query = '''SELECT l.id
-                    FROM account_move_line AS l, account_account, account_move am
-                    WHERE (l.account_id = account_account.id) AND (l.move_id = am.id)
-                        AND (am.state IN %s)
-                        AND (account_account.account_type IN %s)
-                        AND ((l.partner_id IN %s) OR (l.partner_id IS NULL))
-                        AND ''' + dates_query + '''
-                    AND (l.date <= %s)
-                    AND l.company_id IN %s'''
-            cr.execute(query, args_list)
-            partners_amount = {}
-            aml_ids = cr.fetchall()
-            aml_ids = aml_ids and [x[0] for x in aml_ids] or []
-            for line in self.env['account.move.line'].browse(aml_ids):
-                partner_id = line.partner_id.id or False
-                if partner_id not in partners_amount:
-                    partners_amount[partner_id] = 0.0
-                line_currency_id = line.company_id.currency_id
-                line_amount = line_currency_id._convert(line.balance, user_currency, company, date)
-                if user_currency.is_zero(line_amount):
-                    continue
-                for partial_line in line.matched_debit_ids:
-                    if partial_line.max_date <= date_from:
-                        line_currency_id = partial_line.company_id.currency_id
-                        line_amount += line_currency_id._convert(
-                            partial_line.amount, user_currency, company, date)
-                for partial_line in line.matched_credit_ids:
-                    if partial_line.max_date <= date_from:
-                        line_currency_id = partial_line.company_id.currency_id
-                        line_amount -= line_currency_id._convert(
-                            partial_line.amount, user_currency, company, date)
-                if not self.env.user.company_id.currency_id.is_zero(line_amount):
-                    partners_amount[partner_id] += line_amount
-                    lines[partner_id].append({
-                        'line': line,
-                        'amount': line_amount,
-                        'period': i + 1,
-                        })
-            history.append(partners_amount)
-
-        for partner in partners:
-            if partner['partner_id'] is None:
-                partner['partner_id'] = False
-            at_least_one_amount = False
-            values = {}
-            undue_amt = 0.0
-            if partner['partner_id'] in undue_amounts:  # Making sure this partner actually was found by the query
-                undue_amt = undue_amounts[partner['partner_id']]
-
-            total[6] = total[6] + undue_amt
-            values['direction'] = undue_amt
-            if not float_is_zero(values['direction'], precision_rounding=self.env.user.company_id.currency_id.rounding):
-                at_least_one_amount = True
 
+        # one conversion rate per company currency, as _convert would use
+        companies = self.env['res.company'].browse(company_ids)
+        rates = [
+            self.env['res.currency']._get_conversion_rate(
+                line_company.currency_id, user_currency, company, date)
+            for line_company in companies
+        ]
+        params = {
+            'company_ids': companies.ids,
+            'company_tuple': tuple(companies.ids),
+            'rates': rates,
+            'date_from': date_from,
+            'move_state': tuple(move_state),
+            'account_type': tuple(account_type),
+            'period_length': period_length,
+            'digits': user_currency.decimal_places,
+        }
+        partner_clause = 'TRUE'
+        if partner_ids:
+            partner_clause = '(l.partner_id IN %(partner_ids)s OR l.partner_id IS NULL)'
+            params['partner_ids'] = tuple(partner_ids)
+        self.env.cr.execute(AGED_LINES_QUERY.format(partner_clause=partner_clause), params)
+        rows = self.env.cr.dictfetchall()
+
+        lines = {}
+        partners = {partner.id: partner for partner in self.env['res.partner'].browse(
+            [row['partner_id'] for row in rows if row['partner_id']])}
+        rounding = user_currency.rounding
+        for row in rows:
+            partner_id = row['partner_id'] or False
+            lines[partner_id] = row['line_count']
+            values = {'direction': float(row['direction'])}
             for i in range(5):
-                during = False
-                if partner['partner_id'] in history[i]:
-                    during = [history[i][partner['partner_id']]]
-                # Adding counter
-                total[(i)] = total[(i)] + (during and during[0] or 0)
-                values[str(i)] = during and during[0] or 0.0
-                if not float_is_zero(values[str(i)],
-                                     precision_rounding=self.env.user.company_id.currency_id.rounding):
-                    at_least_one_amount = True
+                values[str(i)] = float(row[str(i)])
+            at_least_one_amount = any(
+                not float_is_zero(values[key], precision_rounding=rounding)
+                for key in ['direction', '0', '1', '2', '3', '4'])
+            if not at_least_one_amount and not self._context.get('include_nullified_amount'):
+                continue
             values['total'] = sum([values['direction']] + [values[str(i)] for i in range(5)])
-            ## Add for total
-            total[(i + 1)] += values['total']
-            values['partner_id'] = partner['partner_id']
-            if partner['partner_id']:
-                browsed_partner = self.env['res.partner'].browse(partner['partner_id'])
+            total[6] += values['direction']
+            for i in range(5):
+                total[i] += values[str(i)]
+            total[5] += values['total']
+            values['partner_id'] = partner_id
+            if partner_id:
+                browsed_partner = partners[partner_id]
                 values['name'] = browsed_partner.name and len(
                     browsed_partner.name) >= 45 and browsed_partner.name[
                                                     0:40] + '...' or browsed_partner.name
@@ -225,9 +140,7 @@ class ReportAgedPartnerBalance(models.AbstractModel):
             else:
                 values['name'] = _('Unknown Partner')
                 values['trust'] = False
-
-            if at_least_one_amount or (self._context.get('include_nullified_amount') and lines[partner['partner_id']]):
-                res.append(values)
+            res.append(values)
 
         return res, total, lines
 
@@ -238,7 +151,19 @@ class ReportAgedPartnerBalance(models.AbstractModel):
 
         model = self.env.context.get('active_model')
         docs = self.env[model].browse(self.env.context.get('active_id'))
+        movelines, total = self._get_aged_lines(data)
+        return {
+            'doc_ids': self.ids,
+            'doc_model': model,
+            'data': data['form'],
+            'docs': docs,
+            'time': time,
+            'get_partner_lines': movelines,
+            'get_direction': total,
+        }
 
+    @api.model
+    def _get_aged_lines(self, data):
         target_move = data['form'].get('target_move', 'all')
         date_from = data['form'].get('date_from', time.strftime('%Y-%m-%d'))
 
@@ -252,12 +177,20 @@ class ReportAgedPartnerBalance(models.AbstractModel):
         movelines, total, dummy = self._get_partner_move_lines(
             account_type, partner_ids, date_from, target_move, data['form']['period_length']
         )
-        return {
-            'doc_ids': self.ids,
-            'doc_model': model,
-            'data': data['form'],
-            'docs': docs,
-            'time': time,
-            'get_partner_lines': movelines,
-            'get_direction': total,
-        }
+        return movelines, total
+
+    @api.model
+    def _get_xlsx_rows(self, data):
+        """ Returns (title, columns, rows) of the XLSX export. """
+        movelines, total = self._get_aged_lines(data)
+        form = data['form']
+        columns = [(_('Partners'), 'text', 40), (_('Not due'), 'amount', 14)]
+        columns += [(form[str(i)]['name'], 'amount', 14) for i in range(4, -1, -1)]
+        columns.append((_('Total'), 'amount', 14))
+
+        def rows():
+            yield [_('Account Total'), total[6]] + [total[i] for i in range(4, -1, -1)] + [total[5]], True
+            for partner in movelines:
+                yield [partner['name'], partner['direction']] \
+                    + [partner[str(i)] for i in range(4, -1, -1)] + [partner['total']], False
+        return _('Aged Partner Balance'), columns, rows()
@@ -2,6 +2,12 @@ import time
 from odoo import api, models, _
 from odoo.exceptions import UserError
 
+from ..models.account_move_line import _freeze
+
+# Context keys that only define the dates of a column; contexts that differ
+# only by these keys are computed in the same query.
+PERIOD_CONTEXT_KEYS = ('date_from', 'date_to', 'strict_range', 'initial_bal')
+
 
 class ReportFinancial(models.AbstractModel):
     _name = 'report.accounting_pdf_reports.report_financial'
@@ -10,95 +16,186 @@ class ReportFinancial(models.AbstractModel):
     def _compute_account_balance(self, accounts):
         """ compute the balance, debit and credit for the provided accounts
         """
-        mapping = {
-            'balance': "COALESCE(SUM(debit),0) - COALESCE(SUM(credit), 0) as balance",
-            'debit': "COALESCE(SUM(debit), 0) as debit",
-            'credit': "COALESCE(SUM(credit), 0) as credit",
-        }
+        return self._compute_account_balances(accounts, [self._context])[0]
 
-        res = {}
-        for account in accounts:
-            res[account.id] = dict.fromkeys(mapping, 0.0)
-        if accounts:
-            tables, where_clause, where_params = self.env['account.move.line']._query_get()
-            tables = tables.replace('"', '') if tables else "account_move_line"
-            wheres = [""]
-            if where_clause.strip():
-                wheres.append(where_clause.strip())
-            filters = " AND ".join(wheres)
-            request = "SELECT account_id as id, " + ', '.join(mapping.values()) + \
-                       " FROM " + tables + \
-                       " WHERE account_id IN %s " \
-                            + filters + \
-                       " GROUP BY account_id"
-            params = (tuple(accounts._ids),) + tuple(where_params)
+    def _get_period_condition(self, context):
+        """ returns the SQL condition and params selecting the move lines of
+            one column, as _query_get would filter them by date. """
+        conditions, params = ["TRUE"], []
+        if context.get('date_to'):
+            conditions.append("account_move_line.date <= %s")
+            params.append(context['date_to'])
+        if context.get('date_from'):
+            if not context.get('strict_range'):
+                conditions.append("(account_move_line.date >= %s OR acc.include_initial_balance)")
+            elif context.get('initial_bal'):
+                conditions.append("account_move_line.date < %s")
+            else:
+                conditions.append("account_move_line.date >= %s")
+            params.append(context['date_from'])
+        return "(" + " AND ".join(conditions) + ")", params
+
+    def _compute_account_balances(self, accounts, contexts):
+        """ returns, for each context of `contexts`, the balance, debit and credit
+            of the provided accounts. Contexts that only differ by their dates are
+            read with one conditional aggregation: a SUM(CASE ...) per column.
+        """
+        results = [{account.id: dict.fromkeys(['balance', 'debit', 'credit'], 0.0) for account in accounts}
+                   for context in contexts]
+        if not accounts:
+            return results
+        groups = {}
+        for index, context in enumerate(contexts):
+            signature = tuple(sorted(
+                (key, _freeze(value)) for key, value in context.items() if key not in PERIOD_CONTEXT_KEYS))
+            groups.setdefault(signature, []).append(index)
+
+        snapshot = self.env['account.balance.snapshot']
+        for indexes in groups.values():
+            base_context = {key: value for key, value in contexts[indexes[0]].items()
+                            if key not in PERIOD_CONTEXT_KEYS}
+            query_filter = self.env['account.move.line'].with_context(base_context)._get_query_filter()
+            columns, column_params, conditions, condition_params, windows = [], [], [], [], []
+            for index in indexes:
+                condition, params = self._get_period_condition(contexts[index])
+                # closed months are read from the balance snapshot, the rest from the lines
+                window = snapshot.with_context(contexts[index])._get_window()
+                if window:
+                    condition = "(" + condition + " AND NOT (account_move_line.date >= %s AND account_move_line.date < %s))"
+                    params = params + list(window)
+                windows.append(window)
+                columns += ["COALESCE(SUM(CASE WHEN " + condition + " THEN account_move_line.debit END), 0)",
+                            "COALESCE(SUM(CASE WHEN " + condition + " THEN account_move_line.credit END), 0)"]
+                column_params += params + params
+                conditions.append(condition)
+                condition_params += params
+            request = "SELECT account_move_line.account_id, " + ', '.join(columns) + \
+                      " FROM " + query_filter.tables + \
+                      " JOIN account_account acc ON (acc.id = account_move_line.account_id)" \
+                      " WHERE account_move_line.account_id IN %s" + \
+                      (" AND " + query_filter.where if query_filter.where else "") + \
+                      " AND (" + " OR ".join(conditions) + ")" \
+                      " GROUP BY account_move_line.account_id"
+            params = column_params + [tuple(accounts._ids)] + list(query_filter.params) + condition_params
             self.env.cr.execute(request, params)
-            for row in self.env.cr.dictfetchall():
-                res[row['id']] = row
-        return res
+            for row in self.env.cr.fetchall():
+                for column, index in enumerate(indexes):
+                    debit, credit = row[1 + 2 * column], row[2 + 2 * column]
+                    results[index][row[0]] = {'balance': debit - credit, 'debit': debit, 'credit': credit}
+            for index, window in zip(indexes, windows):
+                if not window:
+                    continue
+                res = results[index]
+                for account_id, (debit, credit) in snapshot.with_context(contexts[index])._get_account_balances(
+                        accounts, window).items():
+                    res[account_id]['debit'] += debit
+                    res[account_id]['credit'] += credit
+                    res[account_id]['balance'] += debit - credit
+        return results
 
-    def _compute_report_balance(self, reports):
-        '''returns a dictionary with key=the ID of a record and value=the credit, debit and balance amount
-           computed for this record. If the record is of type :
-               'accounts' : it's the sum of the linked accounts
-               'account_type' : it's the sum of leaf accoutns with such an account_type
-               'account_report' : it's the amount of the related report
-               'sum' : it's the sum of the children of this record (aka a 'view' record)'''
+    def _get_report_accounts(self, reports):
+        '''returns a dictionary with key=the ID of an 'accounts' or 'account_type' record
+           and value=its accounts, searching all the account types involved at once.'''
+        by_type = {}
+        types = reports.filtered(lambda r: r.type == 'account_type').account_type_ids.mapped('type')
+        if types:
+            for account in self.env['account.account'].search([('account_type', 'in', types)]):
+                by_type.setdefault(account.account_type, []).append(account.id)
         res = {}
-        fields = ['credit', 'debit', 'balance']
         for report in reports:
-            if report.id in res:
-                continue
-            res[report.id] = dict((fn, 0.0) for fn in fields)
             if report.type == 'accounts':
-                # it's the sum of the linked accounts
-                res[report.id]['account'] = self._compute_account_balance(report.account_ids)
-                for value in res[report.id]['account'].values():
-                    for field in fields:
-                        res[report.id][field] += value.get(field)
+                res[report.id] = report.account_ids
             elif report.type == 'account_type':
-                # it's the sum the leaf accounts with such an account type
-                accounts = self.env['account.account'].search(
-                    [('account_type', 'in', report.account_type_ids.mapped('type'))])
-
-                res[report.id]['account'] = self._compute_account_balance(accounts)
-                for value in res[report.id]['account'].values():
-                    for field in fields:
-                        res[report.id][field] += value.get(field)
-            elif report.type == 'account_report' and report.account_report_id:
-                # it's the amount of the linked report
-                res2 = self._compute_report_balance(report.account_report_id)
-                for key, value in res2.items():
-                    for field in fields:
-                        res[report.id][field] += value[field]
-            elif report.type == 'sum':
-                # it's the sum of the children of this account.report
-                res2 = self._compute_report_balance(report.children_ids)
-                for key, value in res2.items():
-                    for field in fields:
-                        res[report.id][field] += value[field]
+                res[report.id] = self.env['account.account'].browse(
+                    [account_id for type in report.account_type_ids.mapped('type')
+                     for account_id in by_type.get(type, [])])
         return res
 
+    def _compute_report_balances(self, reports, contexts):
+        '''same as _compute_report_balance, once per context in `contexts`.
+           The report tree is walked once and the balances of all its accounts
+           are read for all the contexts at once; nodes are totalled bottom-up,
+           each of them once.'''
+        nodes = self.env['account.financial.report']
+        todo = reports
+        while todo:
+            nodes |= todo
+            todo = (todo.filtered(lambda r: r.type == 'sum').children_ids |
+                    todo.filtered(lambda r: r.type == 'account_report').account_report_id) - nodes
+        report_accounts = self._get_report_accounts(nodes)
+        all_accounts = self.env['account.account'].union(*report_accounts.values())
+
+        results = []
+        for balances in self._compute_account_balances(all_accounts, contexts):
+            res = {}
+            for report in reports:
+                self._sum_report_balance(report, report_accounts, balances, res)
+            results.append(res)
+        return results
+
+    def _sum_report_balance(self, report, report_accounts, balances, res):
+        '''totals `report` into `res` from its children, memoizing every node.'''
+        if report.id in res:
+            return res[report.id]
+        fields = ['credit', 'debit', 'balance']
+        vals = res[report.id] = dict((fn, 0.0) for fn in fields)
+        if report.id in report_accounts:
+            # 'accounts' and 'account_type': the sum of the accounts
+            vals['account'] = {account.id: balances[account.id] for account in report_accounts[report.id]}
+            values = vals['account'].values()
+        elif report.type == 'account_report' and report.account_report_id:
+            # the amount of the linked report
+            values = [self._sum_report_balance(report.account_report_id, report_accounts, balances, res)]
+        elif report.type == 'sum':
+            # the sum of the children (aka a 'view' record)
+            values = [self._sum_report_balance(child, report_accounts, balances, res)
+                      for child in report.children_ids]
+        else:
+            values = []
+        for value in values:
+            for field in fields:
+                vals[field] += value.get(field)
+        return vals
+
+    def _compute_report_balance(self, reports):
+        '''returns a dictionary with key=the ID of a record and value=the credit, debit and balance amount
+           computed for this record. If the record is of type :
+               'accounts' : it's the sum of the linked accounts
+               'account_type' : it's the sum of leaf accoutns with such an account_type
+               'account_report' : it's the amount of the related report
+               'sum' : it's the sum of the children of this record (aka a 'view' record)'''
+        return self._compute_report_balances(reports, [self._context])[0]
+
+    def _get_period_context(self, used_context, period):
+        # Not a strict range: balance sheet accounts (include_initial_balance)
+        # show their balance at the end of the period, the others the period
+        # movement only.
+        return dict(used_context, date_from=period.get('date_from') or False,
+                    date_to=period.get('date_to') or False, strict_range=False)
+
     def get_account_lines(self, data):
+        """ returns the lines of the report; 'columns' holds the balance of each
+            period of data['periods'] or, without periods, the balance and the
+            comparison balance. """
         lines = []
         account_report = self.env['account.financial.report'].search(
             [('id', '=', data['account_report_id'][0])])
         child_reports = account_report._get_children_by_order()
-        res = self.with_context(data.get('used_context'))._compute_report_balance(child_reports)
-        if data['enable_filter']:
-            comparison_res = self.with_context(
-                data.get('comparison_context'))._compute_report_balance(
-                child_reports)
-            for report_id, value in comparison_res.items():
-                res[report_id]['comp_bal'] = value['balance']
-                report_acc = res[report_id].get('account')
-                if report_acc:
-                    for account_id, val in comparison_res[report_id].get('account').items():
-                        report_acc[account_id]['comp_bal'] = val['balance']
+        used_context = data.get('used_context') or {}
+        if data.get('periods'):
+            contexts = [self._get_period_context(used_context, period) for period in data['periods']]
+        else:
+            contexts = [used_context]
+            if data['enable_filter']:
+                contexts.append(data.get('comparison_context') or {})
+        results = self.with_context(used_context)._compute_report_balances(child_reports, contexts)
+        res = results[0]
         for report in child_reports:
+            columns = [result[report.id]['balance'] * float(report.sign) for result in results]
             vals = {
                 'name': report.name,
-                'balance': res[report.id]['balance'] * float(report.sign),
+                'balance': columns[0],
+                'columns': columns,
                 'type': 'report',
                 'level': bool(report.style_overwrite) and report.style_overwrite or report.level,
                 'account_type': report.type or False, #used to underline the financial report balances
@@ -107,8 +204,8 @@ class ReportFinancial(models.AbstractModel):
                 vals['debit'] = res[report.id]['debit']
                 vals['credit'] = res[report.id]['credit']
 
-            if data['enable_filter']:
-                vals['balance_cmp'] = res[report.id]['comp_bal'] * float(report.sign)
+            if data['enable_filter'] and not data.get('periods'):
+                vals['balance_cmp'] = columns[1]
 
             lines.append(vals)
             if report.display_detail == 'no_detail':
@@ -122,9 +219,12 @@ class ReportFinancial(models.AbstractModel):
                     #financial reports for Assets, liabilities...)
                     flag = False
                     account = self.env['account.account'].browse(account_id)
+                    columns = [result[report.id]['account'][account_id]['balance'] * float(report.sign) or 0.0
+                               for result in results]
                     vals = {
                         'name': account.code + ' ' + account.name,
-                        'balance': value['balance'] * float(report.sign) or 0.0,
+                        'balance': columns[0],
+                        'columns': columns,
                         'type': 'account',
                         'level': report.display_detail == 'detail_with_hierarchy' and 4,
                         'account_type': account.account_type,
@@ -134,12 +234,10 @@ class ReportFinancial(models.AbstractModel):
                         vals['credit'] = value['credit']
                         if not account.company_id.currency_id.is_zero(vals['debit']) or not account.company_id.currency_id.is_zero(vals['credit']):
                             flag = True
-                    if not account.company_id.currency_id.is_zero(vals['balance']):
+                    if any(not account.company_id.currency_id.is_zero(column) for column in columns):
                         flag = True
-                    if data['enable_filter']:
-                        vals['balance_cmp'] = value['comp_bal'] * float(report.sign)
-                        if not account.company_id.currency_id.is_zero(vals['balance_cmp']):
-                            flag = True
+                    if data['enable_filter'] and not data.get('periods'):
+                        vals['balance_cmp'] = columns[1]
                     if flag:
                         sub_lines.append(vals)
                 lines += sorted(sub_lines, key=lambda sub_line: sub_line['name'])
@@ -1,12 +1,84 @@
 import time
+import uuid
+from itertools import groupby
+from operator import itemgetter
+
 from odoo import api, models, _
 from odoo.exceptions import UserError
 
+# Rows fetched per round trip when streaming the ledger lines.
+LEDGER_FETCH_SIZE = 2000
+
 
 class ReportGeneralLedger(models.AbstractModel):
     _name = 'report.accounting_pdf_reports.report_general_ledger'
     _description = 'General Ledger Report'
 
+    def _get_ledger_filters(self, analytic_account_ids, partner_ids, initial=False):
+        context = dict(self.env.context)
+        if initial:
+            context['date_to'] = False
+            context['initial_bal'] = True
+        if analytic_account_ids:
+            context['analytic_account_ids'] = analytic_account_ids
+        if partner_ids:
+            context['partner_ids'] = partner_ids
+        query_filter = self.env['account.move.line'].with_context(context)._get_query_filter(alias='l')
+        filters = " AND " + query_filter.where if query_filter.where else ""
+        return filters, list(query_filter.params)
+
+    def _get_ledger_totals(self, accounts, filters, params):
+        """Returns {account_id: (debit, credit, line count)} for the given filters."""
+        self.env.cr.execute("""
+            SELECT l.account_id, COALESCE(SUM(l.debit), 0.0), COALESCE(SUM(l.credit), 0.0), COUNT(*)
+              FROM account_move_line l
+              JOIN account_move m ON (l.move_id = m.id)
+              JOIN account_journal j ON (l.journal_id = j.id)
+             WHERE l.account_id IN %s""" + filters + """
+          GROUP BY l.account_id""", [tuple(accounts.ids)] + params)
+        return {account_id: (debit, credit, count) for account_id, debit, credit, count in self.env.cr.fetchall()}
+
+    def _iter_ledger_lines(self, accounts, filters, params, sortby):
+        """
+        Streams the move lines of the given accounts, in the accounts order,
+        with their running balance computed by a window function. Rows are
+        fetched LEDGER_FETCH_SIZE at a time from a server-side cursor.
+        """
+        if not accounts:
+            return
+        sql_sort = 'l.date, l.move_id'
+        if sortby == 'sort_journal_partner':
+            sql_sort = 'j.code, p.name, l.move_id'
+        sql = ('''SELECT l.id AS lid, l.account_id AS account_id,
+            l.date AS ldate, j.code AS lcode, l.currency_id,
+            l.amount_currency, '' AS analytic_account_id,
+            l.ref AS lref, l.name AS lname, COALESCE(l.debit,0) AS debit,
+            COALESCE(l.credit,0) AS credit,
+            SUM(COALESCE(l.debit,0) - COALESCE(l.credit,0)) OVER (
+                PARTITION BY acc.seq ORDER BY ''' + sql_sort + ''', l.id
+                ROWS UNBOUNDED PRECEDING) AS balance,
+            m.name AS move_name, c.symbol AS currency_code,
+            p.name AS partner_name
+            FROM account_move_line l
+            JOIN unnest(%s::int[]) WITH ORDINALITY AS acc(account_id, seq) ON (acc.account_id = l.account_id)
+            JOIN account_move m ON (l.move_id=m.id)
+            LEFT JOIN res_currency c ON (l.currency_id=c.id)
+            LEFT JOIN res_partner p ON (l.partner_id=p.id)
+            JOIN account_journal j ON (l.journal_id=j.id)
+            WHERE TRUE ''' + filters + '''
+            ORDER BY acc.seq, ''' + sql_sort + ''', l.id''')
+        cr = self.env.cr
+        cursor_name = 'general_ledger_%s' % uuid.uuid4().hex
+        cr.execute('DECLARE %s NO SCROLL CURSOR FOR %s' % (cursor_name, sql), [accounts.ids] + params)
+        while True:
+            cr.execute('FETCH %s FROM %s' % (LEDGER_FETCH_SIZE, cursor_name))
+            rows = cr.dictfetchall()
+            if not rows:
+                break
+            yield from rows
+        # A cursor left open by an abandoned iteration is closed with the transaction.
+        cr.execute('CLOSE %s' % cursor_name)
+
     def _get_account_move_entry(self, accounts, analytic_account_ids,
                                 partner_ids, init_balance,
                                 sortby, display_account):
@@ -18,122 +90,76 @@ class ReportGeneralLedger(models.AbstractModel):
                 sortby: sorting by date or partner and journal
                 display_account: type of account(receivable, payable and both)
 
-        Returns a dictionary of accounts with following key and value {
+        Returns an iterator of accounts with following key and value {
                 'code': account code,
                 'name': account name,
                 'debit': sum of total debit amount,
                 'credit': sum of total credit amount,
                 'balance': total balance,
-                'amount_currency': sum of amount_currency,
-                'move_lines': list of move line
+                'move_lines': iterator of move lines
         }
-        """
-        cr = self.env.cr
-        MoveLine = self.env['account.move.line']
-        move_lines = {x: [] for x in accounts.ids}
 
-        # Prepare initial sql query and Get the initial move lines
+        Account totals come from grouped queries; move lines are streamed,
+        so each account's 'move_lines' must be consumed before the next
+        account is requested.
+        """
+        init_totals = {}
         if init_balance:
-            context = dict(self.env.context)
-            context['date_from'] = self.env.context.get('date_from')
-            context['date_to'] = False
-            context['initial_bal'] = True
-            if analytic_account_ids:
-                context['analytic_account_ids'] = analytic_account_ids
-            if partner_ids:
-                context['partner_ids'] = partner_ids
-            init_tables, init_where_clause, init_where_params = MoveLine.with_context(context)._query_get()
-            init_wheres = [""]
-            if init_where_clause.strip():
-                init_wheres.append(init_where_clause.strip())
-            init_filters = " AND ".join(init_wheres)
-            filters = init_filters.replace('account_move_line__move_id', 'm').replace('account_move_line', 'l')
-            sql = ("""SELECT 0 AS lid, l.account_id AS account_id, '' AS ldate,
-                '' AS lcode, 0.0 AS amount_currency, 
-                '' AS analytic_account_id, '' AS lref, 
-                'Initial Balance' AS lname, COALESCE(SUM(l.debit),0.0) AS debit, 
-                COALESCE(SUM(l.credit),0.0) AS credit, 
-                COALESCE(SUM(l.debit),0) - COALESCE(SUM(l.credit), 0) as balance, 
-                '' AS lpartner_id,\
-                '' AS move_name, '' AS move_id, '' AS currency_code,\
-                NULL AS currency_id,\
-                '' AS invoice_id, '' AS invoice_type, '' AS invoice_number,\
-                '' AS partner_name\
-                FROM account_move_line l\
-                LEFT JOIN account_move m ON (l.move_id=m.id)\
-                LEFT JOIN res_currency c ON (l.currency_id=c.id)\
-                LEFT JOIN res_partner p ON (l.partner_id=p.id)\
-                JOIN account_journal j ON (l.journal_id=j.id)\
-                WHERE l.account_id IN %s""" + filters + ' GROUP BY l.account_id')
-            params = (tuple(accounts.ids),) + tuple(init_where_params)
-            cr.execute(sql, params)
-            for row in cr.dictfetchall():
-                move_lines[row.pop('account_id')].append(row)
-
-        sql_sort = 'l.date, l.move_id'
-        if sortby == 'sort_journal_partner':
-            sql_sort = 'j.code, p.name, l.move_id'
+            init_totals = self._get_ledger_totals(
+                accounts, *self._get_ledger_filters(analytic_account_ids, partner_ids, initial=True))
+        filters, params = self._get_ledger_filters(analytic_account_ids, partner_ids)
+        totals = self._get_ledger_totals(accounts, filters, params)
 
-        # Prepare sql query base on selected parameters from wizard
-        context = dict(self.env.context)
-        if analytic_account_ids:
-            context['analytic_account_ids'] = analytic_account_ids
-        if partner_ids:
-            context['partner_ids'] = partner_ids
-        tables, where_clause, where_params = MoveLine.with_context(context)._query_get()
-        wheres = [""]
-        if where_clause.strip():
-            wheres.append(where_clause.strip())
-        filters = " AND ".join(wheres)
-        filters = filters.replace('account_move_line__move_id', 'm').replace('account_move_line', 'l')
-
-        # Get move lines base on sql query and Calculate the total balance of move lines
-        sql = ('''SELECT l.id AS lid, l.account_id AS account_id, 
-            l.date AS ldate, j.code AS lcode, l.currency_id, 
-            l.amount_currency, '' AS analytic_account_id,
-            l.ref AS lref, l.name AS lname, COALESCE(l.debit,0) AS debit, 
-            COALESCE(l.credit,0) AS credit, 
-            COALESCE(SUM(l.debit),0) - COALESCE(SUM(l.credit), 0) AS balance,\
-            m.name AS move_name, c.symbol AS currency_code, 
-            p.name AS partner_name\
-            FROM account_move_line l\
-            JOIN account_move m ON (l.move_id=m.id)\
-            LEFT JOIN res_currency c ON (l.currency_id=c.id)\
-            LEFT JOIN res_partner p ON (l.partner_id=p.id)\
-            JOIN account_journal j ON (l.journal_id=j.id)\
-            JOIN account_account acc ON (l.account_id = acc.id) \
-            WHERE l.account_id IN %s ''' + filters + ''' GROUP BY l.id, 
-            l.account_id, l.date, j.code, l.currency_id, l.amount_currency, 
-            l.ref, l.name, m.name, c.symbol, p.name ORDER BY ''' + sql_sort)
-        params = (tuple(accounts.ids),) + tuple(where_params)
-        cr.execute(sql, params)
-
-        for row in cr.dictfetchall():
-            balance = 0
-            for line in move_lines.get(row['account_id']):
-                balance += line['debit'] - line['credit']
-            row['balance'] += balance
-            move_lines[row.pop('account_id')].append(row)
-
-        # Calculate the debit, credit and balance for Accounts
         account_res = []
         for account in accounts:
             currency = account.currency_id and account.currency_id or account.company_id.currency_id
-            res = dict((fn, 0.0) for fn in ['credit', 'debit', 'balance'])
-            res['code'] = account.code
-            res['name'] = account.name
-            res['move_lines'] = move_lines[account.id]
-            for line in res.get('move_lines'):
-                res['debit'] += line['debit']
-                res['credit'] += line['credit']
-                res['balance'] = line['balance']
-            if display_account == 'all':
-                account_res.append(res)
-            if display_account == 'movement' and res.get('move_lines'):
-                account_res.append(res)
-            if display_account == 'not_zero' and not currency.is_zero(res['balance']):
-                account_res.append(res)
-        return account_res
+            init_debit, init_credit, init_count = init_totals.get(account.id, (0.0, 0.0, 0))
+            debit, credit, count = totals.get(account.id, (0.0, 0.0, 0))
+            res = {
+                'code': account.code,
+                'name': account.name,
+                'debit': init_debit + debit,
+                'credit': init_credit + credit,
+                'balance': init_debit - init_credit + debit - credit,
+            }
+            if display_account == 'all' \
+                    or (display_account == 'movement' and (init_count or count)) \
+                    or (display_account == 'not_zero' and not currency.is_zero(res['balance'])):
+                account_res.append((account, res, count))
+
+        # Only the lines of the accounts that are displayed are streamed.
+        lines = groupby(
+            self._iter_ledger_lines(
+                accounts.browse([account.id for account, res, count in account_res if count]),
+                filters, params, sortby),
+            key=itemgetter('account_id'))
+        group = next(lines, None)
+        for account, res, count in account_res:
+            rows = ()
+            if count and group:
+                rows = group[1]
+            res['move_lines'] = self._iter_account_lines(rows, init_totals.get(account.id))
+            yield res
+            if count:
+                group = next(lines, None)
+
+    def _iter_account_lines(self, rows, init_total):
+        opening = 0.0
+        if init_total:
+            init_debit, init_credit, init_count = init_total
+            opening = init_debit - init_credit
+            yield {
+                'lid': 0, 'ldate': '', 'lcode': '', 'amount_currency': 0.0,
+                'analytic_account_id': '', 'lref': '', 'lname': 'Initial Balance',
+                'debit': init_debit, 'credit': init_credit, 'balance': opening,
+                'lpartner_id': '', 'move_name': '', 'move_id': '', 'currency_code': '',
+                'currency_id': None, 'invoice_id': '', 'invoice_type': '',
+                'invoice_number': '', 'partner_name': '',
+            }
+        for row in rows:
+            row.pop('account_id')
+            row['balance'] += opening
+            yield row
 
     @api.model
     def _get_report_values(self, docids, data=None):
@@ -182,3 +208,32 @@ class ReportGeneralLedger(models.AbstractModel):
             'partner_ids': partner_ids,
             'analytic_account_ids': analytic_account_ids,
         }
+
+    @api.model
+    def _get_xlsx_rows(self, data):
+        """ Returns (title, columns, rows) of the XLSX export, rows being
+            streamed from the same account and line iterators as the PDF.
+        """
+        values = self.with_context(
+            active_model=data['model'], active_ids=data['ids'],
+        )._get_report_values(data['ids'], data)
+        columns = [
+            (_('Date'), 'date', 11), (_('JRNL'), 'text', 8), (_('Partner'), 'text', 30),
+            (_('Ref'), 'text', 20), (_('Move'), 'text', 20), (_('Entry Label'), 'text', 40),
+            (_('Debit'), 'amount', 14), (_('Credit'), 'amount', 14), (_('Balance'), 'amount', 14),
+            (_('Currency'), 'amount', 14),
+        ]
+
+        def rows():
+            for account in values['Accounts']:
+                yield [
+                    '', '', '', '', '', account['code'] + ' ' + account['name'],
+                    account['debit'], account['credit'], account['balance'], None,
+                ], True
+                for line in account['move_lines']:
+                    yield [
+                        line['ldate'], line['lcode'], line['partner_name'], line['lref'],
+                        line['move_name'], line['lname'], line['debit'], line['credit'],
+                        line['balance'], line['amount_currency'] if line['currency_id'] else None,
+                    ], False
+        return _('General Ledger'), columns, rows()
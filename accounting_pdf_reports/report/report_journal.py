@@ -1,7 +1,13 @@
 import time
+import uuid
+from itertools import groupby
+from operator import itemgetter
+
 from odoo import api, models, _
 from odoo.exceptions import UserError
 
+from .report_general_ledger import LEDGER_FETCH_SIZE
+
 
 class ReportJournal(models.AbstractModel):
     _name = 'report.accounting_pdf_reports.report_journal'
@@ -90,6 +96,122 @@ class ReportJournal(models.AbstractModel):
                 res[tax]['tax_amount'] = res[tax]['tax_amount'] * -1
         return res
 
+    def _get_journal_totals(self, data, journals):
+        """Returns {journal_id: (debit, credit)} in one grouped query."""
+        query_get_clause = self._get_query_get_clause(data)
+        params = [self._get_move_state(data), tuple(journals.ids)] + query_get_clause[2]
+        self.env.cr.execute('SELECT "account_move_line".journal_id, SUM(debit), SUM(credit) FROM ' + query_get_clause[0] + ', account_move am '
+                        'WHERE "account_move_line".move_id=am.id AND am.state IN %s AND "account_move_line".journal_id IN %s AND ' + query_get_clause[1] + ' '
+                        'GROUP BY "account_move_line".journal_id',
+                        tuple(params))
+        return {journal_id: (debit or 0.0, credit or 0.0) for journal_id, debit, credit in self.env.cr.fetchall()}
+
+    def _get_journal_taxes(self, data, journals):
+        """
+        Returns {journal_id: {tax: {'base_amount', 'tax_amount'}}}: the base
+        and tax amounts of every journal and tax come from one grouped query.
+        """
+        query_get_clause = self._get_query_get_clause(data)
+        params = [self._get_move_state(data), tuple(journals.ids)] + query_get_clause[2]
+        where = """
+            WHERE am.state IN %s
+                AND "account_move_line".journal_id IN %s
+                AND """ + query_get_clause[1]
+        query = """
+            SELECT journal_id, tax_id, SUM(base_amount), SUM(tax_amount)
+            FROM (
+                SELECT "account_move_line".journal_id, rel.account_tax_id AS tax_id,
+                       "account_move_line".balance AS base_amount, 0.0 AS tax_amount, TRUE AS is_base
+                FROM """ + query_get_clause[0] + """
+                JOIN account_move_line_account_tax_rel rel ON ("account_move_line".id = rel.account_move_line_id)
+                LEFT JOIN account_move am ON "account_move_line".move_id = am.id""" + where + """
+                UNION ALL
+                SELECT "account_move_line".journal_id, "account_move_line".tax_line_id,
+                       0.0, "account_move_line".debit - "account_move_line".credit, FALSE
+                FROM """ + query_get_clause[0] + """
+                LEFT JOIN account_move am ON "account_move_line".move_id = am.id""" + where + """
+                    AND "account_move_line".tax_line_id IS NOT NULL
+            ) amounts
+           GROUP BY journal_id, tax_id
+           HAVING BOOL_OR(is_base)
+           ORDER BY journal_id, tax_id"""
+        self.env.cr.execute(query, tuple(params + params))
+        rows = self.env.cr.fetchall()
+        taxes = {tax.id: tax for tax in self.env['account.tax'].browse(list({row[1] for row in rows}))}
+        res = {journal.id: {} for journal in journals}
+        journal_types = {journal.id: journal.type for journal in journals}
+        for journal_id, tax_id, base_amount, tax_amount in rows:
+            sign = -1 if journal_types[journal_id] == 'sale' else 1
+            # sales operation are credits
+            res[journal_id][taxes[tax_id]] = {
+                'base_amount': base_amount * sign,
+                'tax_amount': tax_amount * sign,
+            }
+        return res
+
+    def _iter_journal_lines(self, data, journals, sort_selection):
+        """
+        Streams the move lines of the given journals, in the journals order,
+        as (journal_id, move line). Ids are fetched LEDGER_FETCH_SIZE at a time
+        from a server-side cursor and browsed as one prefetch group; the cache
+        of a batch is dropped before the next one is read.
+        """
+        if not journals:
+            return
+        query_get_clause = self._get_query_get_clause(data)
+        params = [journals.ids, self._get_move_state(data)] + query_get_clause[2]
+        query = 'SELECT "account_move_line".id, "account_move_line".journal_id FROM ' + query_get_clause[0] + ' JOIN unnest(%s::int[]) WITH ORDINALITY AS jrnl(journal_id, seq) ON (jrnl.journal_id = "account_move_line".journal_id), account_move am, account_account acc WHERE "account_move_line".account_id = acc.id AND "account_move_line".move_id=am.id AND am.state IN %s AND ' + query_get_clause[1] + ' ORDER BY jrnl.seq, '
+        if sort_selection == 'date':
+            query += '"account_move_line".date'
+        else:
+            query += 'am.name'
+        query += ', "account_move_line".move_id, acc.code'
+        cr = self.env.cr
+        cursor_name = 'journal_audit_%s' % uuid.uuid4().hex
+        cr.execute('DECLARE %s NO SCROLL CURSOR FOR %s' % (cursor_name, query), tuple(params))
+        move_lines = self.env['account.move.line']
+        while True:
+            cr.execute('FETCH %s FROM %s' % (LEDGER_FETCH_SIZE, cursor_name))
+            rows = cr.fetchall()
+            if not rows:
+                break
+            move_lines.invalidate_model()
+            batch = move_lines.browse([row[0] for row in rows])
+            yield from zip((row[1] for row in rows), batch)
+        # A cursor left open by an abandoned iteration is closed with the transaction.
+        cr.execute('CLOSE %s' % cursor_name)
+
+    def _get_journal_entries(self, data, journals, sort_selection):
+        """
+        Returns an iterator of {'journal', 'lines', 'debit', 'credit', 'taxes'}
+        in the order of `journals`. Each journal's 'lines' must be consumed
+        before the next journal is requested.
+        """
+        if not journals:
+            return
+        totals = self._get_journal_totals(data, journals)
+        taxes = self._get_journal_taxes(data, journals)
+        lines = groupby(self._iter_journal_lines(data, journals, sort_selection), key=itemgetter(0))
+        group = next(lines, None)
+        for journal in journals:
+            debit, credit = totals.get(journal.id, (0.0, 0.0))
+            matched = group and group[0] == journal.id
+            rows = (line for journal_id, line in group[1]) if matched else ()
+            yield {
+                'journal': journal,
+                'lines': rows,
+                'debit': debit,
+                'credit': credit,
+                'taxes': taxes[journal.id],
+            }
+            if matched:
+                group = next(lines, None)
+
+    def _get_move_state(self, data):
+        if data['form'].get('target_move', 'all') == 'posted':
+            return ('posted',)
+        return ('draft', 'posted')
+
     def _get_query_get_clause(self, data):
         return self.env['account.move.line'].with_context(data['form'].get('used_context', {}))._query_get()
 
@@ -98,19 +220,18 @@ class ReportJournal(models.AbstractModel):
         if not data.get('form'):
             raise UserError(_("Form content is missing, this report cannot be printed."))
 
-        target_move = data['form'].get('target_move', 'all')
         sort_selection = data['form'].get('sort_selection', 'date')
 
-        res = {}
-        for journal in data['form']['journal_ids']:
-            res[journal] = self.with_context(data['form'].get('used_context', {})).lines(target_move, journal, sort_selection, data)
+        journals = self.env['account.journal'].browse(data['form']['journal_ids'])
+        entries = self.with_context(data['form'].get('used_context', {}))._get_journal_entries(
+            data, journals, sort_selection)
         return {
             'doc_ids': data['form']['journal_ids'],
             'doc_model': self.env['account.journal'],
             'data': data,
-            'docs': self.env['account.journal'].browse(data['form']['journal_ids']),
+            'docs': journals,
             'time': time,
-            'lines': res,
+            'Journals': entries,
             'sum_credit': self._sum_credit,
             'sum_debit': self._sum_debit,
             'get_taxes': self._get_taxes,
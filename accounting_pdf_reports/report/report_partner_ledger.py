@@ -1,69 +1,115 @@
 import time
+import uuid
+from itertools import groupby
+from operator import itemgetter
+
 from odoo import api, models, _
 from odoo.exceptions import UserError
 
+from .report_general_ledger import LEDGER_FETCH_SIZE
+
 
 class ReportPartnerLedger(models.AbstractModel):
     _name = 'report.accounting_pdf_reports.report_partnerledger'
     _description = 'Partner Ledger Report'
 
-    def _lines(self, data, partner):
-        full_account = []
-        currency = self.env['res.currency']
+    def _get_partner_filters(self, data):
         query_get_data = self.env['account.move.line'].with_context(data['form'].get('used_context', {}))._query_get()
         reconcile_clause = "" if data['form']['reconciled'] else ' AND "account_move_line".full_reconcile_id IS NULL '
-        params = [partner.id, tuple(data['computed']['move_state']), tuple(data['computed']['account_ids'])] + query_get_data[2]
+        where = """ AND m.state IN %s
+                AND "account_move_line".account_id IN %s AND """ + query_get_data[1] + reconcile_clause
+        params = [tuple(data['computed']['move_state']), tuple(data['computed']['account_ids'])] + query_get_data[2]
+        return query_get_data[0], where, params
+
+    def _get_partner_totals(self, data, partners):
+        """Returns {partner_id: (debit, credit, line count)} in one grouped query."""
+        if not partners:
+            return {}
+        tables, where, params = self._get_partner_filters(data)
+        query = """SELECT "account_move_line".partner_id, COALESCE(SUM(debit), 0.0), COALESCE(SUM(credit), 0.0), COUNT(*)
+                FROM """ + tables + """
+                JOIN account_move m ON (m.id = "account_move_line".move_id)
+                WHERE "account_move_line".partner_id IN %s""" + where + """
+                GROUP BY "account_move_line".partner_id"""
+        self.env.cr.execute(query, tuple([tuple(partners.ids)] + params))
+        return {partner_id: (debit, credit, count) for partner_id, debit, credit, count in self.env.cr.fetchall()}
+
+    def _iter_partner_lines(self, data, partners):
+        """
+        Streams the move lines of the given partners, in the partners order
+        and by date, with their running balance computed by a window function.
+        Rows are fetched LEDGER_FETCH_SIZE at a time from a server-side cursor.
+        """
+        if not partners:
+            return
+        tables, where, params = self._get_partner_filters(data)
         query = """
-            SELECT "account_move_line".id, "account_move_line".date, j.code, acc.code as a_code, acc.name as a_name, "account_move_line".ref, m.name as move_name, "account_move_line".name, "account_move_line".debit, "account_move_line".credit, "account_move_line".amount_currency,"account_move_line".currency_id, c.symbol AS currency_code
-            FROM """ + query_get_data[0] + """
+            SELECT "account_move_line".id, "account_move_line".partner_id, "account_move_line".date, j.code, acc.code as a_code, acc.name as a_name, "account_move_line".ref, m.name as move_name, "account_move_line".name, "account_move_line".debit, "account_move_line".credit, "account_move_line".amount_currency,"account_move_line".currency_id, c.symbol AS currency_code,
+                SUM("account_move_line".debit - "account_move_line".credit) OVER (
+                    PARTITION BY p.seq ORDER BY "account_move_line".date, "account_move_line".id
+                    ROWS UNBOUNDED PRECEDING) AS progress
+            FROM """ + tables + """
+            JOIN unnest(%s::int[]) WITH ORDINALITY AS p(partner_id, seq) ON (p.partner_id = "account_move_line".partner_id)
             LEFT JOIN account_journal j ON ("account_move_line".journal_id = j.id)
             LEFT JOIN account_account acc ON ("account_move_line".account_id = acc.id)
             LEFT JOIN res_currency c ON ("account_move_line".currency_id=c.id)
             LEFT JOIN account_move m ON (m.id="account_move_line".move_id)
-            WHERE "account_move_line".partner_id = %s
-                AND m.state IN %s
-                AND "account_move_line".account_id IN %s AND """ + query_get_data[1] + reconcile_clause + """
-                ORDER BY "account_move_line".date"""
-        self.env.cr.execute(query, tuple(params))
-        res = self.env.cr.dictfetchall()
-        sum = 0.0
-        lang_code = self.env.context.get('lang') or 'en_US'
-        lang = self.env['res.lang']
-        lang_id = lang._lang_get(lang_code)
-        date_format = lang_id.date_format
-        for r in res:
-            r['date'] = r['date']
-            r['displayed_name'] = '-'.join(
-                r[field_name] for field_name in ('move_name', 'ref', 'name')
-                if r[field_name] not in (None, '', '/')
-            )
-            sum += r['debit'] - r['credit']
-            r['progress'] = sum
-            r['currency_id'] = currency.browse(r.get('currency_id'))
-            full_account.append(r)
-        return full_account
+            WHERE TRUE""" + where + """
+                ORDER BY p.seq, "account_move_line".date, "account_move_line".id"""
+        cr = self.env.cr
+        cursor_name = 'partner_ledger_%s' % uuid.uuid4().hex
+        cr.execute('DECLARE %s NO SCROLL CURSOR FOR %s' % (cursor_name, query), [partners.ids] + params)
+        currency = self.env['res.currency']
+        while True:
+            cr.execute('FETCH %s FROM %s' % (LEDGER_FETCH_SIZE, cursor_name))
+            rows = cr.dictfetchall()
+            if not rows:
+                break
+            for r in rows:
+                r['displayed_name'] = '-'.join(
+                    r[field_name] for field_name in ('move_name', 'ref', 'name')
+                    if r[field_name] not in (None, '', '/')
+                )
+                r['currency_id'] = currency.browse(r.get('currency_id'))
+                yield r
+        # A cursor left open by an abandoned iteration is closed with the transaction.
+        cr.execute('CLOSE %s' % cursor_name)
+
+    def _get_partner_entries(self, data, partners):
+        """
+        Returns an iterator of {'partner', 'debit', 'credit', 'balance', 'lines'}
+        in the order of `partners`. Totals come from one grouped query and the
+        lines of all partners from one streamed query, so each partner's
+        'lines' must be consumed before the next partner is requested.
+        """
+        totals = self._get_partner_totals(data, partners)
+        lines = groupby(
+            self._iter_partner_lines(data, partners.filtered(lambda p: p.id in totals)),
+            key=itemgetter('partner_id'))
+        group = next(lines, None)
+        for partner in partners:
+            debit, credit, count = totals.get(partner.id, (0.0, 0.0, 0))
+            rows = ()
+            if count and group:
+                rows = group[1]
+            yield {
+                'partner': partner,
+                'debit': debit,
+                'credit': credit,
+                'balance': debit - credit,
+                'lines': rows,
+            }
+            if count:
+                group = next(lines, None)
+
+    def _lines(self, data, partner):
+        return list(self._iter_partner_lines(data, partner))
 
     def _sum_partner(self, data, partner, field):
         if field not in ['debit', 'credit', 'debit - credit']:
             return
-        result = 0.0
-        query_get_data = self.env['account.move.line'].with_context(data['form'].get('used_context', {}))._query_get()
-        reconcile_clause = "" if data['form']['reconciled'] else ' AND "account_move_line".full_reconcile_id IS NULL '
-
-        params = [partner.id, tuple(data['computed']['move_state']), tuple(data['computed']['account_ids'])] + query_get_data[2]
-        query = """SELECT sum(""" + field + """)
-                FROM """ + query_get_data[0] + """, account_move AS m
-                WHERE "account_move_line".partner_id = %s
-                    AND m.id = "account_move_line".move_id
-                    AND m.state IN %s
-                    AND account_id IN %s
-                    AND """ + query_get_data[1] + reconcile_clause
-        self.env.cr.execute(query, tuple(params))
-
-        contemp = self.env.cr.fetchone()
-        if contemp is not None:
-            result = contemp[0] or 0.0
-        return result
+        debit, credit, count = self._get_partner_totals(data, partner).get(partner.id, (0.0, 0.0, 0))
+        return {'debit': debit, 'credit': credit, 'debit - credit': debit - credit}[field]
 
     @api.model
     def _get_report_values(self, docids, data=None):
@@ -109,7 +155,7 @@ class ReportPartnerLedger(models.AbstractModel):
             partner_ids = [res['partner_id'] for res in
                            self.env.cr.dictfetchall()]
         partners = obj_partner.browse(partner_ids)
-        partners = sorted(partners, key=lambda x: (x.ref or '', x.name or ''))
+        partners = partners.browse([partner.id for partner in sorted(partners, key=lambda x: (x.ref or '', x.name or ''))])
 
         return {
             'doc_ids': partner_ids,
@@ -117,6 +163,40 @@ class ReportPartnerLedger(models.AbstractModel):
             'data': data,
             'docs': partners,
             'time': time,
+            'Partners': self._get_partner_entries(data, partners),
             'lines': self._lines,
             'sum_partner': self._sum_partner,
         }
+
+    @api.model
+    def _get_xlsx_rows(self, data):
+        """ Returns (title, columns, rows) of the XLSX export, rows being
+            streamed from the same partner and line iterators as the PDF.
+        """
+        values = self._get_report_values(data['ids'], data)
+        columns = [
+            (_('Date'), 'date', 11), (_('JRNL'), 'text', 8), (_('Account'), 'text', 12),
+            (_('Ref'), 'text', 40), (_('Debit'), 'amount', 14), (_('Credit'), 'amount', 14),
+            (_('Balance'), 'amount', 14),
+        ]
+        with_currency = data['form']['amount_currency']
+        if with_currency:
+            columns.append((_('Currency'), 'amount', 14))
+
+        def rows():
+            for entry in values['Partners']:
+                partner = entry['partner']
+                row = [
+                    '', '', '', '-'.join(name for name in (partner.ref, partner.name) if name),
+                    entry['debit'], entry['credit'], entry['balance'],
+                ]
+                yield row + [None] * with_currency, True
+                for line in entry['lines']:
+                    row = [
+                        line['date'], line['code'], line['a_code'], line['displayed_name'],
+                        line['debit'], line['credit'], line['progress'],
+                    ]
+                    if with_currency:
+                        row.append(line['amount_currency'] if line['currency_id'] else None)
+                    yield row, False
+        return _('Partner Ledger'), columns, rows()
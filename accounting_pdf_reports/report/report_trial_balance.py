@@ -22,13 +22,17 @@ class ReportTrialBalance(models.AbstractModel):
 
         account_result = {}
         # Prepare sql query base on selected parameters from wizard
-        tables, where_clause, where_params = self.env['account.move.line']._query_get()
-        tables = tables.replace('"','')
-        if not tables:
-            tables = 'account_move_line'
+        query_filter = self.env['account.move.line']._get_query_filter()
+        tables, where_params = query_filter.tables, list(query_filter.params)
         wheres = [""]
-        if where_clause.strip():
-            wheres.append(where_clause.strip())
+        if query_filter.where:
+            wheres.append(query_filter.where)
+        # closed months are read from the balance snapshot, the rest from the lines
+        snapshot = self.env['account.balance.snapshot']
+        window = snapshot._get_window()
+        if window:
+            wheres.append("NOT (account_move_line.date >= %s AND account_move_line.date < %s)")
+            where_params += window
         filters = " AND ".join(wheres)
         # compute the balance, debit and credit for the provided accounts
         request = ("SELECT account_id AS id, SUM(debit) AS debit, SUM(credit) AS credit, "
@@ -38,6 +42,12 @@ class ReportTrialBalance(models.AbstractModel):
         self.env.cr.execute(request, params)
         for row in self.env.cr.dictfetchall():
             account_result[row.pop('id')] = row
+        if window:
+            for account_id, (debit, credit) in snapshot._get_account_balances(accounts, window).items():
+                row = account_result.setdefault(account_id, dict.fromkeys(['debit', 'credit', 'balance'], 0.0))
+                row['debit'] += debit
+                row['credit'] += credit
+                row['balance'] += debit - credit
 
         account_res = []
         for account in accounts:
@@ -88,3 +98,19 @@ class ReportTrialBalance(models.AbstractModel):
             'time': time,
             'Accounts': account_res,
         }
+
+    @api.model
+    def _get_xlsx_rows(self, data):
+        """ Returns (title, columns, rows) of the XLSX export. """
+        values = self.with_context(
+            active_model=data['model'], active_ids=data['ids'],
+        )._get_report_values(data['ids'], data)
+        columns = [
+            (_('Code'), 'text', 12), (_('Account'), 'text', 40),
+            (_('Debit'), 'amount', 14), (_('Credit'), 'amount', 14), (_('Balance'), 'amount', 14),
+        ]
+        rows = (
+            ([account['code'], account['name'], account['debit'], account['credit'], account['balance']], False)
+            for account in values['Accounts']
+        )
+        return _('Trial Balance'), columns, rows
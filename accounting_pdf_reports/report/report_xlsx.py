@@ -0,0 +1,47 @@
+import datetime
+
+import xlsxwriter
+
+# Cell formats by column kind, the bold variant is used for total rows.
+XLSX_FORMATS = {
+    'text': {},
+    'date': {'num_format': 'yyyy-mm-dd'},
+    'amount': {'num_format': '#,##0.00'},
+}
+
+
+def write_xlsx(fileobj, title, columns, rows):
+    """
+    Writes `rows` to a one sheet workbook in `fileobj`.
+
+    :param columns: list of (label, kind, width), kind being a key of XLSX_FORMATS
+    :param rows: iterable of (values, bold), values following `columns`
+
+    The workbook is opened in xlsxwriter's constant_memory mode: a row is
+    flushed to disk as soon as the next one is started, so the memory used
+    does not depend on the number of rows and `rows` can be a generator
+    fed by the report queries.
+    """
+    workbook = xlsxwriter.Workbook(fileobj, {'constant_memory': True})
+    formats = {
+        kind: (workbook.add_format(fmt), workbook.add_format(dict(fmt, bold=True)))
+        for kind, fmt in XLSX_FORMATS.items()
+    }
+    sheet = workbook.add_worksheet(title[:31])
+    for col, (label, kind, width) in enumerate(columns):
+        sheet.set_column(col, col, width)
+        sheet.write_string(0, col, label, formats['text'][True])
+    sheet.freeze_panes(1, 0)
+    for row, (values, bold) in enumerate(rows, 1):
+        for col, value in enumerate(values):
+            if value is None or value is False or value == '':
+                continue
+            kind = columns[col][1]
+            cell_format = formats[kind][bool(bold)]
+            if kind == 'amount':
+                sheet.write_number(row, col, float(value), cell_format)
+            elif kind == 'date' and isinstance(value, datetime.date):
+                sheet.write_datetime(row, col, value, cell_format)
+            else:
+                sheet.write_string(row, col, str(value), cell_format)
+    workbook.close()
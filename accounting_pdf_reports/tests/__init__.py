@@ -0,0 +1,5 @@
+from . import test_balance_snapshot
+from . import test_aged_partner
+from . import test_general_ledger
+from . import test_partner_ledger
+from . import test_journal_audit
@@ -0,0 +1,49 @@
+from odoo import Command
+
+from odoo.addons.account.tests.common import AccountTestInvoicingCommon
+
+
+class AccountingReportsCommon(AccountTestInvoicingCommon):
+
+    @classmethod
+    def setUpClass(cls, chart_template_ref=None):
+        super().setUpClass(chart_template_ref=chart_template_ref)
+        cls.misc_journal = cls.company_data['default_journal_misc']
+        cls.other_journal = cls.env['account.journal'].create({
+            'name': 'Other Miscellaneous',
+            'code': 'OMISC',
+            'type': 'general',
+            'company_id': cls.company_data['company'].id,
+        })
+        cls.receivable = cls.company_data['default_account_receivable']
+        cls.revenue = cls.company_data['default_account_revenue']
+        cls.expense = cls.company_data['default_account_expense']
+
+    @classmethod
+    def _create_entry(cls, move_date, amount, partner=None, journal=None,
+                      debit_account=None, credit_account=None, post=True):
+        """ Posts a two lines entry of `amount`, debiting the receivable and
+            crediting the revenue account by default. """
+        partner_id = partner.id if partner else False
+        move = cls.env['account.move'].create({
+            'move_type': 'entry',
+            'date': move_date,
+            'journal_id': (journal or cls.misc_journal).id,
+            'line_ids': [
+                Command.create({
+                    'account_id': (debit_account or cls.receivable).id,
+                    'partner_id': partner_id,
+                    'debit': amount,
+                    'credit': 0.0,
+                }),
+                Command.create({
+                    'account_id': (credit_account or cls.revenue).id,
+                    'partner_id': partner_id,
+                    'debit': 0.0,
+                    'credit': amount,
+                }),
+            ],
+        })
+        if post:
+            move.action_post()
+        return move
@@ -0,0 +1,93 @@
+from datetime import timedelta
+
+from odoo import fields
+from odoo.tests import tagged
+
+from .common import AccountingReportsCommon
+
+DATE_FROM = fields.Date.to_date('2019-06-30')
+
+# period_length of 30 days: bucket 4 is 1 - 30 days overdue, ..., 0 is +120
+BUCKET_KEYS = ('direction', '4', '3', '2', '1', '0')
+
+
+@tagged('-at_install', 'post_install')
+class TestAgedPartnerBalance(AccountingReportsCommon):
+
+    @classmethod
+    def setUpClass(cls, chart_template_ref=None):
+        super().setUpClass(chart_template_ref=chart_template_ref)
+        cls.overdue_partners = {}
+        for days in (0, 1, 30, 31, 121):
+            partner = cls.env['res.partner'].create({'name': 'Aged %03d' % days})
+            cls.overdue_partners[days] = partner
+            cls._create_entry(DATE_FROM - timedelta(days=days), 100.0 + days, partner=partner)
+
+        # partially paid as of date_from
+        cls.paid_before = cls.env['res.partner'].create({'name': 'Aged Paid Before'})
+        cls._reconcile(cls._create_entry('2019-05-31', 1000.0, partner=cls.paid_before),
+                       cls._create_payment('2019-06-10', 400.0, cls.paid_before))
+        # partially and fully paid after date_from: still open as of date_from
+        cls.paid_after = cls.env['res.partner'].create({'name': 'Aged Paid After'})
+        cls._reconcile(cls._create_entry('2019-05-31', 1000.0, partner=cls.paid_after),
+                       cls._create_payment('2019-07-10', 300.0, cls.paid_after))
+        cls.settled_after = cls.env['res.partner'].create({'name': 'Aged Settled After'})
+        cls._reconcile(cls._create_entry('2019-05-31', 500.0, partner=cls.settled_after),
+                       cls._create_payment('2019-07-05', 500.0, cls.settled_after))
+        # fully paid before date_from: left out
+        cls.settled_before = cls.env['res.partner'].create({'name': 'Aged Settled Before'})
+        cls._reconcile(cls._create_entry('2019-05-31', 700.0, partner=cls.settled_before),
+                       cls._create_payment('2019-06-15', 700.0, cls.settled_before))
+
+        cls._create_entry('2019-06-20', 80.0)
+
+    @classmethod
+    def _create_payment(cls, payment_date, amount, partner):
+        return cls._create_entry(payment_date, amount, partner=partner,
+                                 debit_account=cls.revenue, credit_account=cls.receivable)
+
+    @classmethod
+    def _reconcile(cls, invoice, payment):
+        (invoice.line_ids | payment.line_ids).filtered(lambda line: line.account_id == cls.receivable).reconcile()
+
+    def _get_rows(self, partner_ids=None):
+        report = self.env['report.accounting_pdf_reports.report_agedpartnerbalance']
+        res, total, lines = report._get_partner_move_lines(
+            ['asset_receivable'], partner_ids or [], DATE_FROM, 'posted', 30)
+        return {row['partner_id']: row for row in res}, total
+
+    def _assert_buckets(self, row, expected):
+        """ `expected` lists the amounts of BUCKET_KEYS, not due first. """
+        for key, amount in zip(BUCKET_KEYS, expected):
+            self.assertAlmostEqual(row[key], amount, msg='%s %s' % (row['name'], key))
+        self.assertAlmostEqual(row['total'], sum(expected), msg=row['name'])
+
+    def test_bucket_boundaries(self):
+        rows, total = self._get_rows()
+        partners = self.overdue_partners
+        self._assert_buckets(rows[partners[0].id], [100.0, 0, 0, 0, 0, 0])
+        self._assert_buckets(rows[partners[1].id], [0, 101.0, 0, 0, 0, 0])
+        self._assert_buckets(rows[partners[30].id], [0, 130.0, 0, 0, 0, 0])
+        self._assert_buckets(rows[partners[31].id], [0, 0, 131.0, 0, 0, 0])
+        self._assert_buckets(rows[partners[121].id], [0, 0, 0, 0, 0, 221.0])
+
+        # the account total sums the partner rows bucket by bucket
+        for index, key in ((6, 'direction'), (0, '0'), (1, '1'), (2, '2'), (3, '3'), (4, '4'), (5, 'total')):
+            self.assertAlmostEqual(total[index], sum(row[key] for row in rows.values()))
+
+    def test_partial_reconciliation(self):
+        rows, dummy = self._get_rows()
+        # 30 days overdue as of date_from
+        self._assert_buckets(rows[self.paid_before.id], [0, 600.0, 0, 0, 0, 0])
+        self._assert_buckets(rows[self.paid_after.id], [0, 1000.0, 0, 0, 0, 0])
+        self._assert_buckets(rows[self.settled_after.id], [0, 500.0, 0, 0, 0, 0])
+        self.assertNotIn(self.settled_before.id, rows)
+
+    def test_lines_without_partner(self):
+        rows, dummy = self._get_rows()
+        self.assertEqual(rows[False]['name'], 'Unknown Partner')
+        self._assert_buckets(rows[False], [0, 80.0, 0, 0, 0, 0])
+
+        # a partner filter keeps the lines without partner
+        rows, dummy = self._get_rows([self.overdue_partners[1].id])
+        self.assertEqual(set(rows), {self.overdue_partners[1].id, False})
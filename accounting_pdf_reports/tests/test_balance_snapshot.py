@@ -0,0 +1,96 @@
+from freezegun import freeze_time
+
+from odoo.tests import tagged
+
+from ..models.account_balance_snapshot import SNAPSHOT_HORIZON_PARAM
+from .common import AccountingReportsCommon
+
+
+@tagged('-at_install', 'post_install')
+class TestBalanceSnapshot(AccountingReportsCommon):
+    """ Balances read from the snapshot and the open lines must match the
+        balances read from account_move_line only. """
+
+    @classmethod
+    def setUpClass(cls, chart_template_ref=None):
+        super().setUpClass(chart_template_ref=chart_template_ref)
+        cls.accounts = cls.receivable | cls.revenue | cls.expense
+        cls._create_entry('2019-01-10', 100.0, partner=cls.partner_a)
+        cls._create_entry('2019-02-20', 200.0, partner=cls.partner_b, journal=cls.other_journal)
+        cls.march_move = cls._create_entry('2019-03-05', 300.0, partner=cls.partner_a)
+        cls._create_entry('2019-03-25', 50.0)
+        cls._create_entry('2019-04-10', 400.0, partner=cls.partner_b)
+        cls._create_entry('2019-05-03', 500.0, partner=cls.partner_a, journal=cls.other_journal)
+
+    def setUp(self):
+        super().setUp()
+        # _roll_snapshot works in cursors of its own
+        self.registry.enter_test_mode(self.cr)
+        self.addCleanup(self.registry.leave_test_mode)
+        self.env['ir.config_parameter'].sudo().set_param(SNAPSHOT_HORIZON_PARAM, '0')
+        self.env.cr.execute("DELETE FROM account_balance_snapshot")
+        self.Snapshot = self.env['account.balance.snapshot']
+
+    def _contexts(self):
+        base = {'state': 'posted', 'strict_range': True}
+        return [
+            dict(base),
+            dict(base, date_from='2019-01-01', date_to='2019-05-31'),
+            # the first, partial month is read from the lines
+            dict(base, date_from='2019-02-15', date_to='2019-04-30'),
+            dict(base, date_from='2019-03-01', initial_bal=True),
+            dict(base, date_to='2019-03-31', journal_ids=[self.other_journal.id]),
+            dict(base, date_from='2019-01-01', date_to='2019-05-31', partner_ids=self.partner_a),
+        ]
+
+    def _raw_balances(self, context):
+        domain = self.env['account.move.line'].with_context(context)._query_get_domain(
+            [('account_id', 'in', self.accounts.ids)])
+        groups = self.env['account.move.line'].read_group(domain, ['debit:sum', 'credit:sum'], ['account_id'])
+        balances = {account.id: (0.0, 0.0) for account in self.accounts}
+        for group in groups:
+            balances[group['account_id'][0]] = (group['debit'], group['credit'])
+        return balances
+
+    def _roll(self, today):
+        with freeze_time(today):
+            self.Snapshot._roll_snapshot()
+
+    def _assert_reports_match_lines(self):
+        trial_balance = self.env['report.accounting_pdf_reports.report_trialbalance']
+        financial = self.env['report.accounting_pdf_reports.report_financial']
+        contexts = self._contexts()
+        financial_results = financial._compute_account_balances(self.accounts, contexts)
+        for context, financial_result in zip(contexts, financial_results):
+            raw = self._raw_balances(context)
+            rows = {row['code']: row for row in trial_balance.with_context(context)._get_accounts(self.accounts, 'all')}
+            for account in self.accounts:
+                debit, credit = raw[account.id]
+                for res in (rows[account.code], financial_result[account.id]):
+                    self.assertAlmostEqual(res['debit'], debit, msg='%s %s' % (account.code, context))
+                    self.assertAlmostEqual(res['credit'], credit, msg='%s %s' % (account.code, context))
+                    self.assertAlmostEqual(res['balance'], debit - credit, msg='%s %s' % (account.code, context))
+
+    def test_snapshot_matches_lines(self):
+        self._roll('2019-04-15')
+        self.assertEqual(self.Snapshot._get_horizon().isoformat(), '2019-04-01')
+        self.assertTrue(self.Snapshot.sudo().search_count([]))
+        self.assertEqual(
+            self.Snapshot.with_context(self._contexts()[1])._get_window()[1].isoformat(), '2019-04-01')
+        self.assertIsNone(self.Snapshot.with_context(state='all')._get_window())
+        self._assert_reports_match_lines()
+
+    def test_snapshot_follows_closed_months(self):
+        self._roll('2019-04-15')
+        # posted into a closed month
+        self._create_entry('2019-02-10', 70.0, partner=self.partner_a)
+        self._assert_reports_match_lines()
+        # reset to draft in a closed month
+        self.march_move.button_draft()
+        self._assert_reports_match_lines()
+        # April and May are folded into the snapshot
+        self._roll('2019-06-02')
+        self.assertEqual(self.Snapshot._get_horizon().isoformat(), '2019-06-01')
+        self._assert_reports_match_lines()
+        self.march_move.action_post()
+        self._assert_reports_match_lines()
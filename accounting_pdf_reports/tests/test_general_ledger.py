@@ -0,0 +1,107 @@
+from odoo import fields
+from odoo.tests import tagged
+
+from .common import AccountingReportsCommon
+
+DATE_FROM = fields.Date.to_date('2019-03-01')
+DATE_TO = fields.Date.to_date('2019-05-31')
+
+
+@tagged('-at_install', 'post_install')
+class TestGeneralLedger(AccountingReportsCommon):
+
+    @classmethod
+    def setUpClass(cls, chart_template_ref=None):
+        super().setUpClass(chart_template_ref=chart_template_ref)
+        # the expense account has no lines
+        cls.accounts = cls.receivable | cls.revenue | cls.expense
+        cls._create_entry('2019-01-15', 100.0, partner=cls.partner_a)
+        cls._create_entry('2019-02-10', 40.0, partner=cls.partner_b)
+        cls._create_entry('2019-03-05', 300.0, partner=cls.partner_a)
+        cls._create_entry('2019-04-20', 60.0, partner=cls.partner_b, journal=cls.other_journal)
+        cls._create_entry('2019-04-20', 25.0, partner=cls.partner_a)
+        cls._create_entry('2019-05-31', 10.0)
+        cls._create_entry('2019-06-15', 999.0, partner=cls.partner_a)
+        cls._create_entry('2019-03-10', 500.0, partner=cls.partner_a, post=False)
+        cls.context = {
+            'state': 'posted',
+            'date_from': DATE_FROM,
+            'date_to': DATE_TO,
+            'strict_range': True,
+        }
+
+    def _get_entries(self, partners=False, init_balance=True):
+        report = self.env['report.accounting_pdf_reports.report_general_ledger'].with_context(self.context)
+        return report._get_account_move_entry(self.accounts, False, partners, init_balance, 'sort_date', 'all')
+
+    def _get_raw_lines(self, account, partners=False):
+        """ Returns the (opening, period) lines of `account`, read with the ORM. """
+        domain = [
+            ('account_id', '=', account.id),
+            ('parent_state', '=', 'posted'),
+            ('company_id', '=', self.env.company.id),
+            ('date', '<=', DATE_TO),
+        ]
+        if partners:
+            domain.append(('partner_id', 'in', partners.ids))
+        lines = self.env['account.move.line'].search(domain)
+        opening = lines.filtered(lambda line: line.date < DATE_FROM)
+        period = (lines - opening).sorted(lambda line: (line.date, line.move_id.id, line.id))
+        return opening, period
+
+    def _assert_account(self, account, res, partners=False):
+        opening, period = self._get_raw_lines(account, partners)
+        opening_balance = sum(opening.mapped('balance'))
+        rows = list(res['move_lines'])
+        if opening:
+            initial = rows.pop(0)
+            self.assertEqual(initial['lname'], 'Initial Balance')
+            self.assertAlmostEqual(initial['debit'], sum(opening.mapped('debit')))
+            self.assertAlmostEqual(initial['credit'], sum(opening.mapped('credit')))
+            self.assertAlmostEqual(initial['balance'], opening_balance)
+        self.assertEqual([row['lid'] for row in rows], period.ids, account.code)
+        balance = opening_balance
+        for row, line in zip(rows, period):
+            balance += line.balance
+            self.assertAlmostEqual(row['debit'], line.debit)
+            self.assertAlmostEqual(row['credit'], line.credit)
+            self.assertAlmostEqual(row['balance'], balance, msg=account.code)
+        lines = opening | period
+        self.assertAlmostEqual(res['debit'], sum(lines.mapped('debit')), msg=account.code)
+        self.assertAlmostEqual(res['credit'], sum(lines.mapped('credit')), msg=account.code)
+        self.assertAlmostEqual(res['balance'], sum(lines.mapped('balance')), msg=account.code)
+
+    def test_running_balance(self):
+        codes = []
+        # each account's lines are read before the next account is requested
+        for account, res in zip(self.accounts, self._get_entries()):
+            codes.append(res['code'])
+            self._assert_account(account, res)
+        self.assertEqual(codes, self.accounts.mapped('code'))
+
+    def test_partner_filter(self):
+        for account, res in zip(self.accounts, self._get_entries(self.partner_a)):
+            self._assert_account(account, res, self.partner_a)
+
+    def test_account_without_lines(self):
+        res = list(self._get_entries())[2]
+        self.assertEqual(res['code'], self.expense.code)
+        self.assertEqual((res['debit'], res['credit'], res['balance']), (0.0, 0.0, 0.0))
+        self.assertEqual(list(res['move_lines']), [])
+
+    def test_without_initial_balance(self):
+        res = next(iter(self._get_entries(init_balance=False)))
+        rows = list(res['move_lines'])
+        opening, period = self._get_raw_lines(self.receivable)
+        self.assertEqual([row['lid'] for row in rows], period.ids)
+        self.assertAlmostEqual(rows[-1]['balance'], sum(period.mapped('balance')))
+        self.assertAlmostEqual(res['balance'], sum(period.mapped('balance')))
+
+    def test_move_lines_skipped(self):
+        """ The lines of an account left unread are skipped, the next account
+            still gets its own lines. """
+        entries = self._get_entries()
+        next(entries)
+        self._assert_account(self.revenue, next(entries))
+        self._assert_account(self.expense, next(entries))
+        self.assertIsNone(next(entries, None))
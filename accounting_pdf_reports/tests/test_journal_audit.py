@@ -0,0 +1,76 @@
+from odoo.tests import tagged
+
+from .common import AccountingReportsCommon
+
+
+@tagged('-at_install', 'post_install')
+class TestJournalAudit(AccountingReportsCommon):
+
+    @classmethod
+    def setUpClass(cls, chart_template_ref=None):
+        super().setUpClass(chart_template_ref=chart_template_ref)
+        cls.sale_journal = cls.company_data['default_journal_sale']
+        cls.init_invoice('out_invoice', partner=cls.partner_a, invoice_date='2019-03-10', post=True,
+                         amounts=[100.0, 250.0], taxes=cls.tax_sale_a)
+        cls.init_invoice('out_invoice', partner=cls.partner_b, invoice_date='2019-03-20', post=True,
+                         amounts=[40.0], taxes=cls.tax_sale_a)
+        cls.init_invoice('out_invoice', partner=cls.partner_b, invoice_date='2019-03-25', amounts=[999.0])
+        cls._create_entry('2019-03-05', 300.0, partner=cls.partner_a)
+        cls._create_entry('2019-03-31', 60.0, partner=cls.partner_b)
+        cls._create_entry('2019-04-02', 70.0, partner=cls.partner_b)
+        # the other journal has no lines
+        cls.journals = cls.sale_journal | cls.misc_journal | cls.other_journal
+
+    def _get_data(self):
+        return {'form': {
+            'used_context': {
+                'state': 'posted',
+                'date_from': '2019-03-01',
+                'date_to': '2019-03-31',
+                'strict_range': True,
+            },
+            'target_move': 'posted',
+            'sort_selection': 'date',
+            'journal_ids': self.journals.ids,
+        }}
+
+    def test_journal_entries(self):
+        report = self.env['report.accounting_pdf_reports.report_journal']
+        data = self._get_data()
+        seen = []
+        # each journal's lines are read before the next journal is requested
+        for entry in report._get_report_values(None, data)['Journals']:
+            journal = entry['journal']
+            seen.append(journal)
+            lines = report.lines('posted', journal.id, 'date', data)
+            rows = list(entry['lines'])
+            self.assertCountEqual([line.id for line in rows], lines.ids, journal.name)
+            self.assertEqual([line.date for line in rows], sorted(line.date for line in rows))
+            self.assertAlmostEqual(entry['debit'], report._sum_debit(data, journal), msg=journal.name)
+            self.assertAlmostEqual(entry['credit'], report._sum_credit(data, journal), msg=journal.name)
+            self.assertAlmostEqual(entry['debit'], sum(lines.mapped('debit')), msg=journal.name)
+            self.assertAlmostEqual(entry['credit'], sum(lines.mapped('credit')), msg=journal.name)
+            expected_taxes = report._get_taxes(data, journal)
+            self.assertEqual(set(entry['taxes']), set(expected_taxes), journal.name)
+            for tax, amounts in expected_taxes.items():
+                self.assertAlmostEqual(entry['taxes'][tax]['base_amount'], amounts['base_amount'])
+                self.assertAlmostEqual(entry['taxes'][tax]['tax_amount'], amounts['tax_amount'])
+        self.assertEqual(seen, list(self.journals))
+
+    def test_journal_totals(self):
+        report = self.env['report.accounting_pdf_reports.report_journal']
+        entries = {}
+        for entry in report._get_report_values(None, self._get_data())['Journals']:
+            entries[entry['journal']] = entry, list(entry['lines'])
+        # the draft invoice and the April entry are left out
+        sale, sale_lines = entries[self.sale_journal]
+        self.assertAlmostEqual(sale['debit'], 448.5)
+        self.assertAlmostEqual(sale['credit'], 448.5)
+        self.assertEqual(len(sale_lines), 7)
+        self.assertAlmostEqual(sale['taxes'][self.tax_sale_a]['base_amount'], 390.0)
+        self.assertAlmostEqual(sale['taxes'][self.tax_sale_a]['tax_amount'], 58.5)
+        misc, misc_lines = entries[self.misc_journal]
+        self.assertAlmostEqual(misc['debit'], 360.0)
+        self.assertEqual(len(misc_lines), 4)
+        other, other_lines = entries[self.other_journal]
+        self.assertEqual((other['debit'], other['credit'], other['taxes'], other_lines), (0.0, 0.0, {}, []))
@@ -0,0 +1,86 @@
+from odoo.tests import tagged
+
+from .common import AccountingReportsCommon
+
+
+@tagged('-at_install', 'post_install')
+class TestPartnerLedger(AccountingReportsCommon):
+
+    @classmethod
+    def setUpClass(cls, chart_template_ref=None):
+        super().setUpClass(chart_template_ref=chart_template_ref)
+        cls.partner_c = cls.env['res.partner'].create({'name': 'Partner Without Lines'})
+        cls._create_entry('2019-02-10', 40.0, partner=cls.partner_a)
+        cls._create_entry('2019-03-05', 300.0, partner=cls.partner_a)
+        cls._create_entry('2019-03-05', 20.0, partner=cls.partner_b, journal=cls.other_journal)
+        cls._create_entry('2019-04-20', 60.0, partner=cls.partner_a)
+        cls._create_entry('2019-06-15', 999.0, partner=cls.partner_a)
+        cls._create_entry('2019-04-01', 500.0, partner=cls.partner_a, post=False)
+        # fully reconciled within the period
+        invoice = cls._create_entry('2019-04-10', 80.0, partner=cls.partner_b)
+        payment = cls._create_entry('2019-05-10', 80.0, partner=cls.partner_b,
+                                    debit_account=cls.revenue, credit_account=cls.receivable)
+        (invoice.line_ids | payment.line_ids).filtered(lambda line: line.account_id == cls.receivable).reconcile()
+
+    def _get_data(self, reconciled=True):
+        return {'form': {
+            'used_context': {
+                'state': 'posted',
+                'date_from': '2019-03-01',
+                'date_to': '2019-05-31',
+                'strict_range': True,
+            },
+            'target_move': 'posted',
+            'result_selection': 'customer',
+            'reconciled': reconciled,
+            'amount_currency': False,
+            'partner_ids': [self.partner_a.id, self.partner_b.id, self.partner_c.id],
+        }}
+
+    def _get_raw_lines(self, partner, reconciled=True):
+        domain = [
+            ('partner_id', '=', partner.id),
+            ('account_id.account_type', '=', 'asset_receivable'),
+            ('parent_state', '=', 'posted'),
+            ('company_id', '=', self.env.company.id),
+            ('date', '>=', '2019-03-01'),
+            ('date', '<=', '2019-05-31'),
+        ]
+        if not reconciled:
+            domain.append(('full_reconcile_id', '=', False))
+        return self.env['account.move.line'].search(domain).sorted(lambda line: (line.date, line.id))
+
+    def _assert_entries(self, reconciled):
+        """ Returns {partner: (entry, rows)}, each partner's lines being read
+            before the next partner is requested. """
+        report = self.env['report.accounting_pdf_reports.report_partnerledger']
+        entries = {}
+        for entry in report._get_report_values(None, self._get_data(reconciled))['Partners']:
+            partner = entry['partner']
+            lines = self._get_raw_lines(partner, reconciled)
+            rows = list(entry['lines'])
+            self.assertEqual([row['id'] for row in rows], lines.ids, partner.name)
+            progress = 0.0
+            for row, line in zip(rows, lines):
+                progress += line.balance
+                self.assertAlmostEqual(row['progress'], progress, msg=partner.name)
+            self.assertAlmostEqual(entry['debit'], sum(lines.mapped('debit')), msg=partner.name)
+            self.assertAlmostEqual(entry['credit'], sum(lines.mapped('credit')), msg=partner.name)
+            self.assertAlmostEqual(entry['balance'], sum(lines.mapped('balance')), msg=partner.name)
+            entries[partner] = entry, rows
+        self.assertEqual(set(entries), {self.partner_a, self.partner_b, self.partner_c})
+        return entries
+
+    def test_partner_entries(self):
+        entries = self._assert_entries(reconciled=True)
+        self.assertEqual(len(entries[self.partner_a][1]), 2)
+        self.assertEqual(len(entries[self.partner_b][1]), 3)
+        entry, rows = entries[self.partner_c]
+        self.assertEqual(rows, [])
+        self.assertEqual((entry['debit'], entry['credit'], entry['balance']), (0.0, 0.0, 0.0))
+
+    def test_partner_entries_unreconciled(self):
+        entries = self._assert_entries(reconciled=False)
+        # only the unreconciled line of partner_b is left
+        self.assertEqual(len(entries[self.partner_b][1]), 1)
+        self.assertAlmostEqual(entries[self.partner_b][0]['balance'], 20.0)
@@ -20,6 +20,9 @@ class AccountPartnerLedger(models.TransientModel):
                              'amount_currency': self.amount_currency})
         return data
 
+    def _get_xlsx_report(self, data):
+        return 'report.accounting_pdf_reports.report_partnerledger', self._get_report_data(data)
+
     def _print_report(self, data):
         data = self._get_report_data(data)
         return self.env.ref('accounting_pdf_reports.action_report_partnerledger').with_context(landscape=True).\
@@ -1,6 +1,9 @@
 # -*- coding: utf-8 -*-
 
-from odoo import api, fields, models
+from dateutil.relativedelta import relativedelta
+
+from odoo import api, fields, models, _
+from odoo.tools.misc import format_date
 
 
 class AccountingReport(models.TransientModel):
@@ -30,6 +33,10 @@ class AccountingReport(models.TransientModel):
                                        "the way your balances are computed."
                                        " Because it is space consuming, we do not allow to"
                                        " use it while doing a comparison.")
+    period_columns = fields.Selection([('none', 'Single Period'), ('monthly', 'Last 12 Months, YTD and Prior Year')],
+                                      string='Columns', required=True, default='none',
+                                      help="Print one balance column per month up to the end date, "
+                                           "followed by the year to date and the same period of the prior year.")
 
     def _build_comparison_context(self, data):
         result = {}
@@ -52,6 +59,31 @@ class AccountingReport(models.TransientModel):
         res['data']['form']['comparison_context'] = comparison_context
         return res
 
+    def _build_period_columns(self, data):
+        date_to = fields.Date.to_date(data['form']['date_to']) or fields.Date.context_today(self)
+        periods = []
+        for months in range(11, -1, -1):
+            month_start = (date_to - relativedelta(months=months)).replace(day=1)
+            periods.append({
+                'name': format_date(self.env, month_start, date_format='MMM yyyy'),
+                'date_from': fields.Date.to_string(month_start),
+                'date_to': fields.Date.to_string(min(month_start + relativedelta(months=1, days=-1), date_to)),
+            })
+        year_start = date_to.replace(month=1, day=1)
+        periods.append({
+            'name': _('YTD %s', date_to.year),
+            'date_from': fields.Date.to_string(year_start),
+            'date_to': fields.Date.to_string(date_to),
+        })
+        periods.append({
+            'name': _('YTD %s', date_to.year - 1),
+            'date_from': fields.Date.to_string(year_start - relativedelta(years=1)),
+            'date_to': fields.Date.to_string(date_to - relativedelta(years=1)),
+        })
+        return periods
+
     def _print_report(self, data):
-        data['form'].update(self.read(['date_from_cmp', 'debit_credit', 'date_to_cmp', 'filter_cmp', 'account_report_id', 'enable_filter', 'label_filter', 'target_move'])[0])
+        data['form'].update(self.read(['date_from_cmp', 'debit_credit', 'date_to_cmp', 'filter_cmp', 'account_report_id', 'enable_filter', 'label_filter', 'target_move', 'period_columns'])[0])
+        if data['form']['period_columns'] == 'monthly':
+            data['form'].update(enable_filter=False, debit_credit=False, periods=self._build_period_columns(data))
         return self.env.ref('accounting_pdf_reports.action_report_financial').report_action(self, data=data, config=False)
@@ -1,6 +1,9 @@
 # -*- coding: utf-8 -*-
 
+from werkzeug.urls import url_encode
+
 from odoo import api, fields, models, _
+from odoo.exceptions import UserError
 from odoo.tools.misc import get_lang
 
 
@@ -43,7 +46,11 @@ class AccountCommonReport(models.TransientModel):
     def _print_report(self, data):
         raise NotImplementedError()
 
-    def check_report(self):
+    def _get_xlsx_report(self, data):
+        """ Returns the report model name and the data of the XLSX export. """
+        raise UserError(_("This report cannot be exported to Excel."))
+
+    def _build_report_data(self):
         self.ensure_one()
         data = {}
         data['ids'] = self.env.context.get('active_ids', [])
@@ -51,4 +58,20 @@ class AccountCommonReport(models.TransientModel):
         data['form'] = self.read(['date_from', 'date_to', 'journal_ids', 'target_move', 'company_id'])[0]
         used_context = self._build_contexts(data)
         data['form']['used_context'] = dict(used_context, lang=get_lang(self.env).code)
+        return data
+
+    def check_report(self):
+        data = self._build_report_data()
         return self.with_context(discard_logo_check=True)._print_report(data)
+
+    def export_xlsx(self):
+        self.ensure_one()
+        self._get_xlsx_report(self._build_report_data())
+        query = {'active_model': self.env.context.get('active_model', 'ir.ui.menu')}
+        if self.env.context.get('active_ids'):
+            query['active_ids'] = ','.join(str(active_id) for active_id in self.env.context['active_ids'])
+        return {
+            'type': 'ir.actions.act_url',
+            'url': '/accounting_pdf_reports/xlsx/%s/%s?%s' % (self._name, self.id, url_encode(query)),
+            'target': 'self',
+        }
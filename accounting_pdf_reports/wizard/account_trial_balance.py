@@ -20,6 +20,10 @@ class AccountBalanceReport(models.TransientModel):
         records = self.env[data['model']].browse(data.get('ids', []))
         return records, data
 
+    def _get_xlsx_report(self, data):
+        records, data = self._get_report_data(data)
+        return 'report.accounting_pdf_reports.report_trialbalance', data
+
     def _print_report(self, data):
         records, data = self._get_report_data(data)
         return self.env.ref('accounting_pdf_reports.action_report_trial_balance').report_action(records, data=data)
@@ -37,6 +37,9 @@ class AccountAgedTrialBalance(models.TransientModel):
         data['form'].update(res)
         return data
 
+    def _get_xlsx_report(self, data):
+        return 'report.accounting_pdf_reports.report_agedpartnerbalance', self._get_report_data(data)
+
     def _print_report(self, data):
         data = self._get_report_data(data)
         return self.env.ref('accounting_pdf_reports.action_report_aged_partner_balance').\
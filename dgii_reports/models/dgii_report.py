@@ -1254,6 +1254,10 @@ class DgiiReport(models.Model):
                 limit=1
             )
 
+            refund_origins = sale_invoices.mapped('invoice_id').filtered(
+                lambda inv: inv.move_type == 'out_refund'
+            )._l10n_do_get_origin_moves()
+
             for sale_invoice in sale_invoices:
 
                 # AII                    
@@ -1288,12 +1292,10 @@ class DgiiReport(models.Model):
                     base_date = sale_invoice.invoice_id.invoice_date or sale_invoice.invoice_id.date
                     date_30_days_before = base_date + timedelta(days=-30)
 
-                    origin = self.env['account.move'].search([
-                        ('ref', '=', sale_invoice.invoice_id.origin_out),
-                        ('date', '<', date_30_days_before)
-                    ], limit=1)
+                    origin = refund_origins.get(sale_invoice.invoice_id.id)
 
-                    attachment_a_lines[43]['amount'] += abs(sale_invoice.invoiced_amount) if origin else 0
+                    attachment_a_lines[43]['amount'] += abs(sale_invoice.invoiced_amount) \
+                        if origin and origin.date < date_30_days_before else 0
 
                 #IT1-II.B
 
@@ -35,6 +35,7 @@
         "views/account_journal_views.xml",
         "views/res_partner_views.xml",
         "views/account_fiscal_sequence_views.xml",
+        "views/account_fiscal_sequence_usage_views.xml",
         "views/res_company_views.xml",
         "views/account_invoice_cancel_views.xml",
 
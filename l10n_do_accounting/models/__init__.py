@@ -1,4 +1,5 @@
 from . import account_fiscal_sequence
+from . import account_fiscal_sequence_usage
 from . import account_invoice
 from . import account_journal
 from . import account_invoice_cancel
@@ -1,13 +1,18 @@
 # © 2019 José López <jlopez@indexa.do>
 # © 2019 Raul Ovalle <rovalle@guavana.com>
 
+import logging
 import pytz
 import re
-from datetime import datetime
+from datetime import datetime, timedelta
 
 from odoo import api, fields, models, _
 from odoo.exceptions import ValidationError, UserError
+from odoo.tools import float_round
 
+from .account_fiscal_sequence_usage import FISCAL_SEQUENCE_NUMBERS_QUERY
+
+_logger = logging.getLogger(__name__)
 
 def get_l10n_do_datetime():
     """
@@ -86,6 +91,17 @@ class AccountFiscalSequence(models.Model):
         readonly=True,
     )
     next_fiscal_number = fields.Char(compute="_compute_next_fiscal_number")
+    issue_velocity = fields.Float(
+        string="Daily Issue Rate",
+        compute="_compute_depletion",
+        digits=(16, 2),
+        help="Average fiscal numbers issued per day over the recent period.",
+    )
+    depletion_date = fields.Date(
+        string="Projected Depletion",
+        compute="_compute_depletion",
+        help="Date on which this Fiscal Sequence is expected to run out at the current issue rate.",
+    )
 
     state = fields.Selection(
         [
@@ -154,6 +170,44 @@ class AccountFiscalSequence(models.Model):
                 str(rec.sequence_id.number_next_actual).zfill(rec.sequence_id.padding or 0),
             )
 
+    @api.depends("state", "sequence_end", "sequence_id.number_next_actual")
+    def _compute_depletion(self):
+        days = int(
+            self.env["ir.config_parameter"]
+            .sudo()
+            .get_param("l10n_do_accounting.fiscal_sequence_velocity_days", 30)
+        ) or 30
+        l10n_do_date = get_l10n_do_datetime().date()
+
+        counts = {}
+        ids = tuple(rec.id for rec in self if isinstance(rec.id, int))
+        if ids:
+            self.env.cr.execute(
+                """
+                SELECT n.sequence_id, count(*)
+                  FROM (%s) n
+                  JOIN account_fiscal_sequence fs ON fs.id = n.sequence_id
+                 WHERE n.sequence_id IN %%s
+                   AND n.move_state = 'posted'
+                   AND n.invoice_date >= %%s
+                   AND n.number BETWEEN fs.sequence_start AND fs.sequence_end
+              GROUP BY n.sequence_id
+                """
+                % FISCAL_SEQUENCE_NUMBERS_QUERY,
+                (ids, l10n_do_date - timedelta(days=days)),
+            )
+            counts = dict(self.env.cr.fetchall())
+
+        for rec in self:
+            velocity = counts.get(rec.id, 0) / float(days)
+            rec.issue_velocity = velocity
+            if rec.state == "active" and velocity and rec.sequence_remaining > 0:
+                rec.depletion_date = l10n_do_date + timedelta(
+                    days=int(float_round(rec.sequence_remaining / velocity, 0, rounding_method="UP"))
+                )
+            else:
+                rec.depletion_date = False
+
     @api.onchange("fiscal_type_id")
     def _onchange_fiscal_type_id(self):
         """
@@ -229,6 +283,15 @@ class AccountFiscalSequence(models.Model):
             "target": "current",
         }
 
+    def action_view_usage(self):
+        self.ensure_one()
+        action = self.env.ref(
+            "l10n_do_accounting.account_fiscal_sequence_usage_action"
+        ).read()[0]
+        action["domain"] = [("sequence_id", "=", self.id)]
+        action["context"] = {}
+        return action
+
     def action_confirm(self):
         self.ensure_one()
         msg = _(
@@ -298,13 +361,46 @@ class AccountFiscalSequence(models.Model):
 
     def _expire_sequences(self):
         """
-        Called from ir.cron: checks all active sequences expiration_date and
-        sets state=expired if necessary.
+        Called from ir.cron: expires every active sequence whose
+        expiration_date has been reached and activates the next queued
+        sequence of each affected fiscal type and company.
         """
         l10n_do_date = get_l10n_do_datetime().date()
-        seqs = self.search([("state", "=", "active")])
-        for seq in seqs.filtered(lambda s: l10n_do_date >= s.expiration_date):
-            seq.state = "expired"
+        expired = self.search(
+            [("state", "=", "active"), ("expiration_date", "<=", l10n_do_date)]
+        )
+        if not expired:
+            return
+
+        expired.write({"state": "expired"})
+
+        keys = {(seq.fiscal_type_id.id, seq.company_id.id) for seq in expired}
+        queued = self.search(
+            [
+                ("state", "=", "queue"),
+                ("fiscal_type_id", "in", list({k[0] for k in keys})),
+                ("company_id", "in", list({k[1] for k in keys})),
+            ],
+            order="sequence_start asc",
+        )
+        to_confirm = self.browse()
+        for seq in queued:
+            key = (seq.fiscal_type_id.id, seq.company_id.id)
+            if key in keys:
+                to_confirm |= seq
+                keys.discard(key)
+        to_confirm._action_confirm()
+
+        _logger.info(
+            "Fiscal sequences expired on %s: %s. Queued sequences activated: %s",
+            l10n_do_date,
+            ", ".join("%s (%s)" % (s.name, s.fiscal_type_id.prefix) for s in expired),
+            ", ".join(
+                "%s (%s) -> %s" % (s.name, s.fiscal_type_id.prefix, s.state)
+                for s in to_confirm
+            )
+            or "none",
+        )
 
     def _get_queued_fiscal_sequence(self):
         return self.search(
@@ -399,16 +495,8 @@ class AccountFiscalType(models.Model):
             fiscal_type.journal_type = "sale" if (fiscal_type.type or "").startswith("out") else "purchase"
 
     def check_format_fiscal_number(self, fiscal_number, type=""):
-        if not fiscal_number:
-            raise ValidationError(_("Fiscal number can not be blank"))
-
-        if len(fiscal_number) < 3:
-            raise ValidationError(_("This origin fiscal number must have more than 3 characters"))
-
         fiscal_type = self
-        message = ""
-
-        if not self:
+        if not self and fiscal_number and len(fiscal_number) >= 3:
             fiscal_type = self.search(
                 [
                     ("prefix", "=", fiscal_number[0:3]),
@@ -417,32 +505,134 @@ class AccountFiscalType(models.Model):
                 limit=1,
             )
 
-        if not fiscal_type:
+        message = fiscal_type._get_fiscal_number_error(fiscal_number, type)
+        if message:
+            raise ValidationError(message)
+
+    def _get_fiscal_number_pattern(self):
+        self.ensure_one()
+        return re.compile(r"^%s[0-9]{%d}$" % (re.escape(self.prefix or ""), self.padding))
+
+    def _get_fiscal_number_error(self, fiscal_number, type="", pattern=None):
+        """
+        Return the reason why fiscal_number is not a valid number of this
+        fiscal type, or an empty string when it is.
+        """
+        if not fiscal_number:
+            return _("Fiscal number can not be blank")
+
+        if len(fiscal_number) < 3:
+            return _("This origin fiscal number must have more than 3 characters")
+
+        if not self:
             if type in ("in_refund", "out_refund"):
-                message = _("The fiscal number type (%s) is not a credit note.") % fiscal_number[0:3]
+                return _("The fiscal number type (%s) is not a credit note.") % fiscal_number[0:3]
+            return _("This document type (%s) does not exist.") % fiscal_number[0:3]
 
-            raise ValidationError(
-                _("This document type (%s) does not exist.") % fiscal_number[0:3]
-                if not message
-                else message
-            )
+        pattern = pattern or self._get_fiscal_number_pattern()
+        if pattern.match(fiscal_number):
+            return ""
 
-        origin_out_padding = (
-            len(fiscal_number) - len(fiscal_type.prefix)
-            if fiscal_type.prefix
-            else len(fiscal_number)
-        )
+        origin_out_padding = len(fiscal_number) - len(self.prefix) if self.prefix else len(fiscal_number)
 
-        if origin_out_padding != fiscal_type.padding:
-            raise ValidationError(
-                _("The document type (%s) has (%s) digits. You are trying to input (%s) digits.")
-                % (fiscal_type.name, fiscal_type.padding, origin_out_padding)
+        if origin_out_padding != self.padding:
+            return _("The document type (%s) has (%s) digits. You are trying to input (%s) digits.") % (
+                self.name,
+                self.padding,
+                origin_out_padding,
             )
 
         if not re.match(r"^[0-9]+$", fiscal_number[3:]):
-            raise ValidationError(_("After the document type, all characters must be digits from 0 to 9."))
+            return _("After the document type, all characters must be digits from 0 to 9.")
+
+        if self.prefix and fiscal_number[0:3] != self.prefix:
+            return _("The document type (%s) must start with (%s)") % (self.name, self.prefix)
 
-        if fiscal_type.prefix and fiscal_number[0:3] != fiscal_type.prefix:
-            raise ValidationError(
-                _("The document type (%s) must start with (%s)") % (fiscal_type.name, fiscal_type.prefix)
+        return ""
+
+    def validate_fiscal_numbers(self, fiscal_numbers, type="", company_id=False, partner_ids=None):
+        """
+        Validate many fiscal numbers at once.
+
+        When called on fiscal types, numbers are checked against them (by
+        prefix); otherwise every fiscal type of the given type is loaded with
+        a single search. Duplicates are flagged both inside the batch and
+        against posted fiscal invoices, fetched with a single query.
+
+        :param fiscal_numbers: list of fiscal number strings.
+        :param type: fiscal type type (out_invoice, in_invoice, in_refund...).
+        :param company_id: company whose posted invoices are checked for
+            duplicates, defaults to the current company.
+        :param partner_ids: optional list, parallel to fiscal_numbers, of the
+            issuer partner of each number. Supplier numbers are only duplicated
+            when issued by the same partner; a number given without partner is
+            duplicated by a posted invoice of any partner.
+        :return: list of dicts, one per fiscal number, in the same order.
+        """
+        fiscal_numbers = [(number or "").strip() for number in fiscal_numbers]
+        partner_ids = partner_ids or [False] * len(fiscal_numbers)
+        company_id = company_id or self.env.company.id
+
+        fiscal_types = self or self.search([("type", "=", type), ("prefix", "!=", False)])
+        by_prefix = {}
+        for fiscal_type in fiscal_types:
+            by_prefix.setdefault(fiscal_type.prefix, (fiscal_type, fiscal_type._get_fiscal_number_pattern()))
+
+        is_purchase = (type or fiscal_types[:1].type or "").startswith("in")
+        posted = {}
+        numbers = list({number for number in fiscal_numbers if number})
+        if numbers:
+            moves = self.env["account.move"].search_read(
+                [
+                    ("ref", "in", numbers),
+                    ("company_id", "=", company_id),
+                    ("state", "=", "posted"),
+                    ("is_l10n_do_fiscal_invoice", "=", True),
+                    (
+                        "move_type",
+                        "in",
+                        ("in_invoice", "in_refund") if is_purchase else ("out_invoice", "out_refund"),
+                    ),
+                ],
+                ["ref", "commercial_partner_id"],
+                order="id",
+            )
+            for move in moves:
+                partner_key = move["commercial_partner_id"][0] if is_purchase and move["commercial_partner_id"] else False
+                posted.setdefault((move["ref"], partner_key), move["id"])
+                # Without an issuer a supplier number matches any partner.
+                posted.setdefault((move["ref"], False), move["id"])
+
+        if is_purchase and any(partner_ids):
+            partners = self.env["res.partner"].browse({p for p in partner_ids if p})
+            commercial = {partner.id: partner.commercial_partner_id.id for partner in partners}
+        else:
+            commercial = {}
+
+        keys = [
+            (number, commercial.get(partner_id, partner_id) if is_purchase else False)
+            for number, partner_id in zip(fiscal_numbers, partner_ids)
+        ]
+        counts = {}
+        for key in keys:
+            counts[key] = counts.get(key, 0) + 1
+
+        res = []
+        for number, key in zip(fiscal_numbers, keys):
+            if len(self) == 1:
+                fiscal_type, pattern = by_prefix[self.prefix]
+            else:
+                fiscal_type, pattern = by_prefix.get(number[0:3], (self.browse(), None))
+            message = fiscal_type._get_fiscal_number_error(number, type, pattern=pattern)
+            duplicate_move_id = posted.get(key, False) if number else False
+            res.append(
+                {
+                    "fiscal_number": number,
+                    "fiscal_type_id": fiscal_type.id,
+                    "valid": not message and not duplicate_move_id and counts[key] == 1,
+                    "message": message,
+                    "duplicate_in_batch": bool(number) and counts[key] > 1,
+                    "duplicate_move_id": duplicate_move_id,
+                }
             )
+        return res
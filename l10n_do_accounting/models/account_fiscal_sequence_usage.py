@@ -0,0 +1,122 @@
+# l10n_do_accounting/models/account_fiscal_sequence_usage.py
+from odoo import fields, models, tools
+
+# Fiscal numbers of a move, parsed from its ref, matched against the range of
+# every confirmed fiscal sequence of the same fiscal type and company.
+FISCAL_SEQUENCE_NUMBERS_QUERY = """
+    SELECT fs.id AS sequence_id,
+           am.id AS move_id,
+           am.state AS move_state,
+           am.invoice_date AS invoice_date,
+           substr(am.ref, char_length(COALESCE(ft.prefix, '')) + 1)::bigint AS number
+      FROM account_fiscal_sequence fs
+      JOIN account_fiscal_type ft ON ft.id = fs.fiscal_type_id
+      JOIN account_move am
+        ON am.fiscal_type_id = fs.fiscal_type_id
+       AND am.company_id = fs.company_id
+       AND am.state IN ('posted', 'cancel')
+       AND am.ref IS NOT NULL
+       AND left(am.ref, char_length(COALESCE(ft.prefix, ''))) = COALESCE(ft.prefix, '')
+       AND substr(am.ref, char_length(COALESCE(ft.prefix, '')) + 1) ~ '^[0-9]{1,18}$'
+     WHERE fs.state NOT IN ('draft', 'cancelled')
+"""
+
+
+class AccountFiscalSequenceUsage(models.Model):
+    _name = "account.fiscal.sequence.usage"
+    _description = "Fiscal Sequence Usage"
+    _auto = False
+    _order = "sequence_id, number_from"
+
+    sequence_id = fields.Many2one("account.fiscal.sequence", string="Fiscal Sequence", readonly=True)
+    fiscal_type_id = fields.Many2one("account.fiscal.type", string="Fiscal type", readonly=True)
+    company_id = fields.Many2one("res.company", string="Company", readonly=True)
+    status = fields.Selection(
+        [
+            ("issued", "Issued"),
+            ("void", "Void"),
+            ("missing", "Missing"),
+        ],
+        readonly=True,
+    )
+    number_from = fields.Integer(string="From", readonly=True)
+    number_to = fields.Integer(string="To", readonly=True)
+    ncf_from = fields.Char(string="NCF From", readonly=True)
+    ncf_to = fields.Char(string="NCF To", readonly=True)
+    quantity = fields.Integer(readonly=True)
+
+    def init(self):
+        tools.drop_view_if_exists(self._cr, self._table)
+        self._cr.execute(
+            """
+            CREATE OR REPLACE VIEW %s AS (
+                WITH numbers AS (
+                    SELECT n.sequence_id, n.number, n.move_id, n.move_state
+                      FROM (%s) n
+                      JOIN account_fiscal_sequence fs ON fs.id = n.sequence_id
+                     WHERE n.number BETWEEN fs.sequence_start AND fs.sequence_end
+                ),
+                used AS (
+                    -- A number issued and later voided then reissued counts as issued.
+                    SELECT DISTINCT ON (sequence_id, number)
+                           sequence_id,
+                           number,
+                           CASE WHEN move_state = 'posted' THEN 'issued' ELSE 'void' END AS status
+                      FROM numbers
+                     ORDER BY sequence_id, number, (move_state = 'posted') DESC
+                ),
+                islands AS (
+                    SELECT sequence_id, status, number,
+                           number - row_number() OVER (
+                               PARTITION BY sequence_id, status ORDER BY number
+                           ) AS grp
+                      FROM used
+                ),
+                used_ranges AS (
+                    SELECT sequence_id, status,
+                           min(number) AS number_from,
+                           max(number) AS number_to
+                      FROM islands
+                  GROUP BY sequence_id, status, grp
+                ),
+                bounds AS (
+                    -- sequence_start - 1 acts as a sentinel so a gap at the
+                    -- beginning of the range is reported too.
+                    SELECT id AS sequence_id, sequence_start - 1 AS number
+                      FROM account_fiscal_sequence
+                     WHERE id IN (SELECT sequence_id FROM used)
+                     UNION ALL
+                    SELECT sequence_id, number FROM used
+                ),
+                gaps AS (
+                    SELECT sequence_id,
+                           number + 1 AS number_from,
+                           lead(number) OVER (PARTITION BY sequence_id ORDER BY number) - 1 AS number_to
+                      FROM bounds
+                ),
+                ranges AS (
+                    SELECT sequence_id, status, number_from, number_to FROM used_ranges
+                     UNION ALL
+                    SELECT sequence_id, 'missing', number_from, number_to
+                      FROM gaps
+                     WHERE number_to >= number_from
+                )
+                -- Same zero padding as the fiscal sequence numbers (zfill):
+                -- none without padding and never truncated.
+                SELECT row_number() OVER (ORDER BY r.sequence_id, r.number_from) AS id,
+                       r.sequence_id,
+                       fs.fiscal_type_id,
+                       fs.company_id,
+                       r.status,
+                       r.number_from,
+                       r.number_to,
+                       COALESCE(ft.prefix, '') || lpad(r.number_from::text, GREATEST(COALESCE(ft.padding, 0), length(r.number_from::text)), '0') AS ncf_from,
+                       COALESCE(ft.prefix, '') || lpad(r.number_to::text, GREATEST(COALESCE(ft.padding, 0), length(r.number_to::text)), '0') AS ncf_to,
+                       r.number_to - r.number_from + 1 AS quantity
+                  FROM ranges r
+                  JOIN account_fiscal_sequence fs ON fs.id = r.sequence_id
+                  JOIN account_fiscal_type ft ON ft.id = fs.fiscal_type_id
+            )
+            """
+            % (self._table, FISCAL_SEQUENCE_NUMBERS_QUERY)
+        )
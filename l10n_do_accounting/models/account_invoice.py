@@ -1,6 +1,6 @@
 # l10n_do_accounting/models/account_invoice.py
 import logging
-from odoo import models, fields, api, _
+from odoo import models, fields, api, tools, _
 from odoo.exceptions import UserError, ValidationError
 
 _logger = logging.getLogger(__name__)
@@ -111,6 +111,81 @@ class AccountInvoice(models.Model):
     )
     is_debit_note = fields.Boolean(string="Is debit note")
 
+    def init(self):
+        super().init()
+        # Serves NCF -> move resolution of credit and debit notes origins.
+        tools.create_index(
+            self._cr,
+            "account_move_l10n_do_fiscal_ref_index",
+            self._table,
+            ["company_id", "move_type", "ref"],
+            where="state = 'posted' AND ref IS NOT NULL",
+        )
+
+    @api.model
+    def _l10n_do_resolve_fiscal_numbers(self, fiscal_numbers, move_types, company_ids):
+        """
+        Resolve many fiscal numbers at once to their posted fiscal moves.
+
+        :return: dict mapping each fiscal number found to its moves, newest first.
+        """
+        fiscal_numbers = list({number for number in fiscal_numbers if number})
+        if not fiscal_numbers:
+            return {}
+
+        moves = self.search(
+            [
+                ("company_id", "in", list(company_ids)),
+                ("move_type", "in", list(move_types)),
+                ("ref", "in", fiscal_numbers),
+                ("state", "=", "posted"),
+                ("is_l10n_do_fiscal_invoice", "=", True),
+            ],
+            order="id desc",
+        )
+        res = {}
+        for move in moves:
+            res.setdefault(move.ref, []).append(move.id)
+        return {number: self.browse(ids) for number, ids in res.items()}
+
+    def _l10n_do_get_origin_move_type(self):
+        self.ensure_one()
+        return {"out_refund": "out_invoice", "in_refund": "in_invoice"}.get(
+            self.move_type, self.move_type
+        )
+
+    def _l10n_do_get_origin_moves(self, partner_strict=False):
+        """
+        Return a dict mapping the id of every credit or debit note in self to
+        the invoice its origin_out refers to. All origins are resolved with a
+        single query.
+
+        :param partner_strict: only accept an origin invoiced to the note
+            partner, its parent or one of its children.
+        """
+        notes = self.filtered("origin_out")
+        if not notes:
+            return {}
+
+        candidates = self._l10n_do_resolve_fiscal_numbers(
+            notes.mapped("origin_out"),
+            {note._l10n_do_get_origin_move_type() for note in notes},
+            notes.company_id.ids,
+        )
+
+        res = {}
+        for note in notes:
+            origin_type = note._l10n_do_get_origin_move_type()
+            origins = candidates.get(note.origin_out, self.browse()).filtered(
+                lambda m: m.company_id == note.company_id and m.move_type == origin_type
+            )
+            if partner_strict:
+                partners = note.partner_id | note.partner_id.parent_id | note.partner_id.child_ids
+                origins = origins.filtered(lambda m: m.partner_id in partners)
+            if origins:
+                res[note.id] = origins[0]
+        return res
+
     @api.depends("is_l10n_do_fiscal_invoice", "move_type", "journal_id", "partner_id")
     def _compute_available_fiscal_type(self):
         for inv in self:
@@ -259,6 +334,10 @@ class AccountInvoice(models.Model):
         return super()._onchange_partner_id()
 
     def _post(self, soft=True):
+        origin_moves = self.filtered(
+            lambda i: i.is_l10n_do_fiscal_invoice and i.move_type in ("out_refund", "in_refund")
+        )._l10n_do_get_origin_moves(partner_strict=True)
+
         for inv in self:
             if inv.is_l10n_do_fiscal_invoice and inv.is_invoice():
                 if inv.amount_total == 0:
@@ -291,19 +370,7 @@ class AccountInvoice(models.Model):
                         "in_invoice" if inv.move_type == "in_refund" else "out_invoice",
                     )
 
-                    origin_invoice = self.env["account.move"].search(
-                        [
-                            "|", "|",
-                            ("partner_id", "=", inv.partner_id.id),
-                            ("partner_id", "=", inv.partner_id.parent_id.id),
-                            ("partner_id", "in", inv.partner_id.child_ids.ids),
-                            ("ref", "=", inv.origin_out),
-                            ("state", "=", "posted"),
-                            ("is_l10n_do_fiscal_invoice", "=", True),
-                            ("move_type", "=", "in_invoice" if inv.move_type == "in_refund" else "out_invoice"),
-                        ],
-                        limit=1,
-                    )
+                    origin_invoice = origin_moves.get(inv.id)
 
                     if not origin_invoice:
                         raise UserError(
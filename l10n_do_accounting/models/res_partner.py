@@ -9,6 +9,8 @@ try:
 except (ImportError, IOError) as err:
     _logger.debug(str(err))
 
+SALE_FISCAL_TYPE_PREFIXES = ("B01", "B02", "B14", "B15", "B16")
+
 
 class Partner(models.Model):
     _inherit = "res.partner"
@@ -72,35 +74,125 @@ class Partner(models.Model):
             [("type", "=", "out_invoice"), ("prefix", "=", prefix)], limit=1
         )
 
+    def _get_sale_fiscal_types_by_prefix(self):
+        """
+        Fetch every sale fiscal type the partner classification can assign
+        in a single search, keyed by prefix.
+        """
+        fiscal_types = self.env["account.fiscal.type"].search(
+            [("type", "=", "out_invoice"), ("prefix", "in", SALE_FISCAL_TYPE_PREFIXES)]
+        )
+        res = {prefix: self.env["account.fiscal.type"] for prefix in SALE_FISCAL_TYPE_PREFIXES}
+        for fiscal_type in fiscal_types:
+            if not res[fiscal_type.prefix]:
+                res[fiscal_type.prefix] = fiscal_type
+        return res
+
+    def _get_sale_fiscal_type_prefix(self):
+        """
+        Sale fiscal type prefix a DGII registered (RNC) partner falls in,
+        according to its name.
+        """
+        self.ensure_one()
+        name = self.name or ""
+        if "MINISTERIO" in name:
+            return "B15"
+        if "IGLESIA" in name or "ZONA FRANCA" in name:
+            return "B14"
+        return "B01"
+
     @api.depends("vat", "country_id", "name", "parent_id", "parent_id.sale_fiscal_type_id")
     def _compute_sale_fiscal_type_id(self):
         do_country = self.env.ref("base.do")
+        fiscal_types = self._get_sale_fiscal_types_by_prefix()
         for partner in self:
-            vat = partner.name if partner.name and partner.name.isdigit() else partner.vat
+            name_is_vat = bool(partner.name and partner.name.isdigit())
+            vat = partner.name if name_is_vat else partner.vat
             is_do = bool(partner.country_id == do_country)
             new_fiscal_type = partner.sale_fiscal_type_id
 
             if not is_do:
-                new_fiscal_type = self._get_fiscal_type_domain("B16")
+                new_fiscal_type = fiscal_types["B16"]
             elif partner.parent_id:
                 new_fiscal_type = partner.parent_id.sale_fiscal_type_id
-            elif vat and not (partner.name and partner.name.isdigit()) and not partner.sale_fiscal_type_id:
+            elif vat and not name_is_vat and not partner.sale_fiscal_type_id:
                 if vat.isdigit() and len(vat) == 9:
-                    if partner.name and "MINISTERIO" in partner.name:
-                        new_fiscal_type = self._get_fiscal_type_domain("B15")
-                    elif partner.name and any(n for n in ("IGLESIA", "ZONA FRANCA") if n in partner.name):
-                        new_fiscal_type = self._get_fiscal_type_domain("B14")
-                    else:
-                        new_fiscal_type = self._get_fiscal_type_domain("B01")
+                    new_fiscal_type = fiscal_types[partner._get_sale_fiscal_type_prefix()]
                 else:
-                    new_fiscal_type = self._get_fiscal_type_domain("B02")
-            elif is_do and not partner.sale_fiscal_type_id:
-                new_fiscal_type = self._get_fiscal_type_domain("B02")
+                    new_fiscal_type = fiscal_types["B02"]
+            elif not partner.sale_fiscal_type_id:
+                new_fiscal_type = fiscal_types["B02"]
 
             partner.sale_fiscal_type_id = new_fiscal_type
 
             # NO escribir aquí property_account_position_id (evita write dentro de compute)
 
+    @api.model
+    def _backfill_sale_fiscal_type(self):
+        """
+        Called from ir.cron: set-based equivalent of
+        _compute_sale_fiscal_type_id over every partner in the database,
+        meant for mass imports. Commercial partners are classified with a
+        single UPDATE, then contacts inherit from their parent one level
+        at a time.
+        """
+        fiscal_types = self._get_sale_fiscal_types_by_prefix()
+        params = {prefix: fiscal_types[prefix].id or None for prefix in SALE_FISCAL_TYPE_PREFIXES}
+        params["do_country"] = self.env.ref("base.do").id
+        cr = self.env.cr
+
+        cr.execute(
+            """
+            UPDATE res_partner p
+               SET sale_fiscal_type_id = c.fiscal_type_id
+              FROM (
+                    SELECT id,
+                           CASE
+                               WHEN country_id IS DISTINCT FROM %(do_country)s THEN %(B16)s
+                               WHEN sale_fiscal_type_id IS NOT NULL THEN sale_fiscal_type_id
+                               WHEN name ~ '^[0-9]+$' THEN %(B02)s
+                               WHEN vat IS NULL OR vat !~ '^[0-9]{9}$' THEN %(B02)s
+                               WHEN name LIKE '%%MINISTERIO%%' THEN %(B15)s
+                               WHEN name LIKE '%%IGLESIA%%' OR name LIKE '%%ZONA FRANCA%%' THEN %(B14)s
+                               ELSE %(B01)s
+                           END AS fiscal_type_id
+                      FROM res_partner
+                     WHERE parent_id IS NULL
+                   ) c
+             WHERE p.id = c.id
+               AND p.sale_fiscal_type_id IS DISTINCT FROM c.fiscal_type_id
+            """,
+            params,
+        )
+        updated = cr.rowcount
+
+        while True:
+            cr.execute(
+                """
+                UPDATE res_partner p
+                   SET sale_fiscal_type_id = c.fiscal_type_id
+                  FROM (
+                        SELECT child.id,
+                               CASE
+                                   WHEN child.country_id IS DISTINCT FROM %(do_country)s THEN %(B16)s
+                                   ELSE parent.sale_fiscal_type_id
+                               END AS fiscal_type_id
+                          FROM res_partner child
+                          JOIN res_partner parent ON parent.id = child.parent_id
+                       ) c
+                 WHERE p.id = c.id
+                   AND p.sale_fiscal_type_id IS DISTINCT FROM c.fiscal_type_id
+                """,
+                params,
+            )
+            if not cr.rowcount:
+                break
+            updated += cr.rowcount
+
+        self.invalidate_model(["sale_fiscal_type_id"])
+        _logger.info("Sale fiscal type backfill updated %s partners", updated)
+        return updated
+
     def _inverse_sale_fiscal_type_id(self):
         for partner in self:
             ft = partner.sale_fiscal_type_id
@@ -0,0 +1 @@
+from . import test_fiscal_numbers
@@ -0,0 +1,58 @@
+from odoo import Command
+from odoo.tests import tagged
+
+from odoo.addons.account.tests.common import AccountTestInvoicingCommon
+
+
+@tagged("-at_install", "post_install")
+class TestValidateFiscalNumbers(AccountTestInvoicingCommon):
+    @classmethod
+    def setUpClass(cls, chart_template_ref=None):
+        super().setUpClass(chart_template_ref=chart_template_ref)
+        cls.company_data["default_journal_sale"].l10n_do_fiscal_journal = True
+        cls.company_data["default_journal_purchase"].l10n_do_fiscal_journal = True
+        cls.FiscalType = cls.env["account.fiscal.type"]
+        cls.sale_type = cls.FiscalType.search([("prefix", "=", "B01"), ("type", "=", "out_invoice")], limit=1)
+        cls.purchase_type = cls.FiscalType.search([("prefix", "=", "B01"), ("type", "=", "in_invoice")], limit=1)
+
+    @classmethod
+    def _posted_move(cls, move_type, fiscal_type, ref, partner):
+        move = cls.env["account.move"].create(
+            {
+                "move_type": move_type,
+                "partner_id": partner.id,
+                "invoice_date": "2024-01-15",
+                "fiscal_type_id": fiscal_type.id,
+                "ref": ref,
+                "invoice_line_ids": [Command.create({"product_id": cls.product_a.id, "price_unit": 100.0})],
+            }
+        )
+        # Marked as posted without going through the fiscal sequence.
+        cls.env.cr.execute("UPDATE account_move SET state = 'posted' WHERE id = %s", (move.id,))
+        move.invalidate_recordset(["state"])
+        return move
+
+    def test_sale_duplicate(self):
+        move = self._posted_move("out_invoice", self.sale_type, "B0100000001", self.partner_a)
+        res = self.FiscalType.validate_fiscal_numbers(["B0100000001", "B0100000002"], type="out_invoice")
+        self.assertEqual(res[0]["duplicate_move_id"], move.id)
+        self.assertFalse(res[0]["valid"])
+        self.assertFalse(res[1]["duplicate_move_id"])
+
+    def test_purchase_duplicate_with_partner(self):
+        move = self._posted_move("in_invoice", self.purchase_type, "B0100000001", self.partner_a)
+        res = self.FiscalType.validate_fiscal_numbers(
+            ["B0100000001", "B0100000001"],
+            type="in_invoice",
+            partner_ids=[self.partner_a.id, self.partner_b.id],
+        )
+        self.assertEqual(res[0]["duplicate_move_id"], move.id)
+        # The same number issued by another supplier is not a duplicate.
+        self.assertFalse(res[1]["duplicate_move_id"])
+        self.assertFalse(res[1]["duplicate_in_batch"])
+
+    def test_purchase_duplicate_without_partner(self):
+        move = self._posted_move("in_invoice", self.purchase_type, "B0100000001", self.partner_a)
+        res = self.FiscalType.validate_fiscal_numbers(["B0100000001"], type="in_invoice")
+        self.assertEqual(res[0]["duplicate_move_id"], move.id)
+        self.assertFalse(res[0]["valid"])
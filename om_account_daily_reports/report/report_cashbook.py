@@ -33,12 +33,9 @@ class ReportCashBook(models.AbstractModel):
 
         # Prepare initial sql query and Get the initial move lines
         if init_balance:
-            init_tables, init_where_clause, init_where_params = MoveLine.with_context(date_from=self.env.context.get('date_from'), date_to=False,initial_bal=True)._query_get()
-            init_wheres = [""]
-            if init_where_clause.strip():
-                init_wheres.append(init_where_clause.strip())
-            init_filters = " AND ".join(init_wheres)
-            filters = init_filters.replace('account_move_line__move_id', 'm').replace('account_move_line', 'l')
+            init_filter = MoveLine.with_context(date_from=self.env.context.get('date_from'), date_to=False,initial_bal=True)._get_query_filter(alias='l')
+            init_where_params = init_filter.params
+            filters = " AND " + init_filter.where if init_filter.where else ""
             sql = ("""
                     SELECT 0 AS lid, 
                     l.account_id AS account_id, '' AS ldate, '' AS lcode, 
@@ -63,12 +60,9 @@ class ReportCashBook(models.AbstractModel):
             sql_sort = 'j.code, p.name, l.move_id'
 
         # Prepare sql query base on selected parameters from wizard
-        tables, where_clause, where_params = MoveLine._query_get()
-        wheres = [""]
-        if where_clause.strip():
-            wheres.append(where_clause.strip())
-        filters = " AND ".join(wheres)
-        filters = filters.replace('account_move_line__move_id', 'm').replace('account_move_line', 'l')
+        query_filter = MoveLine._get_query_filter(alias='l')
+        where_params = query_filter.params
+        filters = " AND " + query_filter.where if query_filter.where else ""
         if not accounts:
             journals = self.env['account.journal'].search([('type', '=', 'cash')])
             accounts = []
@@ -1,5 +1,6 @@
 from odoo import api, SUPERUSER_ID
 
+from . import controllers
 from . import models
 from . import wizard
 
@@ -55,40 +56,6 @@ _UOM_CODE_BY_XMLID = {
     "uom.product_uom_cubic_meter": "28",
 }
 
-TEMPLATE_XMLID = "opengeek_einvoice.mail_template_fe_exception_dgii"
-
-SUBJECT = "Notificación Error FE - Documento ${object.name or 'N/A'}"
-EMAIL_FROM = "${object.company_id.email_formatted or user.email_formatted}"
-
-BODY_HTML = """
-<div>
-  <p><strong>Se ha detectado una excepción durante el envío de la Factura Electrónica.</strong></p>
-
-  <p><strong>Tipo de Documento:</strong> ${object.fiscal_type_id.name or 'No definido'}</p>
-  <p><strong>Fecha/Hora:</strong> ${object.write_date or object.create_date}</p>
-  <p><strong>Compañía:</strong> ${object.company_id.name or ''}</p>
-  <p><strong>Cliente:</strong> ${object.partner_id.display_name or ''}</p>
-  <p><strong>Factura:</strong> ${object.name or ''}</p>
-
-  <p><strong>Mensaje de excepción:</strong><br/>${object.exception_message_dgii or 'Error desconocido'}</p>
-
-  % if object.einvoice_status or object.einvoice_trackId:
-    <p><strong>Estado / TrackId reportado por el conector:</strong>
-      % if object.einvoice_status:
-        Status: ${object.einvoice_status}
-      % endif
-      % if object.einvoice_trackId:
-        | TrackId: ${object.einvoice_trackId}
-      % endif
-    </p>
-  % endif
-
-  <p><strong>Payload (resumen):</strong></p>
-  <pre style="white-space:pre-wrap;word-wrap:break-word;">${object.payload_send_dgii or ''}</pre>
-</div>
-""".strip()
-
-
 def post_init_hook(env):
     env = api.Environment(env.cr, SUPERUSER_ID, dict(env.context))
 
@@ -132,36 +99,3 @@ def post_init_hook(env):
         if rec and rec._name == "uom.uom":
             if getattr(rec, "code", None) != code:
                 rec.code = code
-
-    model_move = env.ref("account.model_account_move")
-
-    # buscar si ya existe por xmlid
-    imd = env["ir.model.data"].sudo()
-    existing = imd.search([
-        ("module", "=", "opengeek_einvoice"),
-        ("name", "=", "mail_template_fe_exception_dgii"),
-    ], limit=1)
-
-    vals = {
-        "name": "Notificación Error FE: Excepción en Envío al DGII",
-        "model_id": model_move.id,
-        "subject": SUBJECT,
-        "email_from": EMAIL_FROM,
-        "body_html": BODY_HTML,
-        "auto_delete": True,
-    }
-
-    if existing:
-        template = env["mail.template"].sudo().browse(existing.res_id)
-        if template.exists():
-            template.write(vals)
-            return
-
-    template = env["mail.template"].sudo().create(vals)
-    imd.create({
-        "module": "opengeek_einvoice",
-        "name": "mail_template_fe_exception_dgii",
-        "model": "mail.template",
-        "res_id": template.id,
-        "noupdate": True,
-    })
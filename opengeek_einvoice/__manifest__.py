@@ -2,7 +2,7 @@
 {
     "name": "OpenGeek E-Invoice Connector",
     "summary": "DGII e-invoicing integration for Dominican Republic",
-    "version": "17.0.1.0.0",
+    "version": "17.0.1.1.1",
     "author": "OpenGeeksLab",
     "license": "LGPL-3",
     "category": "Accounting",
@@ -11,6 +11,7 @@
         "base",
         "account",
         "l10n_do_accounting",
+        "dgii_reports",
         "contacts",
         "stock",
         "uom",
@@ -19,6 +20,10 @@
     "data": [
         "security/ir.model.access.csv",
 
+        "data/ir_cron_data.xml",
+        "data/einvoice_connector_data.xml",
+        "data/einvoice_failure_digest.xml",
+
         "wizard/account_move_reversal.xml",
         "wizard/account_debit_note_wizard_view.xml",
 
@@ -30,6 +35,8 @@
         "views/account_fiscal_type.xml",
         "views/product_template.xml",
         "views/account_move_debit_button_view.xml",
+        "views/einvoice_outbox.xml",
+        "views/einvoice_connector.xml",
 
         "reports/einvoice_report.xml",
     ],
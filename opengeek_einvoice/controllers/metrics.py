@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+import hmac
+
+from odoo.http import Controller, request, route
+
+
+class EInvoiceMetricsController(Controller):
+
+    @route(["/opengeek_einvoice/metrics"], type="http", auth="none", methods=["GET"], save_session=False)
+    def metrics(self, token=None, **kwargs):
+        """
+        Métricas del cliente eInvoice en formato Prometheus. Requiere el token
+        del parámetro opengeek_einvoice.metrics_token, en la URL o como
+        cabecera Authorization: Bearer; sin parámetro el endpoint no existe.
+        """
+        if not request.db:
+            return request.not_found()
+        expected = request.env["ir.config_parameter"].sudo().get_param("opengeek_einvoice.metrics_token")
+        token = token or (request.httprequest.headers.get("Authorization") or "").removeprefix("Bearer ")
+        if not expected or not hmac.compare_digest(token.encode(), expected.encode()):
+            return request.not_found()
+        metrics = request.env["opengeek.einvoice.metric"].sudo()
+        metrics._flush()
+        return request.make_response(
+            metrics._render_prometheus(),
+            headers=[("Content-Type", "text/plain; version=0.0.4; charset=utf-8")],
+        )
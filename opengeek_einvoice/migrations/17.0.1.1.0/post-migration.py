@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+import logging
+
+from odoo import SUPERUSER_ID, api
+from odoo.tools import split_every
+
+_logger = logging.getLogger(__name__)
+
+
+def migrate(cr, version):
+    """Mueve payload_send_dgii de la columna de account_move a adjuntos comprimidos."""
+    if not version:
+        return
+    cr.execute(
+        """
+        SELECT 1
+          FROM information_schema.columns
+         WHERE table_name = 'account_move'
+           AND column_name = 'payload_send_dgii'
+        """
+    )
+    if not cr.fetchone():
+        return
+
+    env = api.Environment(cr, SUPERUSER_ID, {})
+    cr.execute("SELECT id FROM account_move WHERE payload_send_dgii IS NOT NULL ORDER BY id")
+    move_ids = [row[0] for row in cr.fetchall()]
+    for ids in split_every(1000, move_ids):
+        cr.execute("SELECT id, payload_send_dgii FROM account_move WHERE id IN %s", (tuple(ids),))
+        for move_id, payload in cr.fetchall():
+            env["account.move"].browse(move_id).payload_send_dgii = payload
+        env.flush_all()
+        env.invalidate_all()
+
+    cr.execute("ALTER TABLE account_move DROP COLUMN payload_send_dgii")
+    _logger.info("opengeek_einvoice: %s payloads movidos a adjuntos comprimidos", len(move_ids))
@@ -0,0 +1,15 @@
+# -*- coding: utf-8 -*-
+from odoo import SUPERUSER_ID, api
+
+
+def migrate(cr, version):
+    """Elimina la plantilla de alerta por factura, reemplazada por el resumen de fallos."""
+    if not version:
+        return
+    env = api.Environment(cr, SUPERUSER_ID, {})
+    template = env.ref("opengeek_einvoice.mail_template_fe_exception_dgii", raise_if_not_found=False)
+    if template:
+        template.unlink()
+    env["ir.model.data"].search(
+        [("module", "=", "opengeek_einvoice"), ("name", "=", "mail_template_fe_exception_dgii")]
+    ).unlink()
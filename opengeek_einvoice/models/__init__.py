@@ -1,4 +1,7 @@
 from . import connector
+from . import einvoice_outbox
+from . import einvoice_failure
+from . import einvoice_metric
 from . import res_company
 from . import res_config_settings
 from . import account_move
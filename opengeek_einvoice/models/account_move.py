@@ -1,15 +1,17 @@
 # -*- coding: utf-8 -*-
 import base64
+import gzip
 import json
 import logging
 import re
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
 from decimal import ROUND_HALF_UP, Decimal
 from io import BytesIO
 
 import qrcode
 
-from odoo import fields, models
+from odoo import api, fields, models, tools
 from odoo.exceptions import UserError
 
 from ..service.webservice import OpenGeekEInvoiceService
@@ -18,10 +20,8 @@ _logger = logging.getLogger(__name__)
 
 D = Decimal
 
-_FE_ALERT_RECIPIENTS = [
-    "elopez@opengeekslab.com.do",
-    "jlora@opengeekslab.com.do",
-]
+# Estados DGII que aún pueden cambiar y se vuelven a consultar por trackId.
+EINVOICE_PENDING_STATUSES = ("En Proceso", "Aceptado Condicional")
 
 
 class AccountMove(models.Model):
@@ -29,7 +29,9 @@ class AccountMove(models.Model):
 
     einvoice_status = fields.Char(string="Estatus DGII", readonly=True)
     einvoice_trackId = fields.Char(string="Track Id", readonly=True)
-    dgii_qr_image = fields.Binary(string="QR DGII", attachment=True)
+    dgii_qr_url = fields.Char(string="URL QR DGII", readonly=True, copy=False)
+    # El QR se genera al mostrarse a partir de dgii_qr_url, no al enviar.
+    dgii_qr_image = fields.Binary(string="QR DGII", compute="_compute_dgii_qr_image")
     dgii_codigo_seguridad = fields.Char(
         string="Código de Seguridad", readonly=True, help="Código de seguridad del QR"
     )
@@ -60,8 +62,68 @@ class AccountMove(models.Model):
 
     currency_rate = fields.Float(string="Tipo de Cambio")
     esubmitted = fields.Boolean(string="eInvoice Submitted")
-    payload_send_dgii = fields.Text(string="eInvoice Payload JSON", readonly=True)
+    # El payload se guarda comprimido en un adjunto y solo se lee al mostrarse.
+    payload_send_dgii_file = fields.Binary(string="eInvoice Payload (gzip)", attachment=True, readonly=True, copy=False)
+    payload_send_dgii = fields.Text(
+        string="eInvoice Payload JSON",
+        compute="_compute_payload_send_dgii",
+        inverse="_inverse_payload_send_dgii",
+        readonly=True,
+    )
     exception_message_dgii = fields.Text(string="eInvoice Exception Message", readonly=True)
+    einvoice_poll_attempts = fields.Integer(string="Consultas de estado", readonly=True, copy=False)
+    einvoice_next_poll = fields.Datetime(string="Próxima consulta de estado", readonly=True, copy=False)
+
+    def init(self):
+        super().init()
+        tools.create_index(
+            self._cr,
+            "account_move_einvoice_poll_index",
+            self._table,
+            ["einvoice_next_poll", "id"],
+            # Mismos valores que EINVOICE_PENDING_STATUSES.
+            where="\"einvoice_trackId\" IS NOT NULL AND einvoice_status IN ('En Proceso', 'Aceptado Condicional')",
+        )
+
+    @api.model
+    @tools.ormcache("qr_url")
+    def _render_dgii_qr(self, qr_url):
+        buffer = BytesIO()
+        qrcode.make(qr_url).save(buffer, format="PNG")
+        return base64.b64encode(buffer.getvalue())
+
+    @api.depends("dgii_qr_url")
+    def _compute_dgii_qr_image(self):
+        # QR de facturas enviadas antes de guardar la URL: adjunto original.
+        legacy = {}
+        without_url = self.filtered(lambda m: not m.dgii_qr_url and m.id)
+        if without_url:
+            attachments = self.env["ir.attachment"].sudo().search(
+                [
+                    ("res_model", "=", self._name),
+                    ("res_field", "=", "dgii_qr_image"),
+                    ("res_id", "in", without_url.ids),
+                ]
+            )
+            legacy = {attachment.res_id: attachment.datas for attachment in attachments}
+        for move in self:
+            if move.dgii_qr_url:
+                move.dgii_qr_image = self._render_dgii_qr(move.dgii_qr_url)
+            else:
+                move.dgii_qr_image = legacy.get(move.id, False)
+
+    @api.depends("payload_send_dgii_file")
+    def _compute_payload_send_dgii(self):
+        for move in self:
+            data = move.payload_send_dgii_file
+            move.payload_send_dgii = gzip.decompress(base64.b64decode(data)).decode("utf-8") if data else False
+
+    def _inverse_payload_send_dgii(self):
+        for move in self:
+            payload = move.payload_send_dgii
+            move.payload_send_dgii_file = (
+                base64.b64encode(gzip.compress(payload.encode("utf-8"))) if payload else False
+            )
 
     def copy(self, default=None):
         default = dict(default or {})
@@ -69,23 +131,48 @@ class AccountMove(models.Model):
             {
                 "einvoice_status": False,
                 "einvoice_trackId": False,
-                "dgii_qr_image": False,
+                "dgii_qr_url": False,
                 "dgii_codigo_seguridad": False,
                 "dgii_fecha_firma": False,
                 "currency_rate": False,
                 "esubmitted": False,
-                "payload_send_dgii": False,
+                "payload_send_dgii_file": False,
                 "exception_message_dgii": False,
             }
         )
         return super().copy(default)
 
     def e_send_invoice(self):
+        # Los envíos masivos se encolan y los procesa el cron en segundo plano.
+        if len(self) > 1:
+            self.env["opengeek.einvoice.outbox"]._enqueue(self)
+            return {
+                "type": "ir.actions.client",
+                "tag": "display_notification",
+                "params": {
+                    "type": "info",
+                    "message": "%s facturas encoladas para su envío a DGII." % len(self),
+                    "sticky": False,
+                },
+            }
+        queued = self.browse()
         for move in self:
-            move.generate_complete_einvoice_json()
+            if move.generate_complete_einvoice_json().get("queued"):
+                queued |= move
+        if queued:
+            return {
+                "type": "ir.actions.client",
+                "tag": "display_notification",
+                "params": {
+                    "type": "warning",
+                    "message": "Servicio de facturación electrónica no disponible: "
+                    "%s encolada en modo contingencia; se enviará automáticamente." % ", ".join(queued.mapped("name")),
+                    "sticky": False,
+                },
+            }
 
     def handle_einvoice_response(self, response):
-        """Procesa la respuesta del webservice de DGII y genera el QR."""
+        """Procesa la respuesta del webservice de DGII."""
         try:
             if isinstance(response, str):
                 try:
@@ -117,13 +204,7 @@ class AccountMove(models.Model):
                             }
                         )
 
-            qr_base64_bytes = None
             qr_url = response_data.get("QR")
-            if qr_url:
-                qr_img = qrcode.make(qr_url)
-                buffer = BytesIO()
-                qr_img.save(buffer, format="PNG")
-                qr_base64_bytes = base64.b64encode(buffer.getvalue())  # bytes (OK for Binary)
 
             return {
                 "success": response_data.get("estado") in ("Aceptado", "Aceptado Condicional", "Rechazado"),
@@ -133,7 +214,6 @@ class AccountMove(models.Model):
                 "message": errores[0]["message"] if errores else "",
                 "errors": errores,
                 "qr_url": qr_url,
-                "qr_image_base64": qr_base64_bytes,
                 "codigo_seguridad": response_data.get("CodigoSeguridad"),
                 "fecha_firma": response_data.get("FechaHoraFirma"),
                 "raw_response": response_data,
@@ -148,6 +228,28 @@ class AccountMove(models.Model):
             }
 
     def generate_complete_einvoice_json(self):
+        self.ensure_one()
+        connector = self.env["opengeek.einvoice"]._get_connector()
+        einvoice_json = self._prepare_einvoice_json()
+        if not connector._circuit_allows_request():
+            return self._queue_einvoice_contingency()
+
+        response = OpenGeekEInvoiceService.einvoice_request(einvoice_json, self.company_id)
+        self.env["opengeek.einvoice.metric"]._flush()
+        if isinstance(response, dict) and response.get("success") is False and response.get("retry"):
+            # Fallo de transporte: se encola en lugar de bloquear al usuario.
+            connector._record_failure(response.get("error"))
+            return self._queue_einvoice_contingency(response.get("error"))
+        connector._record_success()
+        return self._apply_einvoice_response(einvoice_json, response)
+
+    def _queue_einvoice_contingency(self, error=None):
+        self.ensure_one()
+        self.env["opengeek.einvoice.outbox"]._enqueue(self)
+        return {"success": False, "queued": True, "error": error}
+
+    def _prepare_einvoice_json(self):
+        """Construye el JSON del e-CF listo para enviar al conector."""
         self.ensure_one()
         account_move = self
 
@@ -174,38 +276,23 @@ class AccountMove(models.Model):
                 return None
             return str(q)
 
-        def _line_is_i1(line):
-            has_itbis18 = any(
-                getattr(t, "l10n_do_tax_type", "") == "itbis"
-                and float(getattr(t, "amount", 0.0)) == 18.0
-                for t in line.tax_ids
-            )
-            has_ritbis_nonzero = any(
-                getattr(t, "l10n_do_tax_type", "") == "ritbis"
-                and abs(float(getattr(t, "amount", 0.0))) > 0.0
-                for t in line.tax_ids
-            )
-            return has_itbis18 or has_ritbis_nonzero
-
-        def _line_is_i2(line):
-            return any(
-                getattr(t, "l10n_do_tax_type", "") == "itbis"
-                and float(getattr(t, "amount", 0.0)) == 16.0
-                for t in line.tax_ids
-            )
-
-        def _line_is_i3(line):
-            has_itbis0 = any(
-                getattr(t, "l10n_do_tax_type", "") == "itbis"
-                and float(getattr(t, "amount", 0.0)) == 0.0
-                for t in line.tax_ids
-            )
-            has_ritbis0 = any(
-                getattr(t, "l10n_do_tax_type", "") == "ritbis"
-                and float(getattr(t, "amount", 0.0)) == 0.0
-                for t in line.tax_ids
-            )
-            return has_itbis0 or has_ritbis0
+        tax_info_cache = {}
+
+        def _tax_info(tax):
+            """Clasificación de un impuesto para el payload, calculada una sola vez."""
+            info = tax_info_cache.get(tax.id)
+            if info is None:
+                kind = getattr(tax, "l10n_do_tax_type", "") or ""
+                amount = float(getattr(tax, "amount", 0.0))
+                info = tax_info_cache[tax.id] = {
+                    "kind": kind,
+                    "i1": (kind == "itbis" and amount == 18.0) or (kind == "ritbis" and abs(amount) > 0.0),
+                    "i2": kind == "itbis" and amount == 16.0,
+                    "i3": kind in ("itbis", "ritbis") and amount == 0.0,
+                    "exento": "Exento" in (tax.name or ""),
+                    "isc": _is_isc_for_itbis(tax),
+                }
+            return info
 
         def fmt_ritbis_ret(ritbis_total, currency_rate, has_itbis3_line=False):
             if not ritbis_total:
@@ -250,13 +337,8 @@ class AccountMove(models.Model):
         )
 
         if is_credit_note or is_debit_note:
-            original_move = self.env["account.move"].search(
-                [
-                    ("ref", "=", getattr(account_move, "origin_out", False)),
-                    ("state", "=", "posted"),
-                    ("company_id", "=", account_move.company_id.id),
-                ],
-                limit=1,
+            original_move = account_move._l10n_do_get_origin_moves().get(
+                account_move.id, self.env["account.move"]
             )
 
             if is_credit_note:
@@ -300,16 +382,43 @@ class AccountMove(models.Model):
         def _to_company(amount):
             return round(float(amount) * currency_rate, 2) if currency_rate else float(amount)
 
-        todas_exentas = all(
-            any("Exento" in (tax.name or "") for tax in line.tax_ids)
-            for line in account_move.invoice_line_ids
-        )
-
-        monto_exento = sum(
-            line.price_subtotal
-            for line in account_move.invoice_line_ids
-            if any("Exento" in (tax.name or "") for tax in line.tax_ids)
-        )
+        # Una sola pasada por las líneas: clasificación de impuestos y
+        # compute_all por línea, de la que se derivan totales e ítems.
+        line_data = []
+        for line in account_move.invoice_line_ids:
+            infos = [_tax_info(tax) for tax in line.tax_ids]
+            data = {
+                "line": line,
+                "i1": any(info["i1"] for info in infos),
+                "i2": any(info["i2"] for info in infos),
+                "i3": any(info["i3"] for info in infos),
+                "exento": any(info["exento"] for info in infos),
+                "taxes_res": {"taxes": []},
+                "isc": 0.0,
+                "isr": 0.0,
+                "ritbis": 0.0,
+            }
+            if line.tax_ids:
+                data["taxes_res"] = line.tax_ids.compute_all(
+                    line.price_unit,
+                    currency=account_move.currency_id,
+                    quantity=line.quantity,
+                    product=line.product_id,
+                    partner=account_move.partner_id,
+                )
+                for tdict in data["taxes_res"].get("taxes", []):
+                    info = _tax_info(self.env["account.tax"].browse(tdict["id"]))
+                    if info["isc"]:
+                        data["isc"] += tdict["amount"]
+                    if info["kind"] == "isr":
+                        data["isr"] += tdict["amount"]
+                    elif info["kind"] == "ritbis":
+                        data["ritbis"] += tdict["amount"]
+            line_data.append(data)
+
+        todas_exentas = all(data["exento"] for data in line_data)
+
+        monto_exento = sum(data["line"].price_subtotal for data in line_data if data["exento"])
         monto_exento = round(monto_exento * currency_rate, 2) if currency_rate else monto_exento
 
         if todas_exentas:
@@ -327,32 +436,17 @@ class AccountMove(models.Model):
         if monto_gravado_global < 0:
             monto_gravado_global *= -1
 
-        base_i1 = sum(_to_company(l.price_subtotal) for l in account_move.invoice_line_ids if _line_is_i1(l))
-        base_i2 = sum(_to_company(l.price_subtotal) for l in account_move.invoice_line_ids if _line_is_i2(l))
-        base_i3 = sum(_to_company(l.price_subtotal) for l in account_move.invoice_line_ids if _line_is_i3(l))
+        base_i1 = sum(_to_company(data["line"].price_subtotal) for data in line_data if data["i1"])
+        base_i2 = sum(_to_company(data["line"].price_subtotal) for data in line_data if data["i2"])
+        base_i3 = sum(_to_company(data["line"].price_subtotal) for data in line_data if data["i3"])
 
         isc_i1 = 0.0
         isc_i2 = 0.0
-        for line in account_move.invoice_line_ids:
-            if not line.tax_ids:
-                continue
-            taxes_res = line.tax_ids.compute_all(
-                line.price_unit,
-                currency=account_move.currency_id,
-                quantity=line.quantity,
-                product=line.product_id,
-                partner=account_move.partner_id,
-            )
-            isc_line = 0.0
-            for tdict in taxes_res.get("taxes", []):
-                tax_rec = self.env["account.tax"].browse(tdict["id"])
-                if _is_isc_for_itbis(tax_rec):
-                    isc_line += tdict["amount"]
-            isc_line_company = _to_company(isc_line)
-            if _line_is_i1(line):
-                isc_i1 += isc_line_company
-            elif _line_is_i2(line):
-                isc_i2 += isc_line_company
+        for data in line_data:
+            if data["i1"]:
+                isc_i1 += _to_company(data["isc"])
+            elif data["i2"]:
+                isc_i2 += _to_company(data["isc"])
 
         ITBIS1_RATE = D("0.18")
         ITBIS2_RATE = D("0.16")
@@ -540,7 +634,8 @@ class AccountMove(models.Model):
         company = account_move.company_id
 
         lines = 1
-        for line in account_move.invoice_line_ids:
+        for data in line_data:
+            line = data["line"]
             if line.price_subtotal == 0 or not line.tax_ids:
                 continue
 
@@ -554,12 +649,16 @@ class AccountMove(models.Model):
 
                 taxes_included = line.tax_ids.filtered(lambda t: t.price_include)
                 if taxes_included:
-                    tax_result = line.tax_ids.compute_all(
-                        line.price_unit,
-                        currency=line.currency_id,
-                        quantity=line.quantity,
-                        product=line.product_id,
-                        partner=account_move.partner_id,
+                    tax_result = (
+                        data["taxes_res"]
+                        if line.currency_id == account_move.currency_id
+                        else line.tax_ids.compute_all(
+                            line.price_unit,
+                            currency=line.currency_id,
+                            quantity=line.quantity,
+                            product=line.product_id,
+                            partner=account_move.partner_id,
+                        )
                     )
                     base_unit_price = tax_result["total_excluded"] / (line.quantity or 1.0)
                 else:
@@ -576,29 +675,9 @@ class AccountMove(models.Model):
                 item_currency_unit_price = None
                 base_unit_price = line.price_unit
 
-            taxes_res = (
-                line.tax_ids.compute_all(
-                    line.price_unit,
-                    currency=account_move.currency_id,
-                    quantity=line.quantity,
-                    product=line.product_id,
-                    partner=account_move.partner_id,
-                )
-                if line.tax_ids
-                else {"taxes": []}
-            )
-
-            isr_withholding_total = 0.0
-            ritbis_withholding_total = 0.0
-            for tdict in taxes_res.get("taxes", []):
-                tax_record = self.env["account.tax"].browse(tdict["id"])
-                kind = getattr(tax_record, "l10n_do_tax_type", "")
-                if kind == "isr":
-                    isr_withholding_total += tdict["amount"]
-                elif kind == "ritbis":
-                    ritbis_withholding_total += tdict["amount"]
-
-            has_itbis3_line = _line_is_i3(line)
+            isr_withholding_total = data["isr"]
+            ritbis_withholding_total = data["ritbis"]
+            has_itbis3_line = data["i3"]
 
             first_tax = line.tax_ids[:1]
             price_include_flag = bool(first_tax and first_tax[0].price_include)
@@ -663,20 +742,19 @@ class AccountMove(models.Model):
             einvoice.pop("OtraMoneda", None)
 
         einvoice_clean = clean_dict(einvoice) or {}
-        einvoice_json = json.dumps(einvoice_clean, ensure_ascii=False, separators=(",", ":"))
-
-        response = OpenGeekEInvoiceService.einvoice_request(einvoice_json, account_move.company_id)
+        return json.dumps(einvoice_clean, ensure_ascii=False, separators=(",", ":"))
+
+    def _apply_einvoice_response(self, einvoice_json, response, raise_on_error=True):
+        """
+        Registra en la factura la respuesta del conector para el payload
+        enviado. Si el envío falló registra el fallo para el resumen y, salvo
+        que raise_on_error sea False, lo eleva como UserError.
+        """
+        self.ensure_one()
+        account_move = self
         result = self.handle_einvoice_response(response)
 
-        fecha_firma_str = result.get("fecha_firma")
-        fecha_firma_dt = None
-        if fecha_firma_str:
-            for fmt in ("%d-%m-%Y %H:%M:%S", "%Y-%m-%d %H:%M:%S", "%d-%m-%Y %H:%M"):
-                try:
-                    fecha_firma_dt = datetime.strptime(fecha_firma_str, fmt)
-                    break
-                except ValueError:
-                    continue
+        fecha_firma_dt = self._parse_fecha_firma(result.get("fecha_firma"))
 
         if not result.get("success"):
             errors = result.get("errors") or result.get("error") or "Error al procesar la factura electrónica"
@@ -690,69 +768,155 @@ class AccountMove(models.Model):
                 "esubmitted": True,
                 "einvoice_status": result.get("status"),
                 "einvoice_trackId": result.get("trackId"),
-                "dgii_qr_image": result.get("qr_image_base64"),
+                "dgii_qr_url": result.get("qr_url"),
                 "dgii_codigo_seguridad": result.get("codigo_seguridad"),
                 "dgii_fecha_firma": fecha_firma_dt,
                 "payload_send_dgii": payload_str,
                 "exception_message_dgii": errors_str or (result.get("message") or "Error"),
+                "einvoice_poll_attempts": 0,
+                "einvoice_next_poll": False,
             }
             account_move.write(vals)
 
-            account_move._notify_fe_exception(payload=einvoice_json)
+            failures = self.env["opengeek.einvoice.failure"]
+            failures._record(account_move, einvoice_json, result)
 
-            raise UserError(errors_str)
+            if raise_on_error:
+                # El UserError deshace el registro anterior.
+                failures._record_after_rollback(account_move, einvoice_json, result)
+                raise UserError(errors_str)
+            return result
 
         payload_str = einvoice_json if isinstance(einvoice_json, str) else json.dumps(einvoice_json, ensure_ascii=False)
         account_move.write({
             "esubmitted": True,
             "einvoice_status": result.get("status") or "Aceptado",
             "einvoice_trackId": result.get("trackId"),
-            "dgii_qr_image": result.get("qr_image_base64"),
+            "dgii_qr_url": result.get("qr_url"),
             "dgii_codigo_seguridad": result.get("codigo_seguridad"),
             "dgii_fecha_firma": fecha_firma_dt,
             "payload_send_dgii": payload_str,
             "exception_message_dgii": None,
+            "einvoice_poll_attempts": 0,
+            "einvoice_next_poll": False,
         })
+        return result
+
+    @api.model
+    def _parse_fecha_firma(self, fecha_firma_str):
+        if not fecha_firma_str:
+            return None
+        for fmt in ("%d-%m-%Y %H:%M:%S", "%Y-%m-%d %H:%M:%S", "%d-%m-%Y %H:%M"):
+            try:
+                return datetime.strptime(fecha_firma_str, fmt)
+            except ValueError:
+                continue
+        return None
 
-    def _notify_fe_exception(self, payload):
-        self.ensure_one()
+    @api.model
+    def _get_einvoice_poll_param(self, key, default):
+        return int(
+            self.env["ir.config_parameter"].sudo().get_param("opengeek_einvoice.poll_%s" % key, default)
+        )
 
-        try:
-            pretty_obj = json.loads(payload or "{}")
-            pretty = json.dumps(pretty_obj, ensure_ascii=False, indent=2)
-            raw_bytes = pretty.encode("utf-8")
-        except Exception:
-            pretty = str(payload or "")
-            raw_bytes = pretty.encode("utf-8")
-
-        attachment_ids = []
-        try:
-            att = self.env["ir.attachment"].create(
+    @api.model
+    def _poll_einvoice_status(self, limit=None, auto_commit=True):
+        """
+        Llamado desde ir.cron: consulta por trackId el estado de las facturas
+        que siguen en proceso o aceptadas condicionalmente.
+
+        Las consultas HTTP se ejecutan en un pool de hilos con concurrencia
+        acotada; las facturas cuyo estado no cambia se reprograman con espera
+        exponencial y dejan de consultarse tras poll_max_attempts intentos.
+        Solo se ejecuta si opengeek_einvoice_status_url está configurado.
+        """
+        if not OpenGeekEInvoiceService.STATUS_URL:
+            _logger.info("FE: opengeek_einvoice_status_url no configurado, no se consultan estados")
+            return 0
+        limit = limit or self._get_einvoice_poll_param("batch_size", 200)
+        workers = max(self._get_einvoice_poll_param("workers", 8), 1)
+        max_attempts = self._get_einvoice_poll_param("max_attempts", 10)
+
+        now = fields.Datetime.now()
+        moves = self.search(
+            [
+                ("einvoice_trackId", "!=", False),
+                ("einvoice_status", "in", EINVOICE_PENDING_STATUSES),
+                ("einvoice_poll_attempts", "<", max_attempts),
+                "|",
+                ("einvoice_next_poll", "=", False),
+                ("einvoice_next_poll", "<=", now),
+            ],
+            order="einvoice_next_poll NULLS FIRST, id",
+            limit=limit,
+        )
+        if not moves:
+            return 0
+
+        companies = {}
+        to_query = self.browse()
+        for company in moves.company_id:
+            auth = OpenGeekEInvoiceService.get_token(company)
+            if auth.get("success"):
+                companies[company] = (
+                    OpenGeekEInvoiceService._token_key(company),
+                    OpenGeekEInvoiceService._credentials(company),
+                )
+                to_query |= moves.filtered(lambda m, c=company: m.company_id == c)
+            else:
+                _logger.warning("FE: no se pudo autenticar %s para consultar estados: %s", company.name, auth.get("error"))
+
+        with ThreadPoolExecutor(max_workers=min(workers, len(to_query) or 1)) as executor:
+            futures = [
+                (
+                    move,
+                    executor.submit(
+                        OpenGeekEInvoiceService.submit_status_query, move.einvoice_trackId, *companies[move.company_id]
+                    ),
+                )
+                for move in to_query
+            ]
+
+        for company in companies:
+            OpenGeekEInvoiceService._store_token(company)
+
+        unchanged = moves - to_query
+        for move, future in futures:
+            try:
+                result = self.handle_einvoice_response(future.result())
+            except Exception:
+                _logger.exception("FE: error inesperado consultando %s", move.name)
+                result = {}
+            status = result.get("status")
+            if not status or status == move.einvoice_status:
+                unchanged |= move
+                continue
+            move.write(
                 {
-                    "name": f"payload_{self.name or self.id}.json",
-                    "type": "binary",
-                    "datas": base64.b64encode(raw_bytes),
-                    "res_model": self._name,
-                    "res_id": self.id,
-                    "mimetype": "application/json",
+                    "einvoice_status": status,
+                    "dgii_qr_url": result.get("qr_url") or move.dgii_qr_url,
+                    "dgii_codigo_seguridad": result.get("codigo_seguridad") or move.dgii_codigo_seguridad,
+                    "dgii_fecha_firma": self._parse_fecha_firma(result.get("fecha_firma")) or move.dgii_fecha_firma,
+                    "exception_message_dgii": (
+                        json.dumps(result["errors"], ensure_ascii=False) if result.get("errors") else False
+                    ),
+                    "einvoice_poll_attempts": 0,
+                    "einvoice_next_poll": False,
                 }
             )
-            attachment_ids = [att.id]
-        except Exception:
-            _logger.exception("FE: error creando adjunto del payload")
-
-        template = self.env.ref("opengeek_einvoice.mail_template_fe_exception_dgii", raise_if_not_found=False)
-        if not template:
-            return False
 
-        try:
-            for email in _FE_ALERT_RECIPIENTS:
-                email_values = {
-                    "email_to": email,
-                    "attachment_ids": [(6, 0, attachment_ids)] if attachment_ids else [],
+        # Las facturas sin cambios se reprograman en bloque según su número de intentos.
+        backoff = self._get_einvoice_poll_param("backoff", 300)
+        max_backoff = self._get_einvoice_poll_param("max_backoff", 86400)
+        for attempts in set(unchanged.mapped("einvoice_poll_attempts")):
+            unchanged.filtered(lambda m: m.einvoice_poll_attempts == attempts).write(
+                {
+                    "einvoice_poll_attempts": attempts + 1,
+                    "einvoice_next_poll": now + timedelta(seconds=min(backoff * 2**attempts, max_backoff)),
                 }
-                template.send_mail(self.id, force_send=True, email_values=email_values)
-            return True
-        except Exception:
-            _logger.exception("FE: error enviando notificación por plantilla")
-            return False
\ No newline at end of file
+            )
+
+        if auto_commit:
+            self.env.cr.commit()
+        self.env["opengeek.einvoice.metric"]._flush()
+        return len(moves)
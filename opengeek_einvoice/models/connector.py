@@ -1,5 +1,13 @@
 # -*- coding: utf-8 -*-
-from odoo import fields, models
+import logging
+from contextlib import contextmanager
+from datetime import timedelta
+
+import psycopg2
+
+from odoo import api, fields, models
+
+_logger = logging.getLogger(__name__)
 
 
 class EInvoiceConnector(models.Model):
@@ -13,3 +21,141 @@ class EInvoiceConnector(models.Model):
         readonly=True,
         required=True,
     )
+
+    # Circuit breaker: tras failure_threshold fallos de transporte seguidos
+    # el conector entra en contingencia y los envíos se encolan sin llamar
+    # al servicio; pasado cooldown se prueba de nuevo con un solo envío.
+    circuit_state = fields.Selection(
+        [
+            ("closed", "Operativo"),
+            ("open", "Contingencia"),
+            ("half_open", "Recuperando"),
+        ],
+        string="Estado del servicio",
+        default="closed",
+        required=True,
+        readonly=True,
+    )
+    failure_count = fields.Integer(string="Fallos consecutivos", readonly=True)
+    failure_threshold = fields.Integer(string="Fallos para entrar en contingencia", default=5)
+    cooldown = fields.Integer(
+        string="Espera antes de reintentar (s)",
+        default=300,
+        help="Segundos en contingencia antes de probar de nuevo el servicio.",
+    )
+    flush_rate = fields.Integer(
+        string="Envíos por minuto",
+        default=30,
+        help="Facturas de la cola que se envían por minuto al recuperarse el servicio.",
+    )
+    opened_at = fields.Datetime(string="En contingencia desde", readonly=True)
+    last_failure_at = fields.Datetime(string="Último fallo", readonly=True)
+    last_success_at = fields.Datetime(string="Último envío correcto", readonly=True)
+    last_error = fields.Text(string="Último error", readonly=True)
+    backlog_count = fields.Integer(string="Facturas en cola", compute="_compute_backlog_count")
+
+    def _compute_backlog_count(self):
+        count = self.env["opengeek.einvoice.outbox"].search_count([("state", "=", "pending")])
+        for connector in self:
+            connector.backlog_count = count
+
+    @api.model
+    def _get_connector(self):
+        connector = self.env.ref("opengeek_einvoice.einvoice_connector", raise_if_not_found=False)
+        return (connector or self.search([], limit=1) or self.create({})).sudo()
+
+    @contextmanager
+    def _circuit_env(self):
+        """
+        Actualiza el estado del circuito en una transacción propia, para que
+        sobreviva al rollback del envío fallido. Si otra transacción está
+        actualizando el mismo registro se descarta la actualización.
+        """
+        self.ensure_one()
+        try:
+            with self.pool.cursor() as cr:
+                yield self.with_env(self.env(cr=cr, su=True))
+        except psycopg2.OperationalError:
+            _logger.info("FE: estado del circuito actualizado en paralelo, se omite")
+        self.invalidate_recordset()
+
+    def _circuit_allows_request(self):
+        """
+        Indica si se puede llamar al servicio o si hay que encolar.
+
+        Pasado cooldown, un solo llamador obtiene el envío de prueba al pasar
+        el circuito a half_open y recibe "probe"; los demás encolan hasta que
+        la prueba termine. Si la prueba no registra resultado en otro
+        cooldown, se puede volver a intentar. El estado se cambia en otra
+        transacción, por lo que el llamador debe usar el valor devuelto y no
+        volver a leer circuit_state.
+        """
+        self.ensure_one()
+        if self.circuit_state == "closed":
+            return True
+        now = fields.Datetime.now()
+        if now < self.opened_at + timedelta(seconds=self.cooldown):
+            return False
+        claimed = False
+        with self._circuit_env() as connector:
+            connector.env.cr.execute(
+                """
+                UPDATE opengeek_einvoice
+                   SET circuit_state = 'half_open', opened_at = %s
+                 WHERE id = %s
+                   AND circuit_state IN ('open', 'half_open')
+                   AND opened_at <= %s
+             RETURNING id
+                """,
+                (now, connector.id, now - timedelta(seconds=connector.cooldown)),
+            )
+            claimed = bool(connector.env.cr.fetchone())
+        if not claimed:
+            return False
+        _logger.info("FE: probando el servicio tras la contingencia")
+        return "probe"
+
+    def _record_failure(self, error, count=1):
+        self.ensure_one()
+        with self._circuit_env() as connector:
+            now = fields.Datetime.now()
+            vals = {
+                "failure_count": connector.failure_count + count,
+                "last_failure_at": now,
+                "last_error": error,
+            }
+            if connector.circuit_state == "half_open" or (
+                connector.circuit_state == "closed" and vals["failure_count"] >= connector.failure_threshold
+            ):
+                vals.update(circuit_state="open", opened_at=now)
+                _logger.warning("FE: servicio no disponible, se activa el modo contingencia: %s", error)
+            connector.write(vals)
+
+    def _record_success(self):
+        self.ensure_one()
+        if self.circuit_state == "closed" and not self.failure_count:
+            return
+        with self._circuit_env() as connector:
+            recovered = connector.circuit_state != "closed"
+            connector.write(
+                {
+                    "circuit_state": "closed",
+                    "failure_count": 0,
+                    "opened_at": False,
+                    "last_success_at": fields.Datetime.now(),
+                }
+            )
+        if recovered:
+            _logger.info("FE: servicio recuperado, se vacía la cola de contingencia")
+            self.env.ref("opengeek_einvoice.ir_cron_einvoice_outbox")._trigger()
+
+    def action_close_circuit(self):
+        self._record_success()
+
+    def action_flush_backlog(self):
+        self.env.ref("opengeek_einvoice.ir_cron_einvoice_outbox")._trigger()
+
+    def action_view_backlog(self):
+        action = self.env["ir.actions.act_window"]._for_xml_id("opengeek_einvoice.einvoice_outbox_action")
+        action["context"] = {"search_default_pending": 1}
+        return action
@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+import gzip
+import hashlib
+import json
+import logging
+
+from odoo import api, fields, models
+
+_logger = logging.getLogger(__name__)
+
+_FE_ALERT_RECIPIENTS = [
+    "elopez@opengeekslab.com.do",
+    "jlora@opengeekslab.com.do",
+]
+
+
+class EInvoiceFailure(models.Model):
+    _name = "opengeek.einvoice.failure"
+    _description = "OpenGeek E-Invoice Failure"
+    _order = "last_seen desc, id desc"
+    _rec_name = "move_id"
+
+    move_id = fields.Many2one(
+        "account.move",
+        string="Factura",
+        required=True,
+        readonly=True,
+        index=True,
+        ondelete="cascade",
+    )
+    company_id = fields.Many2one(
+        related="move_id.company_id",
+        store=True,
+        string="Compañía",
+    )
+    error_code = fields.Char(string="Código", readonly=True, index=True)
+    error_message = fields.Text(string="Mensaje", readonly=True)
+    fingerprint = fields.Char(readonly=True, index=True)
+    count = fields.Integer(string="Ocurrencias", default=1, readonly=True)
+    last_seen = fields.Datetime(string="Última ocurrencia", default=fields.Datetime.now, readonly=True)
+    notified = fields.Boolean(string="Notificado", readonly=True, index=True)
+    payload_attachment_id = fields.Many2one("ir.attachment", string="Payload", readonly=True)
+
+    @api.model
+    def _fingerprint(self, error_code, error_message):
+        return hashlib.sha1(("%s|%s" % (error_code, error_message)).encode("utf-8")).hexdigest()
+
+    @api.model
+    def _compress_payload(self, move, payload):
+        if not isinstance(payload, str):
+            payload = json.dumps(payload, ensure_ascii=False)
+        return self.env["ir.attachment"].sudo().create(
+            {
+                "name": f"payload_{move.name or move.id}.json.gz",
+                "type": "binary",
+                "raw": gzip.compress((payload or "").encode("utf-8")),
+                "res_model": move._name,
+                "res_id": move.id,
+                "mimetype": "application/gzip",
+            }
+        )
+
+    @api.model
+    def _record(self, move, payload, result):
+        """
+        Registra un fallo de envío para el próximo resumen. Los fallos
+        repetidos de una misma factura con el mismo error aún no notificados
+        solo incrementan el contador; el payload se guarda comprimido una vez.
+        """
+        errors = result.get("errors") or []
+        first = errors[0] if errors and isinstance(errors[0], dict) else {}
+        error_code = str(first.get("code") or result.get("code") or result.get("status_code") or "SIN_CODIGO")
+        error_message = first.get("message") or result.get("error") or result.get("message") or "Error"
+        fingerprint = self._fingerprint(error_code, error_message)
+
+        failure = self.sudo().search(
+            [("move_id", "=", move.id), ("fingerprint", "=", fingerprint), ("notified", "=", False)],
+            limit=1,
+        )
+        if failure:
+            failure.write({"count": failure.count + 1, "last_seen": fields.Datetime.now()})
+            return failure
+        return self.sudo().create(
+            {
+                "move_id": move.id,
+                "error_code": error_code,
+                "error_message": error_message,
+                "fingerprint": fingerprint,
+                "payload_attachment_id": self._compress_payload(move, payload).id,
+            }
+        )
+
+    @api.model
+    def _record_after_rollback(self, move, payload, result):
+        """
+        Registra el fallo de nuevo en una transacción propia si la actual se
+        deshace, p. ej. por el UserError de un envío interactivo, para que
+        llegue igualmente al resumen. Si la transacción se confirma, el
+        registro hecho en ella basta y el callback se descarta.
+        """
+        dbname, uid, context, move_id = self.env.cr.dbname, self.env.uid, dict(self.env.context), move.id
+
+        def record():
+            try:
+                with self.pool.cursor() as cr:
+                    env = api.Environment(cr, uid, context)
+                    # La factura pudo crearse en la transacción deshecha.
+                    failed_move = env["account.move"].browse(move_id).exists()
+                    if failed_move:
+                        env[self._name]._record(failed_move, payload, result)
+            except Exception:
+                _logger.exception("FE: no se pudo registrar el fallo de la factura %s en %s", move_id, dbname)
+
+        self.env.cr.postrollback.add(record)
+
+    @api.model
+    def _get_recipients(self):
+        recipients = self.env["ir.config_parameter"].sudo().get_param(
+            "opengeek_einvoice.alert_recipients", ",".join(_FE_ALERT_RECIPIENTS)
+        )
+        return [email.strip() for email in recipients.split(",") if email.strip()]
+
+    @api.model
+    def _send_digest(self):
+        """
+        Llamado desde ir.cron: agrupa por código de error los fallos aún no
+        notificados y encola un único correo resumen con un payload de muestra
+        por grupo. El correo lo envía la cola de mail, sin bloquear el envío.
+        """
+        failures = self.sudo().search([("notified", "=", False)])
+        recipients = self._get_recipients()
+        if not failures or not recipients:
+            return False
+
+        by_code = {}
+        for failure in failures:
+            by_code[failure.error_code] = by_code.get(failure.error_code, self.browse()) | failure
+        groups = [
+            {
+                "code": code,
+                "failures": group,
+                "messages": list(dict.fromkeys(group.mapped("error_message"))),
+                "occurrences": sum(group.mapped("count")),
+                "sample": group[:1],
+            }
+            for code, group in sorted(by_code.items(), key=lambda item: -len(item[1]))
+        ]
+
+        # Un solo payload comprimido por grupo de error.
+        attachments = self.env["ir.attachment"].union(*(group["sample"].payload_attachment_id for group in groups))
+
+        body = self.env["ir.qweb"]._render(
+            "opengeek_einvoice.einvoice_failure_digest",
+            {"groups": groups, "total": sum(group["occurrences"] for group in groups)},
+        )
+        company = failures.company_id[:1] or self.env.company
+        self.env["mail.mail"].sudo().create(
+            {
+                "subject": "Resumen de errores FE: %s factura(s), %s código(s)" % (len(failures.move_id), len(groups)),
+                "email_from": company.email_formatted or self.env.user.email_formatted,
+                "email_to": ",".join(recipients),
+                "body_html": body,
+                "attachment_ids": [(6, 0, attachments.ids)],
+                "auto_delete": True,
+            }
+        )
+        failures.write({"notified": True})
+        _logger.info("FE: resumen de %s fallos en %s grupos encolado", len(failures), len(groups))
+        return True
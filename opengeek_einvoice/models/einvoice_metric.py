@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+import json
+import logging
+
+from psycopg2.extras import execute_values
+
+from odoo import api, fields, models
+
+from ..service.metrics import EInvoiceMetrics, render_series
+
+_logger = logging.getLogger(__name__)
+
+
+class EInvoiceMetric(models.Model):
+    """
+    Métricas del cliente eInvoice sumadas entre todos los workers.
+
+    Cada proceso acumula en memoria (EInvoiceMetrics) y vuelca aquí los
+    incrementos al terminar un lote del cron, una consulta de estados o un
+    envío interactivo; el endpoint /opengeek_einvoice/metrics lee esta tabla,
+    de modo que el scrape ve también lo enviado por los workers de cron.
+    """
+
+    _name = "opengeek.einvoice.metric"
+    _description = "OpenGeek E-Invoice Metric"
+    _log_access = False
+
+    name = fields.Char(required=True, readonly=True)
+    labels = fields.Char(required=True, readonly=True, default="[]")
+    value = fields.Float(readonly=True)
+
+    _sql_constraints = [
+        ("name_labels_uniq", "unique(name, labels)", "La serie ya existe."),
+    ]
+
+    @api.model
+    def _flush(self):
+        """
+        Suma a la tabla lo acumulado por el proceso desde el último volcado.
+
+        Se escribe en una transacción propia para que un rollback del llamador
+        no pierda ni duplique los incrementos. Los contadores del proceso son
+        compartidos por todas las bases que sirve: en un servidor con varias
+        bases, cada incremento se vuelca en la primera que haga flush.
+        """
+        series = EInvoiceMetrics.pending_series()
+        if not series:
+            return
+        try:
+            with self.pool.cursor() as cr:
+                execute_values(
+                    cr._obj,
+                    """
+                    INSERT INTO opengeek_einvoice_metric (name, labels, value)
+                    VALUES %s
+                    ON CONFLICT (name, labels)
+                    DO UPDATE SET value = opengeek_einvoice_metric.value + EXCLUDED.value
+                    """,
+                    [(name, json.dumps(list(pairs)), value) for (name, pairs), value in series.items()],
+                )
+        except Exception:
+            _logger.exception("FE: no se pudieron volcar las métricas")
+            return
+        EInvoiceMetrics.mark_flushed(series)
+
+    @api.model
+    def _render_prometheus(self):
+        self.env.cr.execute("SELECT name, labels, value FROM opengeek_einvoice_metric")
+        series = {
+            (name, tuple(tuple(pair) for pair in json.loads(labels))): value
+            for name, labels, value in self.env.cr.fetchall()
+        }
+        return render_series(series)
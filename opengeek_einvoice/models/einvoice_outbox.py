@@ -0,0 +1,246 @@
+# -*- coding: utf-8 -*-
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from odoo import api, fields, models
+from odoo.exceptions import UserError
+
+from ..service.metrics import EInvoiceMetrics
+from ..service.webservice import OpenGeekEInvoiceService
+
+_logger = logging.getLogger(__name__)
+
+
+class EInvoiceOutbox(models.Model):
+    _name = "opengeek.einvoice.outbox"
+    _description = "OpenGeek E-Invoice Outbox"
+    _order = "next_attempt, id"
+    _rec_name = "move_id"
+
+    move_id = fields.Many2one(
+        "account.move",
+        string="Factura",
+        required=True,
+        readonly=True,
+        index=True,
+        ondelete="cascade",
+    )
+    company_id = fields.Many2one(
+        related="move_id.company_id",
+        store=True,
+        string="Compañía",
+    )
+    state = fields.Selection(
+        [
+            ("pending", "Pendiente"),
+            ("done", "Enviado"),
+            ("failed", "Fallido"),
+            ("cancel", "Cancelado"),
+        ],
+        string="Estado",
+        default="pending",
+        required=True,
+        index=True,
+    )
+    attempts = fields.Integer(string="Intentos", readonly=True)
+    next_attempt = fields.Datetime(
+        string="Próximo intento",
+        default=fields.Datetime.now,
+        index=True,
+    )
+    last_error = fields.Text(string="Último error", readonly=True)
+
+    @api.model
+    def _get_outbox_param(self, key, default):
+        return int(
+            self.env["ir.config_parameter"].sudo().get_param("opengeek_einvoice.outbox_%s" % key, default)
+        )
+
+    @api.model
+    def _enqueue(self, moves):
+        """Encola las facturas para su envío asíncrono, sin duplicar pendientes."""
+        pending = self.search([("move_id", "in", moves.ids), ("state", "=", "pending")])
+        jobs = pending | self.create([{"move_id": move.id} for move in moves - pending.move_id])
+        self.env.ref("opengeek_einvoice.ir_cron_einvoice_outbox")._trigger()
+        return jobs
+
+    def action_retry(self):
+        self.write({"state": "pending", "next_attempt": fields.Datetime.now()})
+        self.env.ref("opengeek_einvoice.ir_cron_einvoice_outbox")._trigger()
+
+    def action_cancel(self):
+        self.filtered(lambda job: job.state == "pending").write({"state": "cancel"})
+
+    @api.model
+    def _process_outbox(self, limit=None, auto_commit=True):
+        """
+        Llamado desde ir.cron: envía un lote de facturas pendientes.
+
+        Los payloads y tokens se preparan en la transacción del cron; solo
+        las llamadas HTTP se ejecutan en un pool de hilos con concurrencia
+        acotada, y las respuestas se registran de vuelta en la transacción.
+        """
+        connector = self.env["opengeek.einvoice"]._get_connector()
+        allowed = connector._circuit_allows_request()
+        if not allowed:
+            return 0
+        if allowed == "probe":
+            # Solo una factura de prueba mientras el servicio se recupera.
+            limit = 1
+        # flush_rate acota los envíos por minuto; el cron se reprograma
+        # cada minuto mientras queden facturas en cola.
+        limit = limit or min(self._get_outbox_param("batch_size", 100), max(connector.flush_rate, 1))
+        workers = max(self._get_outbox_param("workers", 8), 1)
+
+        # SKIP LOCKED permite que varios crons trabajen la cola en paralelo.
+        self.env.cr.execute(
+            """
+            SELECT id
+              FROM opengeek_einvoice_outbox
+             WHERE state = 'pending'
+               AND next_attempt <= (now() at time zone 'UTC')
+          ORDER BY next_attempt, id
+             LIMIT %s
+               FOR UPDATE SKIP LOCKED
+            """,
+            (limit,),
+        )
+        jobs = self.browse([row[0] for row in self.env.cr.fetchall()])
+        if not jobs:
+            return 0
+
+        to_send = []
+        companies = {}
+        failures = successes = 0
+        last_error = None
+        for job in jobs:
+            move = job.move_id
+            try:
+                with self.env.cr.savepoint():
+                    payload = move._prepare_einvoice_json()
+            except UserError as e:
+                job._fail(str(e))
+                continue
+            except Exception as e:
+                # Un error inesperado en una factura no debe bloquear la cola:
+                # la factura se reprograma y termina como fallida si persiste.
+                _logger.exception("FE: error inesperado preparando %s", move.name)
+                job._retry_later("%s: %s" % (type(e).__name__, e))
+                continue
+
+            company = move.company_id
+            if company not in companies:
+                companies[company] = OpenGeekEInvoiceService.get_token(company)
+            auth = companies[company]
+            if not auth.get("success"):
+                if not auth.get("retry"):
+                    # Credenciales faltantes o inválidas: no tiene sentido reintentar.
+                    job._fail(auth.get("error"))
+                    continue
+                failures += 1
+                last_error = auth.get("error")
+                job._retry_later(auth.get("error"))
+                continue
+            to_send.append(
+                (
+                    job,
+                    payload,
+                    OpenGeekEInvoiceService._token_key(company),
+                    OpenGeekEInvoiceService._credentials(company),
+                )
+            )
+
+        with ThreadPoolExecutor(max_workers=min(workers, len(to_send) or 1)) as executor:
+            futures = [
+                (
+                    job,
+                    payload,
+                    executor.submit(OpenGeekEInvoiceService.submit_payload, payload, key, credentials),
+                )
+                for job, payload, key, credentials in to_send
+            ]
+
+        # Los hilos pudieron renovar tokens; se guardan solo si cambiaron.
+        for company in companies:
+            OpenGeekEInvoiceService._store_token(company)
+
+        for job, payload, future in futures:
+            try:
+                response = future.result()
+            except Exception as e:
+                _logger.exception("FE: error inesperado enviando %s", job.move_id.name)
+                response = {"success": False, "retry": True, "error": str(e)}
+            if isinstance(response, dict) and response.get("success") is False and response.get("retry"):
+                failures += 1
+                last_error = response.get("error")
+            else:
+                successes += 1
+            job._handle_response(payload, response)
+
+        if successes:
+            connector._record_success()
+        elif failures:
+            connector._record_failure(last_error, count=failures)
+
+        if auto_commit:
+            self.env.cr.commit()
+        self.env["opengeek.einvoice.metric"]._flush()
+        if successes and self.search_count(
+            [("state", "=", "pending"), ("next_attempt", "<=", fields.Datetime.now())], limit=1
+        ):
+            self.env.ref("opengeek_einvoice.ir_cron_einvoice_outbox")._trigger(
+                fields.Datetime.now() + timedelta(minutes=1)
+            )
+        return len(jobs)
+
+    def _handle_response(self, payload, response):
+        self.ensure_one()
+        if isinstance(response, dict) and response.get("success") is False and response.get("retry"):
+            self._retry_later(response.get("error"), payload=payload, response=response)
+            return
+
+        result = self.move_id._apply_einvoice_response(payload, response, raise_on_error=False)
+        if result.get("success"):
+            self.write({"state": "done", "attempts": self.attempts + 1, "last_error": False})
+        else:
+            self.write(
+                {
+                    "state": "failed",
+                    "attempts": self.attempts + 1,
+                    "last_error": result.get("error") or result.get("message") or "Error",
+                }
+            )
+
+    def _retry_later(self, error, payload=None, response=None):
+        """Reprograma el envío con espera exponencial, o lo da por fallido."""
+        self.ensure_one()
+        attempts = self.attempts + 1
+        if attempts >= self._get_outbox_param("max_attempts", 8):
+            if payload is not None:
+                self.move_id._apply_einvoice_response(payload, response, raise_on_error=False)
+            self._fail(error, attempts=attempts)
+            return
+
+        EInvoiceMetrics.increment("einvoice_retries_total", reason="backoff")
+        delay = min(
+            self._get_outbox_param("backoff", 60) * 2 ** (attempts - 1),
+            self._get_outbox_param("max_backoff", 3600),
+        )
+        self.write(
+            {
+                "attempts": attempts,
+                "next_attempt": fields.Datetime.now() + timedelta(seconds=delay),
+                "last_error": error,
+            }
+        )
+
+    def _fail(self, error, attempts=None):
+        self.ensure_one()
+        self.write(
+            {
+                "state": "failed",
+                "attempts": attempts if attempts is not None else self.attempts + 1,
+                "last_error": error,
+            }
+        )
@@ -1,6 +1,8 @@
 # -*- coding: utf-8 -*-
 from odoo import fields, models
 
+from ..service.webservice import OpenGeekEInvoiceService
+
 
 class ResCompany(models.Model):
     _inherit = "res.company"
@@ -31,3 +33,11 @@ class ResCompany(models.Model):
         groups="base.group_system",
         help="Password used to connect with the e-invoice service.",
     )
+
+    def write(self, vals):
+        res = super().write(vals)
+        if "e_username" in vals or "e_password" in vals:
+            # El token en caché pertenece a las credenciales anteriores.
+            for company in self:
+                OpenGeekEInvoiceService.invalidate_token(company)
+        return res
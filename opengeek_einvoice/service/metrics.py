@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+import os
+import threading
+from bisect import bisect_left
+from collections import defaultdict
+
+# Límites superiores de los buckets, en segundos y en bytes.
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+SIZE_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+class _Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class EInvoiceMetrics:
+    """
+    Métricas del cliente del conector, por proceso.
+
+    No accede al ORM, por lo que se puede actualizar desde los hilos de
+    trabajo. Cada worker de Odoo lleva sus propios valores; pending_series()
+    devuelve lo acumulado desde el último volcado para sumarlo a la tabla
+    compartida por todos los procesos (ver opengeek.einvoice.metric).
+    """
+
+    _lock = threading.Lock()
+    _latency = {}
+    _payload_size = _Histogram(SIZE_BUCKETS)
+    _counters = defaultdict(int)
+    # Valor ya volcado de cada serie.
+    _flushed = defaultdict(float)
+
+    @classmethod
+    def observe_request(cls, endpoint, seconds, status):
+        """Registra una llamada HTTP: ``status`` es el código o "error" si no hubo respuesta."""
+        with cls._lock:
+            histogram = cls._latency.get(endpoint)
+            if histogram is None:
+                histogram = cls._latency[endpoint] = _Histogram(LATENCY_BUCKETS)
+            histogram.observe(seconds)
+            cls._counters[("einvoice_http_responses_total", (("endpoint", endpoint), ("status", str(status))))] += 1
+
+    @classmethod
+    def observe_payload(cls, size):
+        with cls._lock:
+            cls._payload_size.observe(size)
+
+    @classmethod
+    def observe_result(cls, estado, codigo):
+        with cls._lock:
+            labels = (("estado", str(estado)), ("codigo", str(codigo)))
+            cls._counters[("einvoice_dgii_results_total", labels)] += 1
+
+    @classmethod
+    def increment(cls, name, **labels):
+        with cls._lock:
+            cls._counters[(name, tuple(sorted(labels.items())))] += 1
+
+    @classmethod
+    def reset(cls):
+        with cls._lock:
+            cls._latency.clear()
+            cls._payload_size = _Histogram(SIZE_BUCKETS)
+            cls._counters.clear()
+            cls._flushed.clear()
+
+    @classmethod
+    def _series(cls):
+        """Series Prometheus acumuladas por el proceso: {(nombre, etiquetas): valor}."""
+        series = {}
+
+        def histogram(name, buckets, h, extra):
+            for bound, count in zip(list(buckets) + ["+Inf"], h.counts):
+                series[("%s_bucket" % name, extra + (("le", str(bound)),))] = count
+            series[("%s_sum" % name, extra)] = h.sum
+            series[("%s_count" % name, extra)] = h.count
+
+        for endpoint, h in cls._latency.items():
+            histogram("einvoice_request_seconds", LATENCY_BUCKETS, h, (("endpoint", endpoint),))
+        histogram("einvoice_payload_bytes", SIZE_BUCKETS, cls._payload_size, ())
+        series.update(cls._counters)
+        return series
+
+    @classmethod
+    def pending_series(cls):
+        """Incrementos de cada serie desde el último volcado confirmado."""
+        with cls._lock:
+            return {
+                key: value - cls._flushed[key]
+                for key, value in cls._series().items()
+                if value != cls._flushed[key]
+            }
+
+    @classmethod
+    def mark_flushed(cls, series):
+        """Confirma el volcado de los incrementos devueltos por pending_series()."""
+        with cls._lock:
+            for key, delta in series.items():
+                cls._flushed[key] += delta
+
+    @classmethod
+    def snapshot(cls):
+        with cls._lock:
+            return {
+                "latency": {
+                    endpoint: {"buckets": list(h.counts), "sum": h.sum, "count": h.count}
+                    for endpoint, h in cls._latency.items()
+                },
+                "payload_size": {
+                    "buckets": list(cls._payload_size.counts),
+                    "sum": cls._payload_size.sum,
+                    "count": cls._payload_size.count,
+                },
+                "counters": {(name, labels): value for (name, labels), value in cls._counters.items()},
+            }
+
+    @classmethod
+    def render_prometheus(cls):
+        """Exporta las métricas en el formato de texto de Prometheus."""
+        pid = ("pid", str(os.getpid()))
+        snapshot = cls.snapshot()
+        lines = []
+
+        def labels(pairs):
+            return "{%s}" % ",".join('%s="%s"' % (k, str(v).replace('"', '\\"')) for k, v in pairs)
+
+        def histogram(name, buckets, data, extra):
+            cumulative = 0
+            for bound, count in zip(list(buckets) + ["+Inf"], data["buckets"]):
+                cumulative += count
+                lines.append("%s_bucket%s %s" % (name, labels(extra + (("le", bound), pid)), cumulative))
+            lines.append("%s_sum%s %s" % (name, labels(extra + (pid,)), data["sum"]))
+            lines.append("%s_count%s %s" % (name, labels(extra + (pid,)), data["count"]))
+
+        lines.append("# TYPE einvoice_request_seconds histogram")
+        for endpoint, data in sorted(snapshot["latency"].items()):
+            histogram("einvoice_request_seconds", LATENCY_BUCKETS, data, (("endpoint", endpoint),))
+
+        lines.append("# TYPE einvoice_payload_bytes histogram")
+        histogram("einvoice_payload_bytes", SIZE_BUCKETS, snapshot["payload_size"], ())
+
+        typed = set()
+        for (name, pairs), value in sorted(snapshot["counters"].items()):
+            if name not in typed:
+                typed.add(name)
+                lines.append("# TYPE %s counter" % name)
+            lines.append("%s%s %s" % (name, labels(pairs + (pid,)), value))
+        return "\n".join(lines) + "\n"
+
+
+HISTOGRAMS = {
+    "einvoice_request_seconds": LATENCY_BUCKETS,
+    "einvoice_payload_bytes": SIZE_BUCKETS,
+}
+
+
+def render_series(series):
+    """
+    Exporta en formato Prometheus series {(nombre, etiquetas): valor} con
+    los buckets de los histogramas sin acumular, como los devuelve
+    EInvoiceMetrics.pending_series() o la tabla compartida.
+    """
+    lines = []
+
+    def labels(pairs):
+        if not pairs:
+            return ""
+        return "{%s}" % ",".join('%s="%s"' % (k, str(v).replace('"', '\\"')) for k, v in pairs)
+
+    def number(value):
+        # La tabla guarda floats; los conteos se exportan sin decimales.
+        return int(value) if float(value).is_integer() else value
+
+    for name, bounds in HISTOGRAMS.items():
+        lines.append("# TYPE %s histogram" % name)
+        extras = {
+            tuple(pair for pair in pairs if pair[0] != "le")
+            for series_name, pairs in series
+            if series_name in (name + "_bucket", name + "_sum", name + "_count")
+        }
+        for extra in sorted(extras):
+            cumulative = 0
+            for bound in list(bounds) + ["+Inf"]:
+                cumulative += series.get((name + "_bucket", extra + (("le", str(bound)),)), 0)
+                lines.append("%s_bucket%s %s" % (name, labels(extra + (("le", bound),)), number(cumulative)))
+            for suffix in ("_sum", "_count"):
+                lines.append("%s%s%s %s" % (name, suffix, labels(extra), number(series.get((name + suffix, extra), 0))))
+
+    histogram_series = {name + suffix for name in HISTOGRAMS for suffix in ("_bucket", "_sum", "_count")}
+    typed = set()
+    for (name, pairs), value in sorted(series.items()):
+        if name in histogram_series:
+            continue
+        if name not in typed:
+            typed.add(name)
+            lines.append("# TYPE %s counter" % name)
+        lines.append("%s%s %s" % (name, labels(pairs), number(value)))
+    return "\n".join(lines) + "\n"
@@ -1,9 +1,17 @@
 # -*- coding: utf-8 -*-
 import json
 import logging
+import random
+import threading
+import time
 from datetime import datetime, timedelta, timezone
 
 import requests
+from requests.adapters import HTTPAdapter
+
+from odoo.tools import config
+
+from .metrics import EInvoiceMetrics
 
 _logger = logging.getLogger(__name__)
 
@@ -11,9 +19,89 @@ _logger = logging.getLogger(__name__)
 class OpenGeekEInvoiceService:
     AUTH_URL = "https://docs.opengeekslab.com.do/external/auth/iniciar-sesion"
     PROCESS_URL = "https://docs.opengeekslab.com.do/internal/einvoice_json/procesarjson/"
+    # Consulta de estado por trackId. El conector no documenta esta ruta, por
+    # lo que no hay valor por defecto: sin opengeek_einvoice_status_url en la
+    # configuración el cron de consulta de estados no hace nada.
+    STATUS_URL = config.get("opengeek_einvoice_status_url") or None
+
+    # Timeouts de lectura por endpoint y de conexión común, en segundos.
+    # Se pueden ajustar por proceso desde el archivo de configuración de Odoo
+    # (opengeek_einvoice_connect_timeout, opengeek_einvoice_auth_timeout,
+    # opengeek_einvoice_process_timeout, opengeek_einvoice_pool_size).
+    CONNECT_TIMEOUT = float(config.get("opengeek_einvoice_connect_timeout", 10))
+    AUTH_TIMEOUT = float(config.get("opengeek_einvoice_auth_timeout", 30))
+    PROCESS_TIMEOUT = float(config.get("opengeek_einvoice_process_timeout", 60))
+    STATUS_TIMEOUT = float(config.get("opengeek_einvoice_status_timeout", 30))
+    POOL_SIZE = int(config.get("opengeek_einvoice_pool_size", 10))
+
+    # Sesión HTTP compartida por todo el proceso: mantiene las conexiones
+    # keep-alive al conector entre facturas y compañías.
+    _session = None
+    _session_lock = threading.Lock()
+
+    # Tokens por (base de datos, compañía), compartidos por todo el proceso.
+    # Se renuevan TOKEN_REFRESH_MARGIN segundos antes de su expiración.
+    TOKEN_REFRESH_MARGIN = int(config.get("opengeek_einvoice_token_refresh_margin", 120))
+    _tokens = {}
+    _token_locks = {}
+    _tokens_lock = threading.Lock()
+
+    # Fracción de envíos cuyo payload y respuesta se registran en modo debug.
+    LOG_SAMPLE_RATE = float(config.get("opengeek_einvoice_log_sample_rate", 0.01))
+
+    # Respuestas HTTP de error que justifican reintentar el envío.
+    RETRY_STATUS_CODES = (401, 408, 429)
+
+    @classmethod
+    def _get_session(cls):
+        session = cls._session
+        if session is None:
+            with cls._session_lock:
+                session = cls._session
+                if session is None:
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=cls.POOL_SIZE)
+                    session.mount("https://", adapter)
+                    session.mount("http://", adapter)
+                    cls._session = session
+        return session
+
+    @classmethod
+    def configure(
+        cls, pool_size=None, connect_timeout=None, auth_timeout=None, process_timeout=None, status_timeout=None
+    ):
+        """Ajusta el pool y los timeouts; la sesión se recrea en el próximo envío."""
+        if pool_size is not None:
+            cls.POOL_SIZE = int(pool_size)
+        if connect_timeout is not None:
+            cls.CONNECT_TIMEOUT = float(connect_timeout)
+        if auth_timeout is not None:
+            cls.AUTH_TIMEOUT = float(auth_timeout)
+        if process_timeout is not None:
+            cls.PROCESS_TIMEOUT = float(process_timeout)
+        if status_timeout is not None:
+            cls.STATUS_TIMEOUT = float(status_timeout)
+        with cls._session_lock:
+            session, cls._session = cls._session, None
+        if session is not None:
+            session.close()
+
+    @classmethod
+    def _request(cls, endpoint, method, url, read_timeout, **kwargs):
+        """Hace la llamada HTTP con la sesión compartida y registra su latencia."""
+        start = time.perf_counter()
+        try:
+            resp = cls._get_session().request(method, url, timeout=(cls.CONNECT_TIMEOUT, read_timeout), **kwargs)
+        except requests.RequestException:
+            EInvoiceMetrics.observe_request(endpoint, time.perf_counter() - start, "error")
+            raise
+        EInvoiceMetrics.observe_request(endpoint, time.perf_counter() - start, resp.status_code)
+        return resp
 
-    AUTH_TIMEOUT = 30
-    PROCESS_TIMEOUT = 60
+    @classmethod
+    def _log_sampled(cls, message, *args):
+        if _logger.isEnabledFor(logging.DEBUG) and random.random() < cls.LOG_SAMPLE_RATE:
+            _logger.debug(message, *args)
 
     @classmethod
     def _utcnow(cls):
@@ -25,11 +113,24 @@ class OpenGeekEInvoiceService:
         if not exp:
             return True
         exp_utc = exp.replace(tzinfo=timezone.utc)
-        return cls._utcnow() >= exp_utc
+        return cls._utcnow() >= exp_utc - timedelta(seconds=cls.TOKEN_REFRESH_MARGIN)
+
+    @classmethod
+    def _token_key(cls, company):
+        return (company.env.cr.dbname, company.id)
+
+    @classmethod
+    def _credentials(cls, company):
+        return {"username": company.e_username, "password": company.e_password}
+
+    @classmethod
+    def _cached_token_valid(cls, cached):
+        return bool(cached) and cls._utcnow() < cached["expires_at"] - timedelta(seconds=cls.TOKEN_REFRESH_MARGIN)
 
     @classmethod
-    def _authenticate(cls, company):
-        if not company.e_username or not company.e_password:
+    def _request_token(cls, credentials):
+        """Pide un token nuevo al conector. No accede al ORM."""
+        if not credentials.get("username") or not credentials.get("password"):
             return {
                 "success": False,
                 "error": "Credenciales eInvoice no configuradas en la compañía.",
@@ -40,23 +141,26 @@ class OpenGeekEInvoiceService:
             "Accept": "application/json",
         }
         data = {
-            "username_email": company.e_username,
-            "password": company.e_password,
+            "username_email": credentials["username"],
+            "password": credentials["password"],
         }
 
         try:
-            resp = requests.post(cls.AUTH_URL, data=data, headers=headers, timeout=cls.AUTH_TIMEOUT)
+            resp = cls._request("auth", "POST", cls.AUTH_URL, cls.AUTH_TIMEOUT, data=data, headers=headers)
         except requests.RequestException as e:
             _logger.exception("eInvoice AUTH: request error")
             return {
                 "success": False,
+                "retry": True,
                 "error": f"Error de conexión autenticando eInvoice: {e}",
             }
 
         if resp.status_code != 200:
             _logger.error("eInvoice AUTH: status=%s body=%s", resp.status_code, resp.text)
+            # Un 401/403 del propio login son credenciales inválidas: reintentar no sirve.
             return {
                 "success": False,
+                "retry": resp.status_code in (408, 429) or resp.status_code >= 500,
                 "error": f"Error autenticando eInvoice ({resp.status_code})",
                 "raw": resp.text,
             }
@@ -90,26 +194,132 @@ class OpenGeekEInvoiceService:
                 "raw": auth_json,
             }
 
-        exp_dt_naive_utc = (cls._utcnow() + timedelta(seconds=expires_in)).replace(tzinfo=None)
+        return {
+            "success": True,
+            "token": token,
+            "expires_at": cls._utcnow() + timedelta(seconds=expires_in),
+        }
+
+    @classmethod
+    def _get_cached_token(cls, key, credentials, force=False, stale_token=None):
+        """
+        Devuelve el token en caché de la compañía, renovándolo si está por
+        expirar o si ``force`` lo pide.
 
-        company.write(
+        Solo un hilo por compañía se autentica a la vez; los demás esperan y
+        reutilizan el token obtenido. Con ``stale_token`` (p. ej. tras un 401)
+        solo se renueva si nadie lo ha reemplazado ya. No accede al ORM.
+        """
+        cached = cls._tokens.get(key)
+        if not force and cls._cached_token_valid(cached):
+            return dict(cached, success=True)
+
+        with cls._tokens_lock:
+            lock = cls._token_locks.setdefault(key, threading.Lock())
+
+        with lock:
+            cached = cls._tokens.get(key)
+            if cls._cached_token_valid(cached) and (
+                not force or (stale_token and cached["token"] != stale_token)
+            ):
+                return dict(cached, success=True)
+
+            auth = cls._request_token(credentials)
+            if not auth.get("success"):
+                return auth
+            EInvoiceMetrics.increment(
+                "einvoice_token_refreshes_total", reason="forced" if force else ("expired" if cached else "initial")
+            )
+            cls._tokens[key] = {"token": auth["token"], "expires_at": auth["expires_at"]}
+            return auth
+
+    @classmethod
+    def invalidate_token(cls, company):
+        cls._tokens.pop(cls._token_key(company), None)
+
+    @classmethod
+    def _store_token(cls, company):
+        """Persiste el token en caché en la compañía, solo si cambió."""
+        cached = cls._tokens.get(cls._token_key(company))
+        if not cached or company.e_token_client == cached["token"]:
+            return
+        company.sudo().write(
             {
-                "e_token_client": token,
-                "e_expiration_token": exp_dt_naive_utc,
+                "e_token_client": cached["token"],
+                "e_expiration_token": cached["expires_at"].replace(tzinfo=None),
             }
         )
 
-        return {"success": True, "token": token}
+    @classmethod
+    def _authenticate(cls, company, stale_token=None):
+        auth = cls._get_cached_token(
+            cls._token_key(company), cls._credentials(company), force=True, stale_token=stale_token
+        )
+        if not auth.get("success"):
+            return auth
+        cls._store_token(company)
+        return {"success": True, "token": auth["token"]}
 
     @classmethod
-    def einvoice_request(cls, json_data, company):
-        _logger.info(json_data)
-        token = company.e_token_client
-        if not token or cls._token_is_expired(company):
-            auth = cls._authenticate(company)
-            if not auth.get("success"):
-                return {"success": False, "error": auth.get("error"), "raw": auth.get("raw")}
-            token = auth["token"]
+    def get_token(cls, company):
+        """Devuelve el token vigente de la compañía, autenticando si expiró."""
+        key = cls._token_key(company)
+        if key not in cls._tokens and company.e_token_client and not cls._token_is_expired(company):
+            # Token vigente de un proceso anterior: se reutiliza sin autenticar.
+            cls._tokens[key] = {
+                "token": company.e_token_client,
+                "expires_at": company.e_expiration_token.replace(tzinfo=timezone.utc),
+            }
+        auth = cls._get_cached_token(key, cls._credentials(company))
+        if not auth.get("success"):
+            return auth
+        cls._store_token(company)
+        return {"success": True, "token": auth["token"]}
+
+    @classmethod
+    def _call_with_token(cls, key, credentials, call, *args):
+        """
+        Ejecuta ``call(*args, token)`` con el token en caché de la compañía,
+        renovándolo y reintentando una vez ante un 401. No accede al ORM, por
+        lo que puede ejecutarse desde hilos de trabajo; el token renovado se
+        persiste luego con _store_token.
+        """
+        auth = cls._get_cached_token(key, credentials)
+        if not auth.get("success"):
+            # Solo los fallos de transporte se reintentan; las credenciales
+            # faltantes o inválidas requieren corregir la configuración.
+            return {"success": False, "retry": bool(auth.get("retry")), "error": auth.get("error"), "raw": auth.get("raw")}
+
+        result = call(*args, auth["token"])
+        if result.get("status_code") == 401:
+            EInvoiceMetrics.increment("einvoice_retries_total", reason="401")
+            auth = cls._get_cached_token(key, credentials, force=True, stale_token=auth["token"])
+            if auth.get("success"):
+                result = call(*args, auth["token"])
+        return result
+
+    @classmethod
+    def submit_payload(cls, payload, key, credentials):
+        """Envía un payload desde un hilo de trabajo; ver _call_with_token."""
+        return cls._call_with_token(key, credentials, cls.process_payload, payload)
+
+    @classmethod
+    def submit_status_query(cls, track_id, key, credentials):
+        """Consulta el estado de un trackId desde un hilo de trabajo; ver _call_with_token."""
+        return cls._call_with_token(key, credentials, cls.query_status, track_id)
+
+    @classmethod
+    def process_payload(cls, payload, token):
+        """
+        Envía un payload ya construido al endpoint de procesamiento.
+
+        No accede al ORM, por lo que puede ejecutarse desde hilos de trabajo.
+        Los errores de transporte devuelven ``success: False`` con
+        ``retry: True`` cuando tiene sentido reintentar el envío.
+        """
+        # El payload ya viene serializado del constructor: se envía tal cual.
+        body = (payload if isinstance(payload, str) else json.dumps(payload, ensure_ascii=False)).encode("utf-8")
+        EInvoiceMetrics.observe_payload(len(body))
 
         headers = {
             "Authorization": f"Bearer {token}",
@@ -117,49 +327,97 @@ class OpenGeekEInvoiceService:
             "Accept": "application/json",
         }
 
-        payload = json_data
-        if isinstance(payload, str):
-            payload = json.loads(payload)
-
-        def _do_request():
-            return requests.post(
-                cls.PROCESS_URL,
-                json=payload,
-                headers=headers,
-                timeout=cls.PROCESS_TIMEOUT,
-            )
-
-
         try:
-            resp = _do_request()
-            _logger.debug("eInvoice PROCESS: status=%s body=%s", resp.status_code, resp.text)
+            resp = cls._request("process", "POST", cls.PROCESS_URL, cls.PROCESS_TIMEOUT, data=body, headers=headers)
+            cls._log_sampled("eInvoice PROCESS: payload=%s status=%s body=%s", payload, resp.status_code, resp.text)
         except requests.RequestException as e:
             _logger.exception("eInvoice PROCESS: request error")
-            return {"success": False, "error": f"Error de conexión procesando eInvoice: {e}"}
-
-        if resp.status_code == 401:
-            auth = cls._authenticate(company)
-            if auth.get("success"):
-                headers["Authorization"] = f"Bearer {auth['token']}"
-                try:
-                    resp = _do_request()
-                except requests.RequestException as e:
-                    _logger.exception("eInvoice PROCESS: retry request error")
-                    return {"success": False, "error": f"Error de conexión reintentando eInvoice: {e}"}
+            return {
+                "success": False,
+                "retry": True,
+                "error": f"Error de conexión procesando eInvoice: {e}",
+            }
 
         if resp.status_code >= 400:
             _logger.error("eInvoice PROCESS: status=%s body=%s", resp.status_code, resp.text)
             return {
                 "success": False,
+                "retry": resp.status_code in cls.RETRY_STATUS_CODES or resp.status_code >= 500,
+                "status_code": resp.status_code,
                 "error": f"Error procesando eInvoice ({resp.status_code})",
                 "raw": resp.text,
             }
 
         try:
-            return resp.json()
+            result = resp.json()
         except ValueError:
+            EInvoiceMetrics.observe_result("invalid", None)
             return {
                 "success": False,
                 "error": "Respuesta del servicio eInvoice no es JSON válido.",
                 "raw": resp.text,
             }
+        if isinstance(result, dict):
+            EInvoiceMetrics.observe_result(result.get("estado"), result.get("codigo"))
+        return result
+
+    @classmethod
+    def query_status(cls, track_id, token):
+        """
+        Consulta el estado de un e-CF ya enviado a partir de su trackId.
+
+        La respuesta tiene la misma forma que la del procesamiento (estado,
+        QR, CodigoSeguridad, mensajes...). No accede al ORM.
+        """
+        headers = {
+            "Authorization": f"Bearer {token}",
+            "Accept": "application/json",
+        }
+
+        try:
+            resp = cls._request(
+                "status", "GET", cls.STATUS_URL, cls.STATUS_TIMEOUT, params={"trackId": track_id}, headers=headers
+            )
+        except requests.RequestException as e:
+            _logger.warning("eInvoice STATUS: request error for %s: %s", track_id, e)
+            return {
+                "success": False,
+                "retry": True,
+                "error": f"Error de conexión consultando eInvoice: {e}",
+            }
+
+        if resp.status_code >= 400:
+            _logger.error("eInvoice STATUS: status=%s body=%s", resp.status_code, resp.text)
+            return {
+                "success": False,
+                "retry": resp.status_code in cls.RETRY_STATUS_CODES or resp.status_code >= 500,
+                "status_code": resp.status_code,
+                "error": f"Error consultando eInvoice ({resp.status_code})",
+                "raw": resp.text,
+            }
+
+        try:
+            return resp.json()
+        except ValueError:
+            return {
+                "success": False,
+                "retry": True,
+                "error": "Respuesta de consulta eInvoice no es JSON válido.",
+                "raw": resp.text,
+            }
+
+    @classmethod
+    def einvoice_request(cls, json_data, company):
+        auth = cls.get_token(company)
+        if not auth.get("success"):
+            return {"success": False, "retry": auth.get("retry"), "error": auth.get("error"), "raw": auth.get("raw")}
+
+        result = cls.process_payload(json_data, auth["token"])
+
+        if result.get("status_code") == 401:
+            EInvoiceMetrics.increment("einvoice_retries_total", reason="401")
+            auth = cls._authenticate(company, stale_token=auth["token"])
+            if auth.get("success"):
+                result = cls.process_payload(json_data, auth["token"])
+
+        return result
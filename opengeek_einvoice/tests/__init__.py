@@ -0,0 +1,4 @@
+from . import test_einvoice_builder
+from . import test_einvoice_load
+from . import test_einvoice_outbox
+from . import test_webservice
@@ -0,0 +1,6 @@
+# -*- coding: utf-8 -*-
+from .simulator import EInvoiceSimulator
+
+
+class StubEInvoiceServer(EInvoiceSimulator):
+    """Simulador que siempre acepta, sin latencia ni validación de tokens."""
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from ..service.webservice import OpenGeekEInvoiceService
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, round(pct / 100.0 * len(values)) - 1))
+    return values[index]
+
+
+def classify(response):
+    """Resume una respuesta del servicio en una categoría para el reporte."""
+    if not isinstance(response, dict):
+        return "invalid"
+    if response.get("estado"):
+        return response["estado"]
+    if response.get("retry"):
+        return "retry:%s" % (response.get("status_code") or "transport")
+    return "error:%s" % (response.get("status_code") or "invalid")
+
+
+def summarize(latencies, outcomes, elapsed):
+    return {
+        "count": len(latencies),
+        "elapsed": elapsed,
+        "throughput": len(latencies) / elapsed if elapsed else 0.0,
+        "p50": percentile(latencies, 50),
+        "p90": percentile(latencies, 90),
+        "p99": percentile(latencies, 99),
+        "max": max(latencies, default=0.0),
+        "outcomes": dict(outcomes),
+    }
+
+
+def format_report(title, report):
+    return (
+        "%(title)s: %(count)s envíos en %(elapsed).2fs (%(throughput).1f/s) "
+        "p50=%(p50_ms).0fms p90=%(p90_ms).0fms p99=%(p99_ms).0fms max=%(max_ms).0fms resultados=%(outcomes)s"
+        % dict(
+            report,
+            title=title,
+            p50_ms=report["p50"] * 1000,
+            p90_ms=report["p90"] * 1000,
+            p99_ms=report["p99"] * 1000,
+            max_ms=report["max"] * 1000,
+        )
+    )
+
+
+def run_service_load(payloads, key, credentials, workers=8):
+    """
+    Envía los payloads con submit_payload desde un pool de hilos, como lo
+    hace la cola de envío, y mide la latencia de cada envío (incluida la
+    renovación del token ante un 401).
+    """
+
+    def send(payload):
+        start = time.perf_counter()
+        response = OpenGeekEInvoiceService.submit_payload(payload, key, credentials)
+        return time.perf_counter() - start, classify(response)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(send, payloads))
+    elapsed = time.perf_counter() - start
+    return summarize([latency for latency, _outcome in results], Counter(o for _l, o in results), elapsed)
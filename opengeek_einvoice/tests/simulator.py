@@ -0,0 +1,229 @@
+# -*- coding: utf-8 -*-
+"""
+Simulador local de los endpoints de autenticación, procesamiento y consulta
+de estado del conector OpenGeek.
+
+Se usa desde las pruebas y también se puede ejecutar de forma independiente
+para pruebas manuales o de carga::
+
+    python simulator.py --port 8900 --latency 0.05 --jitter 0.05 \\
+        --outcomes "Aceptado=85,Rechazado=5,Aceptado Condicional=5,500=3,401=1,malformed=1"
+
+y apuntar el servicio a él con opengeek_einvoice_* en la configuración o
+con OpenGeekEInvoiceService.AUTH_URL / PROCESS_URL / STATUS_URL.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# Estados DGII que el simulador devuelve con cuerpo JSON válido.
+ESTADOS = ("Aceptado", "Rechazado", "Aceptado Condicional", "En Proceso")
+
+
+class EInvoiceSimulatorHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        # Una instancia del handler por conexión TCP aceptada.
+        with self.server.lock:
+            self.server.connections += 1
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, data, content_type="application/json"):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_json(self, status, body):
+        self._send(status, json.dumps(body).encode())
+
+    def _token_is_valid(self):
+        token = (self.headers.get("Authorization") or "").removeprefix("Bearer ")
+        return not self.server.validate_tokens or token in self.server.tokens
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length)
+        with self.server.lock:
+            self.server.requests.append((self.path, self.headers.get("Authorization"), body))
+        self.server.wait()
+
+        if self.path.startswith("/auth"):
+            self._handle_auth()
+        elif not self._token_is_valid():
+            self.server.count("401")
+            self._send_json(401, {"message": "Token inválido o expirado"})
+        else:
+            self._handle_process(body)
+
+    def do_GET(self):
+        with self.server.lock:
+            self.server.requests.append((self.path, self.headers.get("Authorization"), b""))
+        self.server.wait()
+        if not self._token_is_valid():
+            self.server.count("401")
+            self._send_json(401, {"message": "Token inválido o expirado"})
+            return
+        track_id = (parse_qs(urlparse(self.path).query).get("trackId") or [""])[0]
+        estado = self.server.status_outcome
+        self.server.count("status:%s" % estado)
+        self._send_json(200, self.server.build_response(estado, track_id))
+
+    def _handle_auth(self):
+        outcome = self.server.pick(self.server.auth_outcomes)
+        if outcome != "ok":
+            self.server.count("auth:%s" % outcome)
+            self._send_json(int(outcome), {"message": "Error de autenticación simulado"})
+            return
+        with self.server.lock:
+            self.server.auth_count += 1
+            token = self.server.fixed_token or "token-%s" % self.server.auth_count
+            self.server.tokens.add(token)
+        self._send_json(200, {"data": {"accessToken": token, "expiresIn": self.server.token_ttl}})
+
+    def _handle_process(self, body):
+        outcome = self.server.pick(self.server.outcomes)
+        self.server.count(outcome)
+        if outcome == "malformed":
+            self._send(200, b'{"estado": "Aceptado", "trackId": ')
+        elif outcome in ESTADOS:
+            with self.server.lock:
+                track_id = "track-%s" % len(self.server.requests)
+            self._send_json(200, self.server.build_response(outcome, track_id))
+        else:
+            self._send_json(int(outcome), {"message": "Error simulado %s" % outcome})
+
+
+class EInvoiceSimulator(ThreadingHTTPServer):
+    """
+    Servidor HTTP que imita al conector.
+
+    ``outcomes`` y ``auth_outcomes`` son pesos por resultado: un estado DGII
+    (ver ESTADOS), un código HTTP como "401" o "503", o "malformed" para una
+    respuesta 200 con JSON inválido. ``delay`` y ``jitter`` definen la
+    latencia en segundos; con ``validate_tokens`` los tokens no emitidos o
+    revocados reciben un 401.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, port=0, seed=None):
+        super().__init__(("127.0.0.1", port), EInvoiceSimulatorHandler)
+        self.lock = threading.Lock()
+        self.random = random.Random(seed)
+        self.delay = 0
+        self.jitter = 0
+        self.fixed_token = None
+        self.token_ttl = 3600
+        self.validate_tokens = False
+        self.outcomes = {"Aceptado": 1}
+        self.auth_outcomes = {"ok": 1}
+        self.status_outcome = "Aceptado"
+        self.reset()
+
+    def reset(self):
+        self.connections = 0
+        self.auth_count = 0
+        self.requests = []
+        self.tokens = set()
+        self.outcome_counts = Counter()
+
+    def revoke_tokens(self):
+        with self.lock:
+            self.tokens.clear()
+
+    def pick(self, weights):
+        with self.lock:
+            return self.random.choices(list(weights), weights=list(weights.values()))[0]
+
+    def count(self, outcome):
+        with self.lock:
+            self.outcome_counts[outcome] += 1
+
+    def wait(self):
+        latency = self.delay
+        if self.jitter:
+            with self.lock:
+                latency += self.random.uniform(0, self.jitter)
+        if latency:
+            time.sleep(latency)
+
+    def build_response(self, estado, track_id):
+        response = {"estado": estado, "trackId": track_id, "codigo": ESTADOS.index(estado) + 1, "mensajes": []}
+        if estado == "Rechazado":
+            response["mensajes"] = [{"codigo": 2, "valor": "Rechazo simulado"}]
+        elif estado in ("Aceptado", "Aceptado Condicional"):
+            response.update(
+                {
+                    "QR": "https://ecf.dgii.gov.do/testecf/ConsultaTimbre?TrackId=%s" % track_id,
+                    "CodigoSeguridad": "ABC123",
+                    "FechaHoraFirma": time.strftime("%d-%m-%Y %H:%M:%S"),
+                }
+            )
+            if estado == "Aceptado Condicional":
+                response["mensajes"] = [{"codigo": 1, "valor": "Aceptado condicional simulado"}]
+        return response
+
+    @property
+    def base_url(self):
+        return "http://%s:%s" % self.server_address
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+def _parse_weights(value):
+    weights = {}
+    for item in value.split(","):
+        name, _sep, weight = item.partition("=")
+        weights[name.strip()] = float(weight or 1)
+    return weights
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulador local del conector de facturación electrónica.")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency", type=float, default=0.0, help="Latencia fija en segundos.")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Latencia aleatoria adicional máxima.")
+    parser.add_argument("--outcomes", default="Aceptado=1", help='Pesos, p. ej. "Aceptado=90,500=10".')
+    parser.add_argument("--auth-outcomes", default="ok=1")
+    parser.add_argument("--validate-tokens", action="store_true")
+    parser.add_argument("--token-ttl", type=int, default=3600)
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    server = EInvoiceSimulator(port=args.port, seed=args.seed)
+    server.delay = args.latency
+    server.jitter = args.jitter
+    server.outcomes = _parse_weights(args.outcomes)
+    server.auth_outcomes = _parse_weights(args.auth_outcomes)
+    server.validate_tokens = args.validate_tokens
+    server.token_ttl = args.token_ttl
+    print("Simulador eInvoice en %s (auth: /auth, procesamiento: /procesarjson/)" % server.base_url)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(dict(server.outcome_counts))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+import json
+import logging
+import time
+from unittest.mock import patch
+
+from odoo import Command
+from odoo.tests import tagged
+
+from odoo.addons.account.tests.common import AccountTestInvoicingCommon
+
+_logger = logging.getLogger(__name__)
+
+
+class EInvoiceBuilderCommon(AccountTestInvoicingCommon):
+    @classmethod
+    def setUpClass(cls, chart_template_ref=None):
+        super().setUpClass(chart_template_ref=chart_template_ref)
+        fiscal_type = cls.env["account.fiscal.type"].search(
+            [("prefix", "=", "E31"), ("type", "=", "out_invoice")], limit=1
+        ) or cls.env["account.fiscal.type"].create(
+            {"name": "Crédito Fiscal Electrónico", "prefix": "E31", "type": "out_invoice", "padding": 10}
+        )
+        fiscal_type.write({"is_electronic_sequence": True, "assigned_sequence": False})
+        cls.fiscal_type = fiscal_type
+        tax = cls.company_data["default_tax_sale"]
+        cls.tax_18 = tax.copy({"name": "ITBIS 18%", "amount": 18.0, "l10n_do_tax_type": "itbis"})
+        cls.tax_16 = tax.copy({"name": "ITBIS 16%", "amount": 16.0, "l10n_do_tax_type": "itbis"})
+        cls.tax_0 = tax.copy({"name": "ITBIS 0%", "amount": 0.0, "l10n_do_tax_type": "itbis"})
+        cls.tax_exempt = tax.copy({"name": "Exento", "amount": 0.0, "l10n_do_tax_type": "none"})
+
+    def _line_tax(self, i):
+        if i % 10 == 0:
+            return self.tax_exempt
+        if i % 7 == 0:
+            return self.tax_0
+        if i % 3 == 0:
+            return self.tax_16
+        return self.tax_18
+
+    def _create_invoice(self, line_count):
+        return self.env["account.move"].create(
+            {
+                "move_type": "out_invoice",
+                "partner_id": self.partner_a.id,
+                "invoice_date": "2024-01-15",
+                "fiscal_type_id": self.fiscal_type.id,
+                "ref": "E310000000001",
+                "invoice_line_ids": [
+                    Command.create(
+                        {
+                            "product_id": self.product_a.id,
+                            "quantity": 1 + i % 5,
+                            "price_unit": 100.0 + i,
+                            "tax_ids": [Command.set(self._line_tax(i).ids)],
+                        }
+                    )
+                    for i in range(line_count)
+                ],
+            }
+        )
+
+    def _build(self, invoice):
+        tax_class = type(self.env["account.tax"])
+        with patch.object(
+            tax_class, "compute_all", autospec=True, side_effect=tax_class.compute_all
+        ) as compute_all:
+            start = time.perf_counter()
+            payload = json.loads(invoice._prepare_einvoice_json())
+            elapsed = time.perf_counter() - start
+        return payload, compute_all.call_count, elapsed
+
+
+@tagged("-at_install", "post_install")
+class TestEInvoiceBuilder(EInvoiceBuilderCommon):
+    def test_single_compute_all_per_line(self):
+        invoice = self._create_invoice(50)
+        payload, compute_all_calls, _elapsed = self._build(invoice)
+        self.assertEqual(compute_all_calls, 50)
+        self.assertEqual(len(payload["Items"]), 50)
+        self.assertEqual(
+            payload["Totales"]["MontoExento"],
+            "%.2f" % sum(line.price_subtotal for line in invoice.invoice_line_ids if line.tax_ids == self.tax_exempt),
+        )
+
+    def test_itbis_buckets(self):
+        invoice = self._create_invoice(50)
+        payload, _compute_all_calls, _elapsed = self._build(invoice)
+        totals = payload["Totales"]
+
+        def base(tax):
+            return sum(line.price_subtotal for line in invoice.invoice_line_ids if line.tax_ids == tax)
+
+        self.assertEqual(totals["MontoGravadoI1"], "%.2f" % base(self.tax_18))
+        self.assertEqual(totals["MontoGravadoI2"], "%.2f" % base(self.tax_16))
+        self.assertEqual(totals["MontoGravadoI3"], "%.2f" % base(self.tax_0))
+        self.assertEqual((totals["ITBIS1"], totals["ITBIS2"], totals["ITBIS3"]), ("18", "16", "0"))
+        self.assertAlmostEqual(float(totals["TotalITBIS1"]), base(self.tax_18) * 0.18, delta=0.01)
+        self.assertAlmostEqual(float(totals["TotalITBIS2"]), base(self.tax_16) * 0.16, delta=0.01)
+        self.assertEqual(totals["TotalITBIS3"], "0.00")
+        self.assertEqual(
+            float(totals["MontoGravadoTotal"]),
+            round(base(self.tax_18) + base(self.tax_16) + base(self.tax_0), 2),
+        )
+
+
+@tagged("-at_install", "post_install", "-standard", "einvoice_benchmark")
+class TestEInvoiceBuilderBenchmark(EInvoiceBuilderCommon):
+    """Se ejecuta explícitamente con --test-tags einvoice_benchmark."""
+
+    def test_benchmark_large_invoice(self):
+        for line_count in (500, 2000):
+            invoice = self._create_invoice(line_count)
+            payload, compute_all_calls, elapsed = self._build(invoice)
+            self.assertEqual(compute_all_calls, line_count)
+            self.assertEqual(len(payload["Items"]), line_count)
+            _logger.info(
+                "eInvoice builder: %s líneas en %.3fs (%.2f ms/línea)",
+                line_count,
+                elapsed,
+                elapsed * 1000 / line_count,
+            )
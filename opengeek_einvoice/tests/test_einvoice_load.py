@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+import logging
+import os
+import time
+from collections import Counter
+from unittest.mock import patch
+
+from odoo.tests import tagged
+
+from ..service.webservice import OpenGeekEInvoiceService
+from .loadtest import format_report, run_service_load, summarize
+from .simulator import EInvoiceSimulator
+from .test_einvoice_builder import EInvoiceBuilderCommon
+
+_logger = logging.getLogger(__name__)
+
+# Mezcla de resultados del simulador durante la prueba de carga.
+LOAD_OUTCOMES = {
+    "Aceptado": 85,
+    "Aceptado Condicional": 4,
+    "Rechazado": 4,
+    "En Proceso": 2,
+    "401": 1,
+    "503": 2,
+    "malformed": 2,
+}
+
+
+@tagged("-at_install", "post_install", "-standard", "einvoice_benchmark")
+class TestEInvoiceLoad(EInvoiceBuilderCommon):
+    """
+    Se ejecuta explícitamente con --test-tags einvoice_benchmark. La cantidad
+    de envíos se ajusta con EINVOICE_LOAD_PAYLOADS y EINVOICE_LOAD_INVOICES.
+    """
+
+    @classmethod
+    def setUpClass(cls, chart_template_ref=None):
+        super().setUpClass(chart_template_ref=chart_template_ref)
+        cls.server = EInvoiceSimulator(seed=17).start()
+        cls.addClassCleanup(cls.server.stop)
+        for name, url in (
+            ("AUTH_URL", cls.server.base_url + "/auth"),
+            ("PROCESS_URL", cls.server.base_url + "/procesarjson/"),
+        ):
+            patcher = patch.object(OpenGeekEInvoiceService, name, url)
+            patcher.start()
+            cls.addClassCleanup(patcher.stop)
+        cls.env.company.write({"e_username": "user@example.com", "e_password": "secret"})
+
+    def setUp(self):
+        super().setUp()
+        # El circuit breaker escribe en su propio cursor.
+        self.registry.enter_test_mode(self.cr)
+        self.addCleanup(self.registry.leave_test_mode)
+        OpenGeekEInvoiceService._tokens.clear()
+        self.server.reset()
+        self.server.delay = 0.01
+        self.server.jitter = 0.04
+        self.server.validate_tokens = True
+        self.server.outcomes = dict(LOAD_OUTCOMES)
+
+    def test_service_load(self):
+        count = int(os.environ.get("EINVOICE_LOAD_PAYLOADS", 2000))
+        payloads = [{"Encabezado": {"IdDoc": {"eNCF": "E31%010d" % i}}} for i in range(count)]
+        key = OpenGeekEInvoiceService._token_key(self.env.company)
+        credentials = OpenGeekEInvoiceService._credentials(self.env.company)
+
+        for workers in (1, 8, 16):
+            self.server.reset()
+            report = run_service_load(payloads, key, credentials, workers=workers)
+            _logger.info(format_report("eInvoice servicio (%s hilos)" % workers, report))
+
+            self.assertEqual(report["count"], count)
+            outcomes = report["outcomes"]
+            self.assertEqual(outcomes.get("retry:503", 0), self.server.outcome_counts["503"])
+            self.assertEqual(outcomes.get("error:invalid", 0), self.server.outcome_counts["malformed"])
+            # Cada 401 provoca a lo sumo una reautenticación, compartida entre hilos.
+            self.assertLessEqual(self.server.auth_count, self.server.outcome_counts["401"] + 1)
+
+    def test_e_send_invoice_load(self):
+        invoices = self.env["account.move"].union(
+            *(self._create_invoice(5) for _i in range(int(os.environ.get("EINVOICE_LOAD_INVOICES", 200))))
+        )
+
+        start = time.perf_counter()
+        invoices.e_send_invoice()
+        outbox = self.env["opengeek.einvoice.outbox"].search([("move_id", "in", invoices.ids)])
+        self.env["opengeek.einvoice.outbox"]._process_outbox(limit=len(invoices), auto_commit=False)
+        elapsed = time.perf_counter() - start
+
+        report = summarize(
+            [elapsed / len(invoices)] * len(invoices),
+            Counter(invoices.mapped(lambda m: m.einvoice_status or "sin estado")),
+            elapsed,
+        )
+        _logger.info(format_report("eInvoice e_send_invoice + cola", report))
+        self.assertEqual(len(outbox), len(invoices))
+        self.assertFalse(outbox.filtered(lambda job: job.state == "pending" and not job.last_error))
+        # Todas las facturas se intentaron una vez en el mismo lote.
+        self.assertFalse(outbox.filtered(lambda job: job.state == "pending" and job.attempts != 1))
+
+        # Un envío por factura, más a lo sumo un reintento por cada 401.
+        sent = [path for path, _auth, _body in self.server.requests if path.startswith("/procesarjson")]
+        self.assertGreaterEqual(len(sent), len(invoices))
+        self.assertLessEqual(len(sent), len(invoices) + self.server.outcome_counts["401"])
+        # El token se reutiliza entre facturas: solo se autentica de nuevo tras un 401.
+        self.assertLessEqual(self.server.auth_count, self.server.outcome_counts["401"] + 1)
+        # Solo los errores de transporte quedan en cola para reintentar.
+        self.assertGreaterEqual(
+            len(outbox.filtered(lambda job: job.state in ("done", "failed"))),
+            len(invoices) - self.server.outcome_counts["503"] - self.server.outcome_counts["401"],
+        )
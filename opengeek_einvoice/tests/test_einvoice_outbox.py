@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+from datetime import timedelta
+from unittest.mock import patch
+
+from odoo import fields
+from odoo.exceptions import UserError
+from odoo.tests import tagged
+
+from .test_einvoice_builder import EInvoiceBuilderCommon
+
+
+@tagged("-at_install", "post_install")
+class TestEInvoiceOutbox(EInvoiceBuilderCommon):
+    def setUp(self):
+        super().setUp()
+        self.Outbox = self.env["opengeek.einvoice.outbox"]
+        self.connector = self.env["opengeek.einvoice"]._get_connector()
+        self.connector.write({"circuit_state": "closed", "failure_count": 0})
+        # El circuit breaker escribe en su propio cursor.
+        self.registry.enter_test_mode(self.cr)
+        self.addCleanup(self.registry.leave_test_mode)
+
+    def test_unexpected_builder_error_does_not_block_batch(self):
+        broken, invalid = self._create_invoice(1), self._create_invoice(1)
+        jobs = self.Outbox.create([{"move_id": broken.id}, {"move_id": invalid.id}])
+
+        def prepare(move):
+            if move == broken:
+                raise KeyError("ITBIS")
+            raise UserError("Factura inválida")
+
+        move_class = type(self.env["account.move"])
+        with patch.object(move_class, "_prepare_einvoice_json", autospec=True, side_effect=prepare):
+            processed = self.Outbox._process_outbox(limit=10, auto_commit=False)
+
+        self.assertEqual(processed, 2)
+        broken_job, invalid_job = jobs
+        # El error inesperado reprograma la factura en lugar de abortar el lote.
+        self.assertEqual(broken_job.state, "pending")
+        self.assertEqual(broken_job.attempts, 1)
+        self.assertGreater(broken_job.next_attempt, fields.Datetime.now())
+        self.assertIn("KeyError", broken_job.last_error)
+        self.assertEqual(invalid_job.state, "failed")
+
+    def test_half_open_allows_a_single_probe(self):
+        self.connector.write(
+            {
+                "circuit_state": "open",
+                "opened_at": fields.Datetime.now() - timedelta(seconds=self.connector.cooldown + 1),
+            }
+        )
+        self.assertEqual(self.connector._circuit_allows_request(), "probe")
+        self.assertEqual(self.connector.circuit_state, "half_open")
+        # Mientras la prueba está en curso, el resto encola.
+        self.assertFalse(self.connector._circuit_allows_request())
+        self.assertEqual(self.Outbox._process_outbox(auto_commit=False), 0)
+
+    def test_interactive_failure_survives_rollback(self):
+        invoice = self._create_invoice(1)
+        Failure = self.env["opengeek.einvoice.failure"]
+        with self.assertRaises(UserError):
+            invoice._apply_einvoice_response("{}", "respuesta inválida")
+        # Se simula el rollback de la transacción interactiva.
+        Failure.search([("move_id", "=", invoice.id)]).unlink()
+        self.env.cr.postrollback.run()
+        failure = Failure.search([("move_id", "=", invoice.id)])
+        self.assertEqual(len(failure), 1)
+        self.assertEqual(failure.error_message, "La respuesta no es un JSON válido")
+        self.assertTrue(failure.payload_attachment_id)
+
+    def test_probe_sends_a_single_invoice(self):
+        # En producción el cursor del cron no ve half_open, escrito en otra
+        # transacción: el límite debe salir del resultado de la reserva.
+        invoices = [self._create_invoice(1) for _i in range(3)]
+        self.Outbox.create([{"move_id": invoice.id} for invoice in invoices])
+        connector_class = type(self.connector)
+        move_class = type(self.env["account.move"])
+        with patch.object(connector_class, "_circuit_allows_request", autospec=True, return_value="probe"), \
+                patch.object(move_class, "_prepare_einvoice_json", autospec=True, side_effect=UserError("Factura inválida")):
+            processed = self.Outbox._process_outbox(auto_commit=False)
+        self.assertEqual(self.connector.circuit_state, "closed")
+        self.assertEqual(processed, 1)
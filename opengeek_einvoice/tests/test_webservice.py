@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+import threading
+from datetime import timedelta
+from unittest.mock import patch
+
+from odoo.tests import TransactionCase, tagged
+
+from ..service.metrics import EInvoiceMetrics
+from ..service.webservice import OpenGeekEInvoiceService
+from .common import StubEInvoiceServer
+
+
+@tagged("-at_install", "post_install")
+class TestEInvoiceWebservice(TransactionCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = StubEInvoiceServer().start()
+        cls.addClassCleanup(cls.server.stop)
+
+        for name, url in (
+            ("AUTH_URL", cls.server.base_url + "/auth"),
+            ("PROCESS_URL", cls.server.base_url + "/procesarjson/"),
+        ):
+            patcher = patch.object(OpenGeekEInvoiceService, name, url)
+            patcher.start()
+            cls.addClassCleanup(patcher.stop)
+
+        cls.company = cls.env.company
+        cls.company.write({"e_username": "user@example.com", "e_password": "secret"})
+        cls.other_company = cls.env["res.company"].create(
+            {"name": "Other Company", "e_username": "other@example.com", "e_password": "secret"}
+        )
+
+    def setUp(self):
+        super().setUp()
+        OpenGeekEInvoiceService.configure()
+        self.addCleanup(OpenGeekEInvoiceService.configure)
+        OpenGeekEInvoiceService._tokens.clear()
+        self.server.delay = 0
+        self.server.fixed_token = None
+        self.server.validate_tokens = False
+        self.server.outcomes = {"Aceptado": 1}
+        self.server.auth_outcomes = {"ok": 1}
+        self.server.reset()
+
+    def test_process_payload_reuses_connection(self):
+        for _i in range(5):
+            response = OpenGeekEInvoiceService.process_payload({"Encabezado": {}}, "token")
+            self.assertEqual(response["estado"], "Aceptado")
+        self.assertEqual(len(self.server.requests), 5)
+        self.assertEqual(self.server.connections, 1)
+
+    def test_session_shared_across_companies(self):
+        for company in (self.company, self.other_company, self.company):
+            response = OpenGeekEInvoiceService.einvoice_request('{"Encabezado": {}}', company)
+            self.assertEqual(response["estado"], "Aceptado")
+        # Una autenticación por compañía y tres envíos, todo sobre la misma conexión.
+        self.assertEqual(self.server.auth_count, 2)
+        self.assertEqual(len(self.server.requests), 5)
+        self.assertEqual(self.server.connections, 1)
+
+    def test_configure_resets_session(self):
+        session = OpenGeekEInvoiceService._get_session()
+        self.assertIs(OpenGeekEInvoiceService._get_session(), session)
+        OpenGeekEInvoiceService.configure(pool_size=2)
+        self.assertIsNot(OpenGeekEInvoiceService._get_session(), session)
+        adapter = OpenGeekEInvoiceService._get_session().get_adapter(self.server.base_url)
+        self.assertEqual(adapter._pool_maxsize, 2)
+
+    def test_read_timeout_is_retryable(self):
+        timeout = OpenGeekEInvoiceService.PROCESS_TIMEOUT
+        self.addCleanup(OpenGeekEInvoiceService.configure, process_timeout=timeout)
+        OpenGeekEInvoiceService.configure(process_timeout=0.1)
+        self.server.delay = 0.5
+        response = OpenGeekEInvoiceService.process_payload({"Encabezado": {}}, "token")
+        self.assertFalse(response["success"])
+        self.assertTrue(response["retry"])
+
+    def _run_threads(self, target, count=10):
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(target())) for _i in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_concurrent_authentication_is_single_flight(self):
+        self.server.delay = 0.2
+        key = OpenGeekEInvoiceService._token_key(self.company)
+        credentials = OpenGeekEInvoiceService._credentials(self.company)
+        results = self._run_threads(lambda: OpenGeekEInvoiceService._get_cached_token(key, credentials))
+        self.assertEqual(self.server.auth_count, 1)
+        self.assertEqual({result["token"] for result in results}, {"token-1"})
+
+    def test_stale_token_refreshed_once(self):
+        key = OpenGeekEInvoiceService._token_key(self.company)
+        credentials = OpenGeekEInvoiceService._credentials(self.company)
+        stale = OpenGeekEInvoiceService._get_cached_token(key, credentials)["token"]
+        self.server.delay = 0.2
+        results = self._run_threads(
+            lambda: OpenGeekEInvoiceService._get_cached_token(key, credentials, force=True, stale_token=stale)
+        )
+        self.assertEqual(self.server.auth_count, 2)
+        self.assertEqual({result["token"] for result in results}, {"token-2"})
+
+    def test_token_refreshed_before_expiration(self):
+        OpenGeekEInvoiceService.get_token(self.company)
+        key = OpenGeekEInvoiceService._token_key(self.company)
+        OpenGeekEInvoiceService._tokens[key]["expires_at"] = OpenGeekEInvoiceService._utcnow() + timedelta(
+            seconds=OpenGeekEInvoiceService.TOKEN_REFRESH_MARGIN - 1
+        )
+        auth = OpenGeekEInvoiceService.get_token(self.company)
+        self.assertEqual(auth["token"], "token-2")
+        self.assertEqual(self.company.e_token_client, "token-2")
+
+    def test_company_written_only_when_token_changes(self):
+        self.server.fixed_token = "same-token"
+        OpenGeekEInvoiceService.get_token(self.company)
+        self.assertEqual(self.company.e_token_client, "same-token")
+
+        company_class = type(self.company)
+        with patch.object(company_class, "write", autospec=True, side_effect=company_class.write) as write:
+            OpenGeekEInvoiceService.get_token(self.company)
+            OpenGeekEInvoiceService._authenticate(self.company)
+        self.assertEqual(self.server.auth_count, 2)
+        write.assert_not_called()
+
+    def test_revoked_token_reauthenticates_once(self):
+        self.server.validate_tokens = True
+        OpenGeekEInvoiceService.einvoice_request('{"Encabezado": {}}', self.company)
+        self.server.revoke_tokens()
+        response = OpenGeekEInvoiceService.einvoice_request('{"Encabezado": {}}', self.company)
+        self.assertEqual(response["estado"], "Aceptado")
+        self.assertEqual(self.server.auth_count, 2)
+        self.assertEqual(self.company.e_token_client, "token-2")
+
+    def test_server_error_is_retryable(self):
+        self.server.outcomes = {"503": 1}
+        response = OpenGeekEInvoiceService.einvoice_request('{"Encabezado": {}}', self.company)
+        self.assertFalse(response["success"])
+        self.assertTrue(response["retry"])
+        self.assertEqual(response["status_code"], 503)
+
+    def test_malformed_response_is_not_retried(self):
+        self.server.outcomes = {"malformed": 1}
+        response = OpenGeekEInvoiceService.einvoice_request('{"Encabezado": {}}', self.company)
+        self.assertFalse(response["success"])
+        self.assertFalse(response.get("retry"))
+
+    def test_invalid_credentials_are_not_retried(self):
+        self.server.auth_outcomes = {"401": 1}
+        key = OpenGeekEInvoiceService._token_key(self.company)
+        credentials = OpenGeekEInvoiceService._credentials(self.company)
+        response = OpenGeekEInvoiceService.submit_payload({"Encabezado": {}}, key, credentials)
+        self.assertFalse(response["success"])
+        self.assertFalse(response["retry"])
+
+        missing = dict(credentials, password=False)
+        response = OpenGeekEInvoiceService.submit_payload({"Encabezado": {}}, key, missing)
+        self.assertFalse(response["retry"])
+
+    def test_auth_server_error_is_retried(self):
+        self.server.auth_outcomes = {"503": 1}
+        key = OpenGeekEInvoiceService._token_key(self.company)
+        response = OpenGeekEInvoiceService.submit_payload(
+            {"Encabezado": {}}, key, OpenGeekEInvoiceService._credentials(self.company)
+        )
+        self.assertTrue(response["retry"])
+
+    def test_metrics_recorded(self):
+        EInvoiceMetrics.reset()
+        self.addCleanup(EInvoiceMetrics.reset)
+        self.server.validate_tokens = True
+        OpenGeekEInvoiceService.einvoice_request('{"Encabezado": {}}', self.company)
+        self.server.revoke_tokens()
+        OpenGeekEInvoiceService.einvoice_request('{"Encabezado": {}}', self.company)
+
+        snapshot = EInvoiceMetrics.snapshot()
+        self.assertEqual(snapshot["latency"]["auth"]["count"], 2)
+        self.assertEqual(snapshot["latency"]["process"]["count"], 3)
+        self.assertEqual(snapshot["payload_size"]["count"], 3)
+        counters = snapshot["counters"]
+        self.assertEqual(counters[("einvoice_retries_total", (("reason", "401"),))], 1)
+        self.assertEqual(counters[("einvoice_token_refreshes_total", (("reason", "forced"),))], 1)
+        self.assertEqual(counters[("einvoice_dgii_results_total", (("estado", "Aceptado"), ("codigo", "1")))], 2)
+        self.assertIn('einvoice_request_seconds_count{endpoint="process"', EInvoiceMetrics.render_prometheus())
+
+    def test_metrics_flushed_to_shared_table(self):
+        EInvoiceMetrics.reset()
+        self.addCleanup(EInvoiceMetrics.reset)
+        self.registry.enter_test_mode(self.cr)
+        self.addCleanup(self.registry.leave_test_mode)
+        Metric = self.env["opengeek.einvoice.metric"]
+        Metric.search([]).unlink()
+
+        OpenGeekEInvoiceService.einvoice_request('{"Encabezado": {}}', self.company)
+        Metric._flush()
+        self.assertFalse(EInvoiceMetrics.pending_series())
+        # Otro worker vuelca sus propios incrementos sobre las mismas series.
+        EInvoiceMetrics.reset()
+        OpenGeekEInvoiceService.einvoice_request('{"Encabezado": {}}', self.company)
+        Metric._flush()
+        Metric._flush()
+
+        count = Metric.search([("name", "=", "einvoice_request_seconds_count"), ("labels", "=", '[["endpoint", "process"]]')])
+        self.assertEqual(count.value, 2)
+        text = Metric._render_prometheus()
+        self.assertIn('einvoice_request_seconds_count{endpoint="process"} 2', text)
+        self.assertIn('einvoice_request_seconds_bucket{endpoint="process",le="+Inf"} 2', text)
+        self.assertIn('einvoice_dgii_results_total{estado="Aceptado",codigo="1"} 2', text)
+        self.assertNotIn("pid=", text)